@@ -1,14 +1,42 @@
 import streamlit as st
 import pandas as pd
+from utils.alerts import start_alerts
+from utils.analytics import analytics_for
 from utils.style import inject_css
-from utils.providers import DEFAULT_UNIVERSE, get_prices, last_price_and_change
+from utils.live import get_tape
+from utils.providers import DEFAULT_SOURCE, DEFAULT_UNIVERSE, get_prices, last_price_and_change
+from utils.warmup import start_warmup
 
 st.set_page_config(page_title="Himalayan Crypto Desk", page_icon="🟦", layout="wide")
 inject_css()
+start_warmup()
+start_alerts()
 
 universe = st.session_state.get("universe", DEFAULT_UNIVERSE[:6])
-today = pd.Timestamp.today()
-prices = get_prices(universe, today - pd.Timedelta(days=30), today, source="auto")
+# Day-aligned so reruns share the same cache range instead of a new key per second.
+today = pd.Timestamp.today().normalize()
+prices = get_prices(universe, today - pd.Timedelta(days=30), today, source=DEFAULT_SOURCE)
+
+tape = get_tape(universe)
+
+@st.fragment(run_every=1)
+def live_tape():
+    # Last price and 24h change straight from the websocket; only symbols that haven't
+    # ticked yet fall back to the daily closes already loaded for the snapshot below.
+    quotes = tape.quotes(universe) if tape is not None else {}
+    chips = []
+    for t in universe:
+        if t in quotes:
+            px, chg = quotes[t]["price"], quotes[t]["change_pct"]
+        elif prices is not None and t in prices.columns:
+            px, chg = last_price_and_change(prices[t])
+        else:
+            continue
+        cls = "cb-pos" if chg >= 0 else "cb-neg"
+        chips.append(
+            f'<span class="cb-chip"><b>{t}</b> <span>{px:,.2f}</span> <span class="{cls}">{chg:+.2f}%</span></span>'
+        )
+    st.markdown("".join(chips) if chips else "No tape data yet (open Market Watch).", unsafe_allow_html=True)
 
 with st.container():
     st.markdown(
@@ -34,16 +62,7 @@ with st.container():
         unsafe_allow_html=True,
     )
 
-    chips = []
-    if prices is not None and not prices.empty:
-        for t in universe:
-            if t in prices.columns:
-                px, chg = last_price_and_change(prices[t])
-                cls = "cb-pos" if chg >= 0 else "cb-neg"
-                chips.append(
-                    f'<span class="cb-chip"><b>{t}</b> <span>{px:,.2f}</span> <span class="{cls}">{chg:+.2f}%</span></span>'
-                )
-    st.markdown("".join(chips) if chips else "No tape data yet (open Market Watch).", unsafe_allow_html=True)
+    live_tape()
 
     st.markdown("</div></div></div>", unsafe_allow_html=True)
 
@@ -84,14 +103,13 @@ st.caption("Key pulses for the chosen universe.")
 if prices is None or prices.empty:
     st.warning("No data loaded yet. Open Market Watch to pull fresh prices.")
 else:
-    latest = prices.ffill().iloc[-1]
-    base = prices.ffill().iloc[0]
-    change = (latest / base - 1).replace([pd.NA, pd.NaT], 0) * 100
+    engine = analytics_for(prices)
+    latest = engine.filled().iloc[-1]
+    change = engine.change_pct().replace([pd.NA, pd.NaT], 0)
     best = change.dropna().sort_values(ascending=False).head(1)
     worst = change.dropna().sort_values().head(1)
 
-    rets = prices.pct_change().dropna(how="all")
-    vol = rets.std() * (365 ** 0.5) * 100
+    vol = engine.ann_vol(365)
     vol_best = vol.sort_values(ascending=False).head(1)
 
     cards = [
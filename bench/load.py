@@ -0,0 +1,239 @@
+from __future__ import annotations
+import argparse
+import datetime
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+# Concurrent-session load test: K simulated analysts share one process, the way one
+# `streamlit run app.py` serves every browser tab, and keep rerunning app.py and the three
+# pages while changing universes, date ranges and sliders. Each session runs its scripts on
+# its own thread through Streamlit's AppTest, against offline data (the synthetic source by
+# default), so the shared caches, the GIL and the process's memory are contended as in
+# production, minus the websocket and browser.
+#
+# Every session count runs in a fresh child process with its own empty store, so CPU time
+# and peak RSS belong to that level alone. The capacity is the largest session count whose
+# p95 rerun latency stays within the SLO without errors.
+#
+#   python -m bench.load                          # 1, 2, 4, 8, 16 sessions, 60 s each
+#   python -m bench.load --sessions 4,8 --duration 30 --think 0
+
+ROOT = Path(__file__).resolve().parent.parent
+# Relative visit frequency per script; a session stays on a page for a few reruns, like a user.
+PAGE_WEIGHTS = {"app.py": 1, "pages/1_Market_Watch.py": 3, "pages/2_Portfolio_Vault.py": 2, "pages/3_Alert_Studio.py": 2}
+SESSION_COUNTS = (1, 2, 4, 8, 16)
+DURATION = 60.0                   # seconds of load per session count
+THINK = 2.0                       # mean pause between a session's reruns (exponential), 0 = closed loop
+STAY = 4                          # mean reruns on a page before switching (geometric)
+SLO_P95 = 2.0                     # seconds
+RANGES = (30, 90, 365, 730, 1460) # days back from today for the Start date
+MAX_UNIVERSE = 12
+PAGE_TIMEOUT = 300
+ACTIONS = ("universe", "range", "slider", "slider", "text", "rerun")
+# Values typed into text widgets, by label; invalid rule text exercises the page's warning path.
+TEXT_VALUES = {
+    "Extra rules (one per line)": ("", "vol(90) > 80", "return(7) <= -15 on SOL-USD,ETH-USD",
+                                   "vol(90) > 80\ndrawdown(30) < -40", "not a rule"),
+    "Rule set name": ("default", "load test"),
+    "Send to": ("stdout", "stdout, file:alerts.log"),
+}
+
+
+def _interact(at, page: str, rng: random.Random, tickers: list[str]) -> None:
+    """Change one thing the way a user would before the next rerun (or nothing: a plain rerun)."""
+    action = rng.choice(ACTIONS)
+    if action == "universe":
+        picked = rng.sample(tickers, rng.randint(2, min(MAX_UNIVERSE, len(tickers))))
+        if page == "app.py":
+            # app.py follows the universe last chosen on a page.
+            at.session_state["universe"] = picked
+        for widget in at.multiselect:
+            if widget.label in ("Universe", "Portfolio tickers"):
+                widget.set_value(picked)
+    elif action == "range":
+        start = datetime.date.today() - datetime.timedelta(days=rng.choice(RANGES))
+        for widget in at.date_input:
+            if widget.label == "Start":
+                widget.set_value(start)
+    elif action == "slider":
+        sliders = [s for s in at.slider if not isinstance(s.value, (tuple, list)) and not s.disabled]
+        if sliders:
+            s = rng.choice(sliders)
+            steps = int(round((s.max - s.min) / s.step))
+            value = s.min + s.step * rng.randint(0, steps)
+            s.set_value(round(value, 6) if isinstance(s.min, float) else int(value))
+    elif action == "text":
+        widgets = [w for w in [*at.text_area, *at.text_input] if w.label in TEXT_VALUES]
+        if widgets:
+            w = rng.choice(widgets)
+            w.set_value(rng.choice(TEXT_VALUES[w.label]))
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        return float("nan")
+
+
+def run_level(sessions: int, duration: float, think: float, seed: int) -> dict:
+    """Run `sessions` concurrent sessions for `duration` seconds in this process."""
+    from streamlit.testing.v1 import AppTest
+    from utils.registry import get_registry
+
+    tickers = get_registry().tickers()
+    pages, weights = list(PAGE_WEIGHTS), list(PAGE_WEIGHTS.values())
+    samples: list[tuple[str, str, float, bool]] = []
+    errors: list[tuple[str, str]] = []        # (exception type, message)
+    lock = threading.Lock()
+    base_rss = _rss_mb()
+    cpu0, t0 = sum(os.times()[:2]), time.perf_counter()
+    deadline = t0 + duration
+
+    def session(i: int) -> None:
+        rng = random.Random(seed * 10_007 + i)
+        apps = {}
+        page = rng.choices(pages, weights)[0]
+        while time.perf_counter() < deadline:
+            if rng.random() < 1 / STAY:
+                page = rng.choices(pages, weights)[0]
+            at = apps.get(page)
+            if at is None:
+                at = apps[page] = AppTest.from_file(str(ROOT / page), default_timeout=PAGE_TIMEOUT)
+                kind = "first"
+            else:
+                _interact(at, page, rng, tickers)
+                kind = "rerun"
+            t = time.perf_counter()
+            error = None
+            try:
+                raised = at.run().exception
+                if raised:
+                    error = (raised[0].proto.type, raised[0].proto.message)
+            except Exception as e:
+                error = (type(e).__name__, str(e))
+            elapsed = time.perf_counter() - t
+            if error:
+                print(f"session {i} {page}: {error[0]}: {error[1]}", file=sys.stderr)
+                # A failed AppTest can keep failing on every rerun; start the page over.
+                apps.pop(page, None)
+            with lock:
+                samples.append((kind, page, elapsed, error is None))
+                if error:
+                    errors.append((f"{error[0]} ({page})", error[1]))
+            if think:
+                time.sleep(min(rng.expovariate(1 / think), max(0.0, deadline - time.perf_counter())))
+
+    threads = [threading.Thread(target=session, args=(i,), name=f"load-session-{i}") for i in range(sessions)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    wall = time.perf_counter() - t0
+    cpu = sum(os.times()[:2]) - cpu0
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    reruns = np.array([s[2] for s in samples if s[0] == "rerun" and s[3]])
+    firsts = np.array([s[2] for s in samples if s[0] == "first" and s[3]])
+    pct = lambda a, q: float(np.percentile(a, q)) if len(a) else float("nan")
+    return {
+        "sessions": sessions,
+        "wall_s": wall,
+        "runs": len(samples),
+        "reruns": int(len(reruns)),
+        "errors": sum(not s[3] for s in samples),
+        "error_types": dict(Counter(kind for kind, _ in errors).most_common()),
+        "error_examples": {kind: msg for kind, msg in reversed(errors)},
+        "throughput": len(samples) / wall,
+        "p50": pct(reruns, 50), "p95": pct(reruns, 95), "p99": pct(reruns, 99),
+        "first_p50": pct(firsts, 50),
+        "per_page_p95": {p: pct(np.array([s[2] for s in samples if s[1] == p and s[0] == "rerun" and s[3]]), 95)
+                         for p in pages},
+        "cpu_s": cpu,
+        "cpu_cores": cpu / wall,
+        "cpu_per_run_ms": cpu / max(len(samples), 1) * 1000,
+        "base_rss_mb": base_rss,
+        "peak_rss_mb": peak_rss,
+        "rss_per_session_mb": (peak_rss - base_rss) / sessions,
+    }
+
+
+def report(levels: list[dict], slo: float) -> str:
+    lines = [f"{'sessions':>8} {'runs':>6} {'runs/s':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'first p50':>10} "
+             f"{'errors':>6} {'cpu cores':>9} {'cpu/run':>9} {'peak RSS':>9} {'RSS/sess':>9}"]
+    for r in levels:
+        lines.append(f"{r['sessions']:>8} {r['runs']:>6} {r['throughput']:>7.2f} {r['p50'] * 1000:>6.0f}ms "
+                     f"{r['p95'] * 1000:>6.0f}ms {r['p99'] * 1000:>6.0f}ms {r['first_p50'] * 1000:>8.0f}ms "
+                     f"{r['errors']:>6} {r['cpu_cores']:>9.2f} {r['cpu_per_run_ms']:>7.0f}ms "
+                     f"{r['peak_rss_mb']:>7.0f}MB {r['rss_per_session_mb']:>7.1f}MB")
+    for r in levels:
+        for kind, count in r.get("error_types", {}).items():
+            lines.append(f"  {r['sessions']} sessions: {count} x {kind}: {r['error_examples'][kind][:160]}")
+    ok = [r for r in levels if r["errors"] == 0 and r["p95"] <= slo]
+    if ok:
+        best = max(ok, key=lambda r: r["sessions"])
+        lines.append(f"\nCapacity: {best['sessions']} concurrent sessions at p95 <= {slo:.1f}s "
+                     f"({best['throughput']:.2f} runs/s, {best['peak_rss_mb']:.0f} MB peak, {os.cpu_count()} CPUs)")
+    else:
+        lines.append(f"\nNo session count met p95 <= {slo:.1f}s without errors")
+    return "\n".join(lines)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Simulate concurrent app sessions and report capacity.")
+    parser.add_argument("--sessions", default=",".join(map(str, SESSION_COUNTS)), help="comma-separated session counts")
+    parser.add_argument("--duration", type=float, default=DURATION, help="seconds of load per session count")
+    parser.add_argument("--think", type=float, default=THINK, help="mean seconds between a session's reruns")
+    parser.add_argument("--slo", type=float, default=SLO_P95, help="p95 rerun latency target in seconds")
+    parser.add_argument("--source", default="synthetic", help="data source for every page (synthetic or replay)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the sessions' choices")
+    parser.add_argument("--out", help="also write the report to this file")
+    parser.add_argument("--json", help="write per-level results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="show the app's own output")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_level(args.child, args.duration, args.think, args.seed)
+        Path(args.result).write_text(json.dumps(result))
+        return 0
+
+    levels = []
+    for sessions in (int(s) for s in args.sessions.split(",")):
+        with tempfile.TemporaryDirectory(prefix="dash-load-") as tmp:
+            # Background threads off and the live tape pointed at a closed port, as in bench.run.
+            env = {**os.environ, "DASH_STORE_DIR": tmp, "DASH_SOURCE": args.source, "DASH_WARMUP": "0",
+                   "DASH_HEALTH": "0", "DASH_WS_URL": os.environ.get("DASH_WS_URL", "ws://127.0.0.1:9")}
+            result_path = Path(tmp) / "result.json"
+            print(f"{sessions} sessions for {args.duration:.0f}s...", file=sys.stderr)
+            subprocess.run([sys.executable, "-m", "bench.load", "--child", str(sessions), "--duration", str(args.duration),
+                            "--think", str(args.think), "--seed", str(args.seed), "--result", str(result_path)],
+                           cwd=ROOT, env=env, check=True,
+                           stdout=None if args.verbose else subprocess.DEVNULL,
+                           stderr=None if args.verbose else subprocess.DEVNULL)
+            levels.append(json.loads(result_path.read_text()))
+
+    text = report(levels, args.slo)
+    print(text)
+    if args.out:
+        Path(args.out).write_text(text + "\n")
+    if args.json:
+        Path(args.json).write_text(json.dumps(levels, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,310 @@
+from __future__ import annotations
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from pathlib import Path
+
+# Benchmarks run against replayed fixtures in a throwaway store, with the warm-up and health
+# threads off and the live tape pointed at a closed local port, so nothing touches the network
+# or the developer's own .store/. Set before anything from utils is imported.
+os.environ["DASH_STORE_DIR"] = tempfile.mkdtemp(prefix="dash-bench-")
+os.environ["DASH_WARMUP"] = "0"
+os.environ["DASH_HEALTH"] = "0"
+os.environ.setdefault("DASH_WS_URL", "ws://127.0.0.1:9")
+
+import numpy as np
+import pandas as pd
+
+from bench.fixtures import FIXTURE_DIR, Fixtures, install
+from utils.analytics import analytics_for, clear_analytics
+from utils.backfill import backfill, sweep as sweep_thresholds
+from utils.backtest import CALENDAR_FREQS, BacktestConfig, compare, run as run_backtest
+from utils.optimizer import optimize
+from utils.providers import _decode, clear_price_cache, get_prices, parse_klines
+from utils.registry import get_registry
+from utils.risk import portfolio_risk
+from utils.rules import MetricInputs, compile_rules, default_rules
+from utils.store import get_store
+
+# Benchmark suite: kline parsing, get_prices merge paths, each page's analytics, and full
+# script runs of every page through Streamlit's AppTest, over a matrix of universe sizes and
+# date ranges. Each case reports the median of its repeats and the HTTP requests it made;
+# both are compared with a stored baseline and regressions fail the run.
+#
+#   python -m bench.run                     # full matrix, compared with bench/baseline.json
+#   python -m bench.run --quick --only page # a subset
+#   python -m bench.run --save-baseline     # record this machine's numbers as the baseline
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+PAGES = ["app.py", "pages/1_Market_Watch.py", "pages/2_Portfolio_Vault.py", "pages/3_Alert_Studio.py"]
+UNIVERSES = (2, 8, 32)
+RANGES = (90, 365, 1460)          # days back from today
+QUICK_UNIVERSES = (8,)
+QUICK_RANGES = (365,)
+TOLERANCE = 0.25                  # slower than baseline by more than this fraction is a regression...
+MIN_DELTA = 0.005                 # ...and by more than this many seconds (timer noise on tiny cases)
+PAGE_TIMEOUT = 300
+
+
+class Case:
+    def __init__(self, name: str, fn, setup=None, repeat: int = 5):
+        self.name = name
+        self.fn = fn
+        self.setup = setup
+        self.repeat = repeat
+
+
+def _window(days: int) -> tuple[pd.Timestamp, pd.Timestamp]:
+    today = pd.Timestamp.today().normalize()
+    return today - pd.Timedelta(days=days), today
+
+
+def _reset_data(store: bool = True) -> None:
+    clear_price_cache()
+    clear_analytics()
+    if store:
+        get_store().clear()
+
+
+# -- cases -------------------------------------------------------------------------------------
+
+def parse_cases(fixtures: Fixtures) -> list[Case]:
+    _, rows = fixtures.klines("BTCUSDT")
+    response = SimpleNamespace(content=b"[" + b",".join(rows[-1000:]) + b"]")
+    decoded = _decode(response)
+    return [
+        Case("klines/parse 1000", lambda: parse_klines(decoded), repeat=50),
+        Case("klines/decode+parse 1000", lambda: parse_klines(_decode(response)), repeat=50),
+    ]
+
+
+def price_cases(all_tickers: list[str], universes, ranges) -> list[Case]:
+    cases = []
+    for n in universes:
+        for days in ranges:
+            tickers = all_tickers[:n]
+            start, end = _window(days)
+            half = end - pd.Timedelta(days=days // 2)
+            load = lambda tickers=tickers, start=start, end=end: get_prices(tickers, start, end, source="binance")
+            tag = f"{n}x{days}d"
+            cases += [
+                # nothing cached: every page fetched, parsed, written to the store
+                Case(f"prices/cold {tag}", load, setup=_reset_data),
+                # process restart: served from the Parquet store
+                Case(f"prices/store {tag}", load, setup=lambda: _reset_data(store=False)),
+                # rerun: served from the in-memory range cache
+                Case(f"prices/memory {tag}", load, setup=load),
+                # range extended back in time: gap fetch merged into the stored half
+                Case(f"prices/extend {tag}", load,
+                     setup=lambda tickers=tickers, half=half, end=end: (
+                         _reset_data(), get_prices(tickers, half, end, source="binance"))),
+            ]
+    for source in ("coingecko", "yahoo"):
+        start, end = _window(365)
+        cases.append(Case(f"prices/cold {source} 8x365d", setup=_reset_data, repeat=3,
+                          fn=lambda source=source, start=start, end=end: get_prices(all_tickers[:8], start, end,
+                                                                                      source=source)))
+    return cases
+
+
+def analytics_cases(all_tickers: list[str], universes, ranges) -> list[Case]:
+    cases = []
+    for n in universes:
+        for days in ranges:
+            tickers = all_tickers[:n]
+            start, end = _window(days)
+            tag = f"{n}x{days}d"
+            state = {}
+
+            def load(tickers=tickers, start=start, end=end, state=state):
+                clear_analytics()
+                state["prices"] = get_prices(sorted(set(tickers + ["BTC-USD"])), start, end, source="binance")
+
+            def market_watch(state=state):
+                engine = analytics_for(state["prices"])
+                engine.change_pct(), engine.ann_vol(365), engine.filled(), engine.corr()
+
+            def portfolio_vault(tickers=tickers, state=state):
+                engine = analytics_for(state["prices"])
+                weights = pd.Series(1 / len(tickers), index=tickers)
+                config = BacktestConfig(weights, label="Portfolio")
+                run_backtest(engine, config, "BTC-USD")
+                optimize(engine, tickers)
+                variants = [("daily", "M", 0.05), ("none", "M", 0.05)] + \
+                    [("calendar", f, 0.05) for f in CALENDAR_FREQS] + [("band", "M", b) for b in (0.02, 0.05, 0.10)]
+                compare(engine, [BacktestConfig(weights, s, f, b) for s, f, b in variants])
+                portfolio_risk(engine, config)
+
+            def alert_studio(state=state):
+                prices = state["prices"]
+                engine = analytics_for(prices)
+                rules = default_rules(120, 30, 0.6, 25)
+                compile_rules(rules, list(prices.columns)).run(MetricInputs.from_prices(prices))
+                engine.rolling_vol(30, periods=252, how="any"), engine.rolling_corr("BTC-USD", 30), engine.drawdown()
+                backfill(rules, prices, engine)
+                sweep_thresholds(rules[0], prices, engine=engine)
+
+            cases += [
+                Case(f"analytics/market_watch {tag}", market_watch, setup=load),
+                Case(f"analytics/portfolio_vault {tag}", portfolio_vault, setup=load, repeat=3),
+                Case(f"analytics/alert_studio {tag}", alert_studio, setup=load),
+            ]
+    return cases
+
+
+def page_cases(all_tickers: list[str], universes, ranges) -> list[Case]:
+    from streamlit.testing.v1 import AppTest
+
+    cases = []
+    for page in PAGES:
+        # app.py has no range control of its own; it shows the last 30 days.
+        for days in (ranges if page != "app.py" else ranges[:1]):
+            for n in universes:
+                tickers = all_tickers[:n]
+                start, _ = _window(days)
+                tag = f"{n}x{days}d" if page != "app.py" else f"{n}"
+                state = {}
+
+                def configure(page=page, tickers=tickers, start=start, state=state):
+                    at = AppTest.from_file(str(ROOT / page), default_timeout=PAGE_TIMEOUT)
+                    at.session_state["universe"] = tickers
+                    at.run()
+                    for widget in at.multiselect:
+                        if widget.label in ("Universe", "Portfolio tickers"):
+                            widget.set_value(tickers)
+                    for widget in at.date_input:
+                        if widget.label == "Start":
+                            widget.set_value(start.date())
+                    # Load the data once so the timed run measures the page, not the fetch.
+                    at.run()
+                    clear_analytics()
+                    state["at"] = at
+
+                def timed_run(state=state):
+                    _check(state["at"].run())
+
+                name = Path(page).stem
+                cases += [
+                    # first run on new prices/settings: analytics memo cold, data cache warm
+                    Case(f"page/{name} first {tag}", timed_run, setup=configure, repeat=3),
+                    # widget interaction: everything memoized
+                    Case(f"page/{name} rerun {tag}", timed_run, repeat=3,
+                         setup=lambda configure=configure, state=state: "at" in state or configure()),
+                ]
+    return cases
+
+
+def _check(at) -> None:
+    if at.exception:
+        raise RuntimeError(f"page raised: {at.exception[0].value}")
+
+
+# -- running and comparing ---------------------------------------------------------------------
+
+def run_case(case: Case, adapter) -> dict:
+    times, requests_made = [], []
+    for _ in range(case.repeat):
+        if case.setup is not None:
+            case.setup()
+        before = sum(adapter.counts.values())
+        t0 = time.perf_counter()
+        case.fn()
+        times.append(time.perf_counter() - t0)
+        requests_made.append(sum(adapter.counts.values()) - before)
+    return {"median": statistics.median(times), "min": min(times), "repeat": case.repeat,
+            "http": int(statistics.median(requests_made))}
+
+
+def compare_baseline(results: dict, baseline: dict, tolerance: float, min_delta: float) -> dict[str, str]:
+    """Per case: "regression", "faster", "more requests", "new" or "" (within tolerance)."""
+    flags = {}
+    for name, r in results.items():
+        b = baseline.get(name)
+        if b is None:
+            flags[name] = "new"
+        elif r["median"] > b["median"] * (1 + tolerance) and r["median"] - b["median"] > min_delta:
+            flags[name] = "regression"
+        elif r["http"] > b["http"]:
+            flags[name] = "more requests"
+        elif r["median"] < b["median"] * (1 - tolerance) and b["median"] - r["median"] > min_delta:
+            flags[name] = "faster"
+        else:
+            flags[name] = ""
+    return flags
+
+
+def report(results: dict, baseline: dict, flags: dict[str, str]) -> str:
+    lines = [f"{'case':<44} {'median':>10} {'min':>10} {'baseline':>10} {'change':>8} {'http':>5}  flag"]
+    for name, r in results.items():
+        b = baseline.get(name)
+        base = f"{b['median'] * 1000:9.1f}ms" if b else f"{'-':>10}"
+        change = f"{r['median'] / b['median'] - 1:+7.0%}" if b and b["median"] > 0 else f"{'-':>8}"
+        lines.append(f"{name:<44} {r['median'] * 1000:9.1f}ms {r['min'] * 1000:9.1f}ms {base} {change} "
+                     f"{r['http']:>5}  {flags.get(name, '')}")
+    n_reg = sum(f in ("regression", "more requests") for f in flags.values())
+    lines.append(f"\n{len(results)} cases, {n_reg} regressions")
+    return "\n".join(lines)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Time providers, analytics and page reruns against replayed fixtures.")
+    parser.add_argument("--only", help="regex; run only cases whose name matches")
+    parser.add_argument("--quick", action="store_true", help=f"universe {QUICK_UNIVERSES}, range {QUICK_RANGES} only")
+    parser.add_argument("--repeat", type=int, help="override every case's repeat count")
+    parser.add_argument("--fixtures", default=str(FIXTURE_DIR), help="fixture directory")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH), help="baseline JSON to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="allowed slowdown fraction")
+    parser.add_argument("--out", help="also write the report to this file")
+    args = parser.parse_args()
+
+    fixtures = Fixtures(args.fixtures)
+    adapter = install(fixtures)
+    get_registry().refresh(force=True)
+    listed = set(get_registry().tickers())
+    tickers = [t for t in fixtures.manifest["universe"] if t in listed]
+
+    universes, ranges = (QUICK_UNIVERSES, QUICK_RANGES) if args.quick else (UNIVERSES, RANGES)
+    cases = parse_cases(fixtures) + price_cases(tickers, universes, ranges) \
+        + analytics_cases(tickers, universes, ranges) + page_cases(tickers, universes, ranges)
+    if args.only:
+        cases = [c for c in cases if re.search(args.only, c.name)]
+
+    results = {}
+    for case in cases:
+        if args.repeat:
+            case.repeat = args.repeat
+        results[case.name] = run_case(case, adapter)
+        print(f"{case.name:<44} {results[case.name]['median'] * 1000:9.1f}ms", file=sys.stderr)
+
+    baseline_path = Path(args.baseline)
+    stored = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+    baseline = stored.get("results", {})
+    flags = compare_baseline(results, baseline, args.tolerance, MIN_DELTA)
+    text = report(results, baseline, flags)
+    print(text)
+    if args.out:
+        Path(args.out).write_text(text + "\n")
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps({
+            "saved_at": pd.Timestamp.now(tz="UTC").isoformat(),
+            "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                        "processor": platform.processor(), "cpus": os.cpu_count(),
+                        "numpy": np.__version__, "pandas": pd.__version__},
+            "fixtures": fixtures.manifest.get("kind"),
+            "results": {**baseline, **results},
+        }, indent=2) + "\n")
+        return 0
+    return 1 if any(f in ("regression", "more requests") for f in flags.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,33 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
+from utils.alerts import start_alerts
+from utils.analytics import analytics_for
+from utils.charts import heatmap, line
 from utils.diagnostics import sidebar_diagnostics
-from utils.providers import DEFAULT_UNIVERSE, get_prices
+from utils.providers import DEFAULT_UNIVERSE, INTERVAL_MS, OFFLINE_SOURCES, bars_per_year, get_ohlcv, get_prices, source_index, ticker_options
+from utils.warmup import start_warmup
+
+start_warmup()
+start_alerts()
 
 st.title("🟦 Market Pulse")
 st.caption("Use Normalized to 100 Chart style for best visualization chart")
 
 with st.sidebar:
-    source = st.selectbox("Data source", ["auto", "binance", "yahoo", "coingecko"], index=0)
-    universe = st.multiselect("Universe", DEFAULT_UNIVERSE, default=DEFAULT_UNIVERSE[:6])
+    sources = ["auto", "binance", "yahoo", "coingecko", *OFFLINE_SOURCES]
+    source = st.selectbox("Data source", sources, index=source_index(sources))
+    # Every listed symbol is selectable; the label adds the coin name so it can be typed too.
+    listed = ticker_options()
+    universe = st.multiselect("Universe", list(listed), default=DEFAULT_UNIVERSE[:6], format_func=listed.get)
     st.session_state["universe"] = universe
     start = st.date_input("Start", value=pd.to_datetime("2023-01-01"))
     end = st.date_input("End", value=pd.to_datetime("today"))
+    interval = st.selectbox(
+        "Bar interval",
+        list(reversed(INTERVAL_MS)),
+        index=0,
+        help="Intraday bars add up fast (a year of 1m bars is ~525k rows per ticker); shorten the range for minute data.",
+    )
     scale = st.radio(
         "Chart scale",
         ["Raw prices", "Normalized to 100 (start date)"],
@@ -21,10 +36,11 @@ with st.sidebar:
     )
     sidebar_diagnostics(source, universe, str(start), str(end))
 
-prices = get_prices(universe, pd.to_datetime(start), pd.to_datetime(end), source=source)
+prices = get_prices(universe, pd.to_datetime(start), pd.to_datetime(end), source=source, interval=interval)
 
 with st.expander("Data debug"):
     st.write("Source:", source)
+    st.write("Served by:", prices.attrs.get("provenance", {}))
     st.write("Shape:", prices.shape)
     st.dataframe(prices.tail(10), use_container_width=True)
 
@@ -32,11 +48,9 @@ if prices.empty:
     st.error("No data returned. Switch source or shorten range.")
     st.stop()
 
-latest = prices.ffill().iloc[-1]
-base = prices.ffill().iloc[0]
-change = (latest / base - 1) * 100
-rets = prices.pct_change().dropna(how="all")
-vol = rets.std() * (365 ** 0.5) * 100
+engine = analytics_for(prices)
+change = engine.change_pct()
+vol = engine.ann_vol(bars_per_year(interval))
 
 col_a, col_b, col_c = st.columns(3)
 with col_a:
@@ -76,24 +90,29 @@ with col_c:
 
 st.subheader("Price trajectory")
 if scale.startswith("Normalized"):
-    base = prices.ffill().iloc[0]
+    base = engine.filled().iloc[0]
     display = prices.divide(base).multiply(100)
     y_label = "Indexed to 100 (range start)"
 else:
     display = prices
     y_label = "Close (USD)"
 
-st.plotly_chart(px.line(display, title=None, labels={"value": y_label, "index": "Date"}), use_container_width=True)
+st.plotly_chart(line(display, y_label), use_container_width=True)
 
 st.subheader("Risk + co-movement")
 st.subheader("Risk + co-movement")
 tab1, tab2 = st.tabs(["Correlation Matrix", "Volatility Table"])
 
 with tab1:
-    fig_corr = px.imshow(rets.corr(), text_auto=".2f", aspect="auto", color_continuous_scale="PuBuGn")
+    fig_corr = heatmap(engine.corr(), text_auto=".2f", aspect="auto", color_continuous_scale="PuBuGn")
     # Setting height ensures it doesn't get squashed even if width is small
     st.plotly_chart(fig_corr, use_container_width=True, height=400)
 
 with tab2:
     vol_table = vol.sort_values(ascending=False).to_frame("Ann. Vol %")
-    st.dataframe(vol_table.style.format("{:.1f}"), use_container_width=True)
+    # Served from the same cached bars as the closes above, no extra fetch.
+    bars = get_ohlcv(universe, pd.to_datetime(start), pd.to_datetime(end), source=source, interval=interval)
+    if not bars.empty:
+        dollar_vol = bars.xs("close", axis=1, level=1).astype(float) * bars.xs("volume", axis=1, level=1)
+        vol_table["Avg $ volume / bar (M)"] = dollar_vol.mean() / 1e6
+    st.dataframe(vol_table.style.format("{:.1f}", na_rep="--"), use_container_width=True)
@@ -1,25 +1,48 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from utils.providers import DEFAULT_UNIVERSE, get_prices
+from utils.alerts import start_alerts
+from utils.analytics import analytics_for
+from utils.backtest import CALENDAR_FREQS, BacktestConfig, compare, run
+from utils.charts import line
+from utils.optimizer import optimize, score
+from utils.providers import DEFAULT_UNIVERSE, OFFLINE_SOURCES, get_prices, source_index, ticker_options
+from utils.risk import METHODS, portfolio_risk
+from utils.warmup import start_warmup
+
+start_warmup()
+start_alerts()
 
 
 st.title("🧭 Portfolio Vault")
 st.caption("Set weights, compare against BTC, and review risk/return diagnostics.")
 
 with st.sidebar:
-    source = st.selectbox("Data source", ["auto", "binance", "coingecko"], index=0)
-    universe = st.multiselect("Portfolio tickers", DEFAULT_UNIVERSE, default=DEFAULT_UNIVERSE[:6])
+    sources = ["auto", "binance", "coingecko", *OFFLINE_SOURCES]
+    source = st.selectbox("Data source", sources, index=source_index(sources))
+    # Every listed symbol is selectable; the label adds the coin name so it can be typed too.
+    listed = ticker_options()
+    universe = st.multiselect("Portfolio tickers", list(listed), default=DEFAULT_UNIVERSE[:6], format_func=listed.get)
     st.session_state["universe"] = universe
     start = st.date_input("Start", value=pd.to_datetime("2022-01-01"))
     end = st.date_input("End", value=pd.to_datetime("today"))
     roll_win = st.slider("Rolling vol window (days)", min_value=10, max_value=120, value=30, step=5)
 
+    st.subheader("Rebalancing")
+    # label -> (schedule, calendar frequency)
+    schedules = {"Daily": ("daily", "M"), "Weekly": ("calendar", "W"), "Monthly": ("calendar", "M"),
+                 "Quarterly": ("calendar", "Q"), "Drift band": ("band", "M"), "Buy & hold": ("none", "M")}
+    schedule, freq = schedules[st.selectbox("Rebalance", list(schedules), index=0)]
+    band = st.slider("Drift band (%)", min_value=1, max_value=25, value=5, disabled=schedule != "band") / 100
+    fee_bps = st.number_input("Fee (bps per trade)", value=0.0, min_value=0.0, step=1.0)
+    slippage_bps = st.number_input("Slippage (bps per trade)", value=0.0, min_value=0.0, step=1.0)
+
 tickers = sorted(set(universe + ["BTC-USD"]))
 prices = get_prices(tickers, pd.to_datetime(start), pd.to_datetime(end), source=source)
 
 with st.expander("Data debug"):
     st.write("Source:", source)
+    st.write("Served by:", prices.attrs.get("provenance", {}))
     st.write("Shape:", prices.shape)
     st.dataframe(prices.tail(10), use_container_width=True)
 
@@ -46,22 +69,17 @@ if weights_series.sum() <= 0:
 
 weights_series = weights_series / weights_series.sum()
 
-# Compute returns
-aligned = prices[weights_series.index].ffill().dropna()
-btc = prices["BTC-USD"].ffill().dropna()
-common_index = aligned.index.intersection(btc.index)
-aligned = aligned.loc[common_index]
-btc = btc.loc[common_index]
+# Backtest at the chosen schedule and costs (memoized per price frame + config, so slider moves reuse it)
+engine = analytics_for(prices)
+config = BacktestConfig(weights_series, schedule, freq, band, fee_bps, slippage_bps, label="Portfolio")
+bt = run(engine, config, "BTC-USD")
 
-if aligned.empty or btc.empty:
+if bt is None:
     st.error("Not enough overlapping data for selected tickers and BTC benchmark.")
     st.stop()
 
-rets = aligned.pct_change().dropna()
-port_rets = rets.dot(weights_series)
-btc_rets = btc.pct_change().dropna()
-port_curve = (1 + port_rets).cumprod()
-btc_curve = (1 + btc_rets.loc[port_curve.index]).cumprod()
+port_rets, btc_rets = bt["returns"], bt["bench_rets"]
+port_curve, btc_curve = bt["equity"], bt["bench_curve"]
 
 def cagr(series: pd.Series) -> float:
     if series.empty:
@@ -130,6 +148,9 @@ for card in cards:
     )
 st.markdown("</div>", unsafe_allow_html=True)
 
+summary = bt["summary"]
+st.caption(f"Rebalanced {config.describe().lower()}: {summary['Rebalances']} rebalances, "
+           f"turnover {summary['Turnover (ann)']:.0%}/yr, costs paid {summary['Costs']:.2%} of starting value.")
 st.caption("Weights are normalized to sum to 1.")
 st.dataframe(weights_series.to_frame("Weight").style.format("{:.2%}"), use_container_width=True)
 
@@ -141,16 +162,103 @@ curve_df = pd.DataFrame(
     }
 )
 st.subheader("Equity curve (base = 100)")
-st.plotly_chart(px.line(curve_df, labels={"value": "Growth", "index": "Date"}, title=None), use_container_width=True)
+st.plotly_chart(line(curve_df, "Growth"), use_container_width=True)
 
-dd = curve_df.divide(curve_df.cummax()) - 1
+curves = analytics_for(curve_df)
+dd = curves.drawdown()
 st.subheader("Drawdown")
-st.plotly_chart(px.area(dd, labels={"value": "Drawdown", "index": "Date"}, title=None), use_container_width=True)
+st.plotly_chart(line(dd, "Drawdown", area=True), use_container_width=True)
 
 # Rolling volatility
-roll_port = port_rets.rolling(roll_win).std() * (252 ** 0.5) * 100
-roll_btc = btc_rets.rolling(roll_win).std() * (252 ** 0.5) * 100
-roll_df = pd.DataFrame({"Portfolio": roll_port, "BTC": roll_btc}).dropna()
+roll_df = curves.rolling_vol(roll_win).dropna()
 
 st.subheader(f"Rolling volatility ({roll_win}d, annualized)")
-st.plotly_chart(px.line(roll_df, labels={"value": "Vol %", "index": "Date"}, title=None), use_container_width=True)
+st.plotly_chart(line(roll_df, "Vol %"), use_container_width=True)
+
+# Optimizer
+st.subheader("Optimizer")
+st.caption("Long-only portfolios from daily returns over the common history of the selected tickers (rf = 0).")
+opt_cols = st.columns(2)
+with opt_cols[0]:
+    n_samples = st.select_slider("Random portfolios", options=[10_000, 50_000, 100_000, 250_000, 500_000], value=100_000)
+with opt_cols[1]:
+    seed = st.number_input("Seed", value=0, step=1, min_value=0)
+
+opt = optimize(engine, list(weights_series.index), n_samples=n_samples, seed=int(seed))
+if opt is None:
+    st.info("Not enough overlapping history to optimize.")
+else:
+    current = weights_series.reindex(opt["columns"]).fillna(0).to_numpy()
+    cur_ret, cur_vol = score(current[None, :], opt["mu"], opt["cov"])
+    stats = pd.concat([
+        opt["stats"],
+        pd.DataFrame({"Return (ann)": cur_ret, "Vol (ann)": cur_vol, "Sharpe": cur_ret / cur_vol}, index=["Your weights"]),
+    ])
+
+    # The full cloud is scored; optimize keeps a fixed sample of it, drawn with WebGL.
+    fig = px.scatter(opt["cloud"], x="vol", y="ret", color="sharpe", color_continuous_scale="PuBuGn", opacity=0.5,
+                     render_mode="webgl", labels={"vol": "Vol (ann)", "ret": "Return (ann)", "sharpe": "Sharpe"})
+    fig.add_scatter(x=opt["frontier"]["vol"], y=opt["frontier"]["ret"], mode="lines", name="Efficient frontier",
+                    line=dict(color="#f58518", width=3))
+    fig.add_scatter(x=stats["Vol (ann)"], y=stats["Return (ann)"], mode="markers+text", text=stats.index,
+                    textposition="top center", name="Portfolios", marker=dict(size=12, color="#e45756", symbol="diamond"))
+    st.plotly_chart(fig, use_container_width=True)
+
+    st.dataframe(stats.style.format({"Return (ann)": "{:.2%}", "Vol (ann)": "{:.2%}", "Sharpe": "{:.2f}"}),
+                 use_container_width=True)
+    st.dataframe(opt["weights"].assign(**{"Your weights": current}).style.format("{:.2%}"), use_container_width=True)
+
+# Schedule comparison: every weight set above at every schedule, with the sidebar's costs.
+st.subheader("Schedule comparison")
+st.caption("Each weight set backtested under every rebalancing schedule; sorted by Sharpe.")
+weight_sets = {"Your weights": weights_series}
+if opt is not None:
+    weight_sets.update({name: w[w > 1e-6] for name, w in opt["weights"].items()})
+variants = [("daily", "M", band), ("none", "M", band)] + [("calendar", f, band) for f in CALENDAR_FREQS] \
+    + [("band", "M", b) for b in (0.02, 0.05, 0.10)]
+configs = []
+for name, w in weight_sets.items():
+    for sch, f, b in variants:
+        cfg = BacktestConfig(w, sch, f, b, fee_bps, slippage_bps)
+        cfg.label = f"{name} · {cfg.label}"
+        configs.append(cfg)
+table = compare(engine, configs)
+if table is not None:
+    st.dataframe(
+        table.style.format({"CAGR": "{:.2%}", "Vol (ann)": "{:.2%}", "Sharpe": "{:.2f}", "Max DD": "{:.2%}",
+                            "Turnover (ann)": "{:.0%}", "Costs": "{:.2%}"}),
+        use_container_width=True,
+    )
+
+# Monte Carlo risk of the backtested portfolio (schedule and costs as in the sidebar)
+st.subheader("Monte Carlo risk")
+st.caption("Simulated wealth paths from the portfolio's daily returns (seeded with the optimizer's seed); losses are over the whole horizon.")
+mc_cols = st.columns(4)
+with mc_cols[0]:
+    method = st.selectbox("Simulation", list(METHODS), format_func=METHODS.get)
+with mc_cols[1]:
+    horizon = st.slider("Horizon (days)", min_value=30, max_value=1095, value=365, step=5)
+with mc_cols[2]:
+    n_paths = st.select_slider("Paths", options=[10_000, 50_000, 100_000, 250_000, 1_000_000], value=100_000)
+with mc_cols[3]:
+    block = st.number_input("Bootstrap block (days)", value=5, min_value=1, max_value=60, step=1,
+                            disabled=method != "bootstrap")
+
+risk = portfolio_risk(engine, config, horizon=horizon, n_paths=n_paths, method=method, block=int(block), seed=int(seed))
+if risk is None:
+    st.info("Not enough history to simulate from.")
+else:
+    summary = risk["summary"]["value"]
+    fmt = {k: ("{:.0f}" if "bars" in k else "{:.2%}") for k in summary.index}
+    st.dataframe(summary.to_frame().T.style.format(fmt), use_container_width=True)
+
+    fan_tab, ret_tab, dd_tab = st.tabs(["Wealth fan", "Horizon return", "Max drawdown"])
+    with fan_tab:
+        st.plotly_chart(line(risk["fan"] * 100, "Growth", x_label="Day", legend_title="Percentile"),
+                        use_container_width=True)
+    # Histograms come binned, so only the bin counts go to the browser, however many paths.
+    for tab, key, label in [(ret_tab, "terminal", "Horizon return %"), (dd_tab, "max_dd", "Max drawdown %")]:
+        with tab:
+            counts = risk["histograms"][key]
+            hist = pd.DataFrame({label: counts.index * 100, "Paths": counts.to_numpy()})
+            st.plotly_chart(px.bar(hist, x=label, y="Paths"), use_container_width=True)
@@ -1,28 +1,70 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-from utils.providers import DEFAULT_UNIVERSE, get_prices
+from utils.alerts import RuleSet, save_ruleset, start_alerts
+from utils.analytics import analytics_for
+from utils.backfill import backfill, sweep
+from utils.charts import heatmap, line
+from utils.providers import DEFAULT_UNIVERSE, OFFLINE_SOURCES, get_prices, source_index, ticker_options
+from utils.rules import MetricInputs, Rule, compile_rules, default_rules
+from utils.warmup import start_warmup
+
+start_warmup()
+start_alerts()
 
 
 st.title("🚨 Alert Studio")
 st.caption("Track volatility spikes, correlation breaks, and drawdown breaches for your crypto universe.")
 
 with st.sidebar:
-    source = st.selectbox("Data source", ["auto", "binance", "coingecko"], index=0)
-    universe = st.multiselect("Universe", DEFAULT_UNIVERSE, default=DEFAULT_UNIVERSE[:6])
+    sources = ["auto", "binance", "coingecko", *OFFLINE_SOURCES]
+    source = st.selectbox("Data source", sources, index=source_index(sources))
+    # Every listed symbol is selectable; the label adds the coin name so it can be typed too.
+    listed = ticker_options()
+    universe = st.multiselect("Universe", list(listed), default=DEFAULT_UNIVERSE[:6], format_func=listed.get)
     st.session_state["universe"] = universe
     start = st.date_input("Start", value=pd.to_datetime("2022-01-01"))
     end = st.date_input("End", value=pd.to_datetime("today"))
     vol_thr = st.slider("Volatility spike when 30D ann. vol exceeds (%)", 20, 250, 120, step=5)
     corr_window = st.slider("Correlation lookback (days)", 10, 120, 30, step=5)
+    corr_style = st.radio("Correlation weighting", ["Rolling window", "Exponential (half-life = lookback / 2)"])
     corr_thr = st.slider("Correlation break when BTC corr falls below", -1.0, 1.0, 0.6, step=0.05)
     dd_thr = st.slider("Drawdown exceeds (%)", 5, 90, 25, step=5)
+    extra_rules = st.text_area(
+        "Extra rules (one per line)",
+        placeholder="vol(90) > 80\nreturn(7) <= -15 on SOL-USD,ETH-USD",
+        help="`<metric>[(window)] <comparator> <threshold> [on tickers]`; metrics: vol, corr, ecorr, drawdown (%), return (%).",
+    )
+
+    # The sliders are three rules like any other; everything is evaluated in one batch below.
+    rules = default_rules(vol_thr, corr_window, corr_thr, dd_thr, ewm=corr_style != "Rolling window")
+    for rule_text in extra_rules.splitlines():
+        if rule_text.strip():
+            try:
+                rules.append(Rule.parse(rule_text))
+            except ValueError as e:
+                st.warning(str(e))
+
+    with st.expander("Run these alerts in the background"):
+        st.caption("Saved rule sets are evaluated by the alert worker (`python worker.py`) even with no page open.")
+        ruleset_name = st.text_input("Rule set name", value="default")
+        sink_specs = st.text_input("Send to", value="stdout",
+                                   help="Comma-separated: stdout, file:<path>, webhook:<url>")
+        if st.button("Save rule set"):
+            try:
+                save_ruleset(RuleSet(
+                    ruleset_name.strip(), universe=universe, source=source, rules=rules,
+                    sinks=[s.strip() for s in sink_specs.split(",") if s.strip()],
+                ))
+                st.success(f"Saved rule set {ruleset_name.strip()!r}.")
+            except (ValueError, OSError) as e:
+                st.error(f"Could not save rule set: {e}")
 
 tickers = sorted(set(universe + ["BTC-USD"]))
 prices = get_prices(tickers, pd.to_datetime(start), pd.to_datetime(end), source=source)
 
 with st.expander("Data debug"):
     st.write("Source:", source)
+    st.write("Served by:", prices.attrs.get("provenance", {}))
     st.write("Shape:", prices.shape)
     st.dataframe(prices.tail(10), use_container_width=True)
 
@@ -30,36 +72,32 @@ if prices.empty:
     st.error("No data returned. Switch source or shorten range.")
     st.stop()
 
-rets = prices.pct_change().dropna()
+engine = analytics_for(prices)
+rets = engine.returns(how="any")
 if rets.empty:
     st.error("No return series available for alerts.")
     st.stop()
 
-# Volatility spike
-vol30 = rets.rolling(30).std() * (252 ** 0.5) * 100
-latest_vol = vol30.iloc[-1].dropna()
-vol_alerts = latest_vol[latest_vol > vol_thr].sort_values(ascending=False)
+triggered = compile_rules(rules, list(prices.columns)).run(MetricInputs.from_prices(prices))
 
-# Correlation break vs BTC
+alerts = []
+for rule in rules:
+    hits = triggered[triggered["rule"] == rule.name].set_index("ticker")["value"]
+    if not hits.empty:
+        # Most extreme first: highest for "above" rules, lowest for "below" rules.
+        alerts.append((rule.name, hits.sort_values(ascending=rule.comparator.startswith("<"))))
+corr_alerts = triggered.loc[triggered["rule"] == "Correlation break vs BTC", "value"]
+
+# Chart series
+vol30 = engine.rolling_vol(30, periods=252, how="any")
+latest_vol = vol30.iloc[-1].dropna()
 if "BTC-USD" in rets.columns:
-    window_slice = rets.tail(corr_window)
-    corr_to_btc = window_slice.corr().loc[:, "BTC-USD"].drop("BTC-USD", errors="ignore")
-    corr_alerts = corr_to_btc[corr_to_btc < corr_thr].sort_values()
-else:
-    corr_alerts = pd.Series(dtype=float)
-
-# Drawdown exceeds
-dd = prices.ffill().div(prices.ffill().cummax()) - 1
+    if corr_style == "Rolling window":
+        corr_series = engine.rolling_corr("BTC-USD", corr_window)
+    else:
+        corr_series = engine.ewm_corr("BTC-USD", corr_window / 2)
+dd = engine.drawdown()
 latest_dd = dd.iloc[-1].dropna()
-dd_alerts = latest_dd[latest_dd <= -dd_thr / 100].sort_values()
-
-alerts = []
-if not vol_alerts.empty:
-    alerts.append(("Volatility spike", vol_alerts))
-if not corr_alerts.empty:
-    alerts.append(("Correlation break vs BTC", corr_alerts))
-if not dd_alerts.empty:
-    alerts.append(("Drawdown exceeds", dd_alerts))
 
 st.subheader("Triggered alerts")
 if not alerts:
@@ -81,18 +119,47 @@ with col3:
 
 # Plots
 st.subheader("30D annualized volatility")
-st.plotly_chart(px.line(vol30, labels={"value": "Vol %", "index": "Date"}, title=None), use_container_width=True)
+st.plotly_chart(line(vol30, "Vol %"), use_container_width=True)
 
 if "BTC-USD" in rets.columns:
     st.subheader(f"{corr_window}D correlation to BTC")
+    st.plotly_chart(line(corr_series, "Corr"), use_container_width=True)
+
+st.subheader("Drawdown (relative to asset peak)")
+st.plotly_chart(line(dd, "Drawdown", area=True), use_container_width=True)
+
+st.subheader("Alert history & threshold tuning")
+tab_hist, tab_sweep = st.tabs(["Event history", "Threshold sweep"])
+
+with tab_hist:
+    events = backfill(rules, prices, engine)
+    if events.empty:
+        st.info("None of the current rules would have fired in the selected range.")
+    else:
+        st.caption("Every stretch of bars on which each rule would have been triggered in the selected range.")
+        summary = events.groupby(["rule", "ticker"]).agg(events=("bars", "size"), bars=("bars", "sum"),
+                                                         longest=("bars", "max"))
+        st.dataframe(summary, use_container_width=True)
+        st.dataframe(events.sort_values("start", ascending=False), use_container_width=True, hide_index=True)
+
+with tab_sweep:
+    sweep_rule = rules[st.selectbox("Rule to tune", range(len(rules)), format_func=lambda i: rules[i].name)]
+    c1, c2 = st.columns(2)
+    with c1:
+        target_dd = st.slider("Target: drawdown reaches (%)", 5, 90, min(dd_thr + 10, 90), step=5,
+                              help="Precision and lead time measure how often, and how early, an alert preceded this.")
+    with c2:
+        horizon = st.slider("Within (bars)", 5, 180, 30, step=5)
+    surfaces = sweep(sweep_rule, prices, target=Rule("drawdown", "<=", -target_dd), horizon=horizon, engine=engine)
+    surface = st.radio("Surface", ["Hit rate (% of bars)", "Events", "Precision", "Lead time (bars)"], horizontal=True)
+    data = {
+        "Hit rate (% of bars)": surfaces["hit_rate"] * 100,
+        "Events": surfaces["events"],
+        "Precision": surfaces["precision"],
+        "Lead time (bars)": surfaces["lead_time"],
+    }[surface]
     st.plotly_chart(
-        px.line(
-            rets.rolling(corr_window).corr().loc[pd.IndexSlice[:, "BTC-USD"], :].droplevel(1, axis=0),
-            labels={"value": "Corr", "index": "Date"},
-            title=None,
-        ),
+        heatmap(data, aspect="auto", color_continuous_scale="PuBuGn", origin="lower",
+                  labels={"x": "Ticker", "y": f"{sweep_rule.metric} threshold", "color": surface}),
         use_container_width=True,
     )
-
-st.subheader("Drawdown (relative to asset peak)")
-st.plotly_chart(px.area(dd, labels={"value": "Drawdown", "index": "Date"}, title=None), use_container_width=True)
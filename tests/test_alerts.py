@@ -0,0 +1,35 @@
+import pandas as pd
+import pytest
+
+from utils import alerts
+from utils.alerts import AlertDaemon, RuleSet, save_ruleset
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    """A daemon over one always-firing rule set, and a switch that makes ETH-USD fail to load."""
+    rules = tmp_path / "rulesets.json"
+    save_ruleset(RuleSet("all", universe=["ETH-USD"], source="synthetic", rules=["vol(30) > 0"],
+                         sinks=["stdout"]), rules)
+    real = alerts.get_prices
+    broken = {"on": False}
+
+    def get_prices(tickers, *args, **kwargs):
+        prices = real(tickers, *args, **kwargs)
+        return prices.drop(columns="ETH-USD") if broken["on"] else prices
+
+    monkeypatch.setattr(alerts, "get_prices", get_prices)
+    monkeypatch.setattr(alerts, "ALERT_START", pd.Timestamp.today().normalize() - pd.Timedelta(days=90))
+    return AlertDaemon(rules, tmp_path / "state.json"), broken
+
+
+def test_failed_fetch_keeps_alert_state(daemon):
+    d, broken = daemon
+    assert [e["ticker"] for e in d.run_once()] == ["ETH-USD"]
+
+    broken["on"] = True
+    assert d.run_once() == []
+    assert "all|vol(30) > 0|ETH-USD" in d.active
+
+    broken["on"] = False
+    assert d.run_once() == []
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import providers
+from utils.store import PriceStore
+
+DAY = pd.Timestamp("2024-03-05")
+
+
+@pytest.fixture
+def hourly(tmp_path, monkeypatch):
+    """A store in tmp_path, a settable clock and an upstream serving every hourly bar opened so far."""
+    store = PriceStore(tmp_path)
+    clock = {"now": DAY + pd.Timedelta("3h15min")}
+    calls = []
+
+    def fetch(tickers, start, end, interval="1d"):
+        calls.append((start, end))
+        idx = pd.date_range(start, clock["now"].floor("h"), freq="h")
+        return {t: providers._bars_frame(idx, np.arange(len(idx) * 6, dtype=np.float32).reshape(-1, 6))
+                for t in tickers}
+
+    monkeypatch.setattr(providers, "get_store", lambda: store)
+    monkeypatch.setattr(providers, "_utcnow", lambda: clock["now"])
+    monkeypatch.setitem(providers._FETCHERS, "test", fetch)
+    return store, clock, calls
+
+
+def test_intraday_second_fetch_same_day_gets_newer_bars(hourly):
+    store, clock, calls = hourly
+    first = providers._load_from_store("test", ["X"], DAY, DAY, "1h")["X"]
+    assert first.index[-1] == DAY + pd.Timedelta("3h")
+    assert store.coverage("test", "X", "1h")[1] == DAY + pd.Timedelta("3h")
+
+    clock["now"] = DAY + pd.Timedelta("7h40min")
+    second = providers._load_from_store("test", ["X"], DAY, DAY, "1h")["X"]
+    assert second.index[-1] == DAY + pd.Timedelta("7h")
+    assert len(second) == 8
+    # Only the tail was fetched again, from the last stored (possibly forming) bar.
+    assert calls[-1][0] == DAY + pd.Timedelta("3h")
+
+
+def test_intraday_complete_day_is_not_refetched(hourly):
+    store, clock, calls = hourly
+    clock["now"] = DAY + pd.Timedelta(days=2)
+    providers._load_from_store("test", ["X"], DAY, DAY, "1h")
+    assert store.coverage("test", "X", "1h")[1] == DAY + pd.Timedelta("23h")
+    assert store.missing_ranges("test", "X", "1h", DAY, DAY + pd.Timedelta("23h"), pd.Timedelta("1h"),
+                                now=clock["now"]) == []
@@ -0,0 +1,365 @@
+from __future__ import annotations
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils.metrics import get_metrics
+from utils.net import get_client
+from utils.providers import DEFAULT_UNIVERSE, INTERVAL_MS, get_prices
+from utils.rules import BENCHMARK, CompiledRules, MetricInputs, Rule, default_rules
+from utils.store import STORE_DIR
+
+# Headless evaluation of the Alert Studio rules. Rule sets are saved from the page (or
+# edited by hand) as JSON; an evaluator evaluates them on a schedule and pushes newly
+# triggered alerts to each rule set's sinks. By default it is a background thread of the web
+# process (start_alerts), which is the process the page saves to. A separate worker process
+# (worker.py, DASH_ALERTS=worker) only sees the page's rule sets if both processes have
+# DASH_ALERT_DIR on the same shared volume: dynos and containers don't share local disk.
+#
+# Per-ticker state is folded forward one closed bar at a time (last close, running peak,
+# a ring of recent returns) and persisted, so each run only loads the bars that arrived
+# since the last one. The still-forming bar is evaluated on top of the state without
+# being folded in, like the page does with today's partial candle.
+
+ALERTS_DIR = Path(os.environ.get("DASH_ALERT_DIR", STORE_DIR / "alerts"))
+RULESETS_PATH = Path(os.environ.get("DASH_ALERT_RULES", ALERTS_DIR / "rulesets.json"))
+STATE_PATH = ALERTS_DIR / "state.json"
+# "web" evaluates in a thread of the Streamlit process; "worker" leaves it to worker.py.
+RUNNER = os.environ.get("DASH_ALERTS", "web")
+
+ALERT_START = pd.Timestamp("2022-01-01")   # drawdown peaks are measured from here
+MAX_WINDOW = 365                           # returns kept per ticker; bounds rule windows
+RUN_EVERY = float(os.environ.get("DASH_ALERT_EVERY", 300))
+
+
+class RuleSet:
+    """A saved group of rules sharing a universe, data source and sinks.
+
+    Older files that carry Alert Studio's slider values (vol_thr, corr_window, corr_thr,
+    dd_thr) instead of `rules` are read as the equivalent three rules.
+    """
+
+    FIELDS = {
+        "universe": DEFAULT_UNIVERSE[:6],
+        "source": "auto",
+        "interval": "1d",
+        "rules": None,
+        "sinks": ["stdout"],
+    }
+    LEGACY = {"vol_thr": 120.0, "corr_window": 30, "corr_thr": 0.6, "dd_thr": 25.0}
+
+    def __init__(self, name: str, **kwargs):
+        unknown = set(kwargs) - set(self.FIELDS) - set(self.LEGACY)
+        if unknown:
+            raise ValueError(f"Rule set {name!r}: unknown fields {sorted(unknown)}")
+        self.name = name
+        for field, default in self.FIELDS.items():
+            setattr(self, field, kwargs.get(field, default))
+        if self.interval not in INTERVAL_MS:
+            raise ValueError(f"Rule set {name!r}: unknown interval {self.interval!r}")
+        if self.rules is None:
+            legacy = {k: kwargs.get(k, v) for k, v in self.LEGACY.items()}
+            self.rules = default_rules(**legacy)
+        self.rules = [Rule.from_spec(r) for r in self.rules]
+        for r in self.rules:
+            if r.window is not None and r.window > MAX_WINDOW:
+                raise ValueError(f"Rule set {name!r}: {r.text()} exceeds the {MAX_WINDOW}-bar history kept")
+        for spec in self.sinks:
+            make_sink(spec)
+
+    @property
+    def tickers(self) -> list[str]:
+        named = {t for r in self.rules for t in (r.universe or ())}
+        return sorted(set(self.universe) | named | {BENCHMARK})
+
+    def as_dict(self) -> dict:
+        d = {"name": self.name, **{field: getattr(self, field) for field in self.FIELDS}}
+        d["rules"] = [r.as_dict() for r in self.rules]
+        return d
+
+
+def load_rulesets(path: Path | str = RULESETS_PATH) -> list[RuleSet]:
+    try:
+        raw = json.loads(Path(path).read_text())
+    except FileNotFoundError:
+        return []
+    return [RuleSet(**entry) for entry in raw]
+
+
+def save_ruleset(ruleset: RuleSet, path: Path | str = RULESETS_PATH) -> None:
+    """Insert or replace (by name) a rule set in the rules file."""
+    path = Path(path)
+    rulesets = {rs.name: rs for rs in load_rulesets(path)}
+    rulesets[ruleset.name] = ruleset
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps([rs.as_dict() for rs in rulesets.values()], indent=2))
+    os.replace(tmp, path)
+
+
+# -- sinks -----------------------------------------------------------------------------------
+
+class StdoutSink:
+    def send(self, event: dict) -> None:
+        print(json.dumps(event), file=sys.stdout, flush=True)
+
+
+class FileSink:
+    """Appends one JSON object per line."""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def send(self, event: dict) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock, self.path.open("a") as f:
+            f.write(json.dumps(event) + "\n")
+
+
+class WebhookSink:
+    """POSTs each event as JSON through the shared client (so a dead endpoint trips its breaker)."""
+
+    def __init__(self, url: str, timeout: float = 5):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, event: dict) -> None:
+        r = get_client().post(self.url, json=event, timeout=self.timeout)
+        r.raise_for_status()
+
+
+def make_sink(spec: str):
+    """"stdout", "file:<path>", "webhook:<url>" or a bare http(s) URL."""
+    if spec == "stdout":
+        return StdoutSink()
+    if spec.startswith("file:"):
+        return FileSink(spec[len("file:"):])
+    if spec.startswith("webhook:"):
+        return WebhookSink(spec[len("webhook:"):])
+    if spec.startswith(("http://", "https://")):
+        return WebhookSink(spec)
+    raise ValueError(f"Unknown alert sink {spec!r}")
+
+
+# -- incremental state -----------------------------------------------------------------------
+
+class SeriesState:
+    """What the rules need from one ticker's history, advanced bar by closed bar."""
+
+    def __init__(self, window: int = MAX_WINDOW):
+        self.last_ts: int | None = None          # epoch ns of the last folded bar
+        self.last_close = math.nan
+        self.peak = math.nan
+        self.rets: deque[tuple[int, float]] = deque(maxlen=window)
+
+    def fold(self, ts: int, close: float) -> None:
+        if self.last_ts is not None and ts <= self.last_ts:
+            return
+        if not math.isnan(self.last_close):
+            self.rets.append((ts, close / self.last_close - 1))
+        self.last_ts = ts
+        self.last_close = close
+        self.peak = close if math.isnan(self.peak) else max(self.peak, close)
+
+    def view(self, forming: tuple[int, float] | None) -> tuple[list[tuple[int, float]], float, float]:
+        """(returns, close, peak) including the forming bar, without folding it in."""
+        rets, close, peak = list(self.rets), self.last_close, self.peak
+        if forming is not None and (self.last_ts is None or forming[0] > self.last_ts):
+            ts, px = forming
+            if not math.isnan(close):
+                rets.append((ts, px / close - 1))
+            close = px
+            peak = px if math.isnan(peak) else max(peak, px)
+        return rets, close, peak
+
+    def as_dict(self) -> dict:
+        return {"last_ts": self.last_ts, "last_close": self.last_close, "peak": self.peak,
+                "rets": list(self.rets)}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "SeriesState":
+        s = cls()
+        s.last_ts = d.get("last_ts")
+        s.last_close = d.get("last_close", math.nan)
+        s.peak = d.get("peak", math.nan)
+        s.rets.extend(tuple(r) for r in d.get("rets", []))
+        return s
+
+
+class AlertDaemon:
+    def __init__(self, rules_path: Path | str = RULESETS_PATH, state_path: Path | str = STATE_PATH,
+                 every: float = RUN_EVERY):
+        self.rules_path = Path(rules_path)
+        self.state_path = Path(state_path)
+        self.every = every
+        self.series: dict[str, SeriesState] = {}
+        self.active: set[str] = set()            # alerts currently triggered, so each fires once
+        self._load_state()
+
+    def _load_state(self) -> None:
+        try:
+            raw = json.loads(self.state_path.read_text())
+        except (OSError, ValueError):
+            return
+        self.series = {k: SeriesState.from_dict(v) for k, v in raw.get("series", {}).items()}
+        self.active = set(raw.get("active", []))
+
+    def _save_state(self) -> None:
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"series": {k: s.as_dict() for k, s in self.series.items()},
+                                   "active": sorted(self.active)}))
+        os.replace(tmp, self.state_path)
+
+    def _advance(self, source: str, interval: str,
+                 tickers: list[str]) -> tuple[dict[str, tuple[int, float]], set[str]]:
+        """Fold newly closed bars into the state.
+
+        Returns each ticker's forming bar, if any, and the tickers that couldn't be loaded.
+        """
+        keys = {t: f"{source}:{interval}:{t}" for t in tickers}
+        known = [self.series[k].last_ts for k in keys.values() if k in self.series]
+        # Only tickers never seen before need the full history; the rest resume from their
+        # last folded bar (the store/cache make re-reading that day cheap).
+        since = ALERT_START if len(known) < len(keys) else pd.Timestamp(min(known), unit="ns").normalize()
+        today = pd.Timestamp.today().normalize()
+        prices = get_prices(tickers, since, today, source=source, interval=interval)
+        now_ns = pd.Timestamp.now("UTC").tz_localize(None).value
+        step_ns = INTERVAL_MS[interval] * 1_000_000
+
+        forming, failed = {}, set()
+        for t, key in keys.items():
+            if t not in prices.columns:
+                failed.add(t)
+                continue
+            col = prices[t].dropna()
+            state = self.series.setdefault(key, SeriesState())
+            ts = col.index.as_unit("ns").asi8
+            closes = col.to_numpy()
+            closed = ts + step_ns <= now_ns
+            for i in np.flatnonzero(closed & (ts > (state.last_ts if state.last_ts is not None else -1))):
+                state.fold(int(ts[i]), float(closes[i]))
+            if len(ts) and not closed[-1]:
+                forming[t] = (int(ts[-1]), float(closes[-1]))
+        return forming, failed
+
+    def _inputs(self, source: str, interval: str, tickers: list[str],
+                forming: dict[str, tuple[int, float]]) -> MetricInputs:
+        rets, close, peak = {}, {}, {}
+        for t in tickers:
+            state = self.series.get(f"{source}:{interval}:{t}")
+            if state is None or state.last_ts is None:
+                continue
+            r, close[t], peak[t] = state.view(forming.get(t))
+            rets[t] = pd.Series([v for _, v in r], index=[ts for ts, _ in r], dtype=np.float64)
+        frame = pd.DataFrame(rets).sort_index().tail(MAX_WINDOW)
+        return MetricInputs(frame, pd.Series(close, dtype=np.float64).reindex(tickers),
+                            pd.Series(peak, dtype=np.float64))
+
+    def evaluate(self, rulesets: list[RuleSet], forming: dict[str, tuple[int, float]]) -> list[dict]:
+        """Every alert currently triggered by rule sets sharing one source/interval.
+
+        All their rules are compiled into one batch, each restricted to its rule set's
+        universe, and evaluated in a single pass over the shared metric matrix.
+        """
+        if not rulesets:
+            return []
+        source, interval = rulesets[0].source, rulesets[0].interval
+        tickers = sorted(set().union(*(rs.tickers for rs in rulesets)))
+        rules, owners = [], []
+        for rs in rulesets:
+            for r in rs.rules:
+                rules.append(Rule(r.metric, r.comparator, r.threshold, r.window, r.universe or rs.universe, r.name))
+                owners.append(rs.name)
+        compiled = CompiledRules(rules, tickers)
+        hits, values = compiled.evaluate(compiled.metrics(self._inputs(source, interval, tickers, forming)))
+        return [
+            {"ruleset": owners[i], "rule": rules[i].name, "ticker": tickers[j],
+             "value": round(float(values[i, j]), 4), "threshold": rules[i].threshold}
+            for i, j in zip(*np.nonzero(hits))
+        ]
+
+    def run_once(self) -> list[dict]:
+        """Advance state, evaluate every rule set and send alerts that just started firing.
+
+        Alerts on tickers that failed to load keep their previous state: they neither fire
+        nor clear until the ticker loads again, so a transient fetch error doesn't re-send them.
+        """
+        rulesets = load_rulesets(self.rules_path)
+        groups: dict[tuple[str, str], list[RuleSet]] = {}
+        for rs in rulesets:
+            groups.setdefault((rs.source, rs.interval), []).append(rs)
+        sinks = {rs.name: [make_sink(spec) for spec in rs.sinks] for rs in rulesets}
+
+        fired, active = [], set()
+        fired_at = pd.Timestamp.now("UTC").isoformat()
+        for (source, interval), members in groups.items():
+            tickers = sorted(set().union(*(rs.tickers for rs in members)))
+            try:
+                forming, failed = self._advance(source, interval, tickers)
+            except Exception as e:
+                print(f"Alert prices for {source}/{interval} failed: {type(e).__name__}: {e}")
+                forming, failed = None, set(tickers)
+            names = {rs.name for rs in members}
+            active |= {key for key in self.active
+                       if key.split("|", 1)[0] in names and key.rsplit("|", 1)[1] in failed}
+            if forming is None:
+                continue
+            for event in self.evaluate(members, forming):
+                if event["ticker"] in failed:
+                    continue
+                key = f"{event['ruleset']}|{event['rule']}|{event['ticker']}"
+                active.add(key)
+                if key in self.active:
+                    continue
+                event["fired_at"] = fired_at
+                fired.append(event)
+                for sink in sinks[event["ruleset"]]:
+                    try:
+                        sink.send(event)
+                    except Exception as e:
+                        print(f"Alert sink {type(sink).__name__} failed: {type(e).__name__}: {e}")
+        self.active = active
+        self._save_state()
+        return fired
+
+    def run_forever(self, metrics_path: Path | str | None = None) -> None:
+        """Evaluate every `every` seconds; optionally rewrite a Prometheus textfile after each run."""
+        metrics = get_metrics()
+        while True:
+            t0 = time.monotonic()
+            try:
+                with metrics.span("alert_run"):
+                    fired = self.run_once()
+                print(f"Alert run: {len(fired)} new alerts in {time.monotonic() - t0:.1f}s")
+            except Exception as e:
+                print(f"Alert run failed: {type(e).__name__}: {e}")
+            if metrics_path:
+                metrics.write_textfile(metrics_path)
+            time.sleep(max(self.every - (time.monotonic() - t0), 1.0))
+
+
+_daemon_thread: threading.Thread | None = None
+_daemon_lock = threading.Lock()
+
+
+def start_alerts() -> threading.Thread | None:
+    """Start the process-wide evaluator thread on first call (when DASH_ALERTS=web)."""
+    global _daemon_thread
+    if RUNNER != "web":
+        return None
+    with _daemon_lock:
+        if _daemon_thread is None:
+            _daemon_thread = threading.Thread(target=AlertDaemon().run_forever, name="alert-evaluator",
+                                              daemon=True)
+            _daemon_thread.start()
+        return _daemon_thread
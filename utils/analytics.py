@@ -0,0 +1,208 @@
+from __future__ import annotations
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from utils.metrics import get_metrics
+
+# Shared, memoized analytics over a price frame. Results are keyed by a fingerprint of the
+# frame's contents, so every page (and every session) asking for the returns, vol or
+# drawdowns of the same prices gets the already computed object back. Widget changes that
+# don't change the prices only pay for what actually depends on the widget.
+#
+# Returned frames/series are shared: callers must treat them as read-only.
+
+MAX_ENTRIES = 512
+
+
+def fingerprint(df: pd.DataFrame) -> str:
+    """Content hash of a frame: values, index and column labels."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    h.update("\x1f".join(map(str, df.columns)).encode())
+    return h.hexdigest()
+
+
+class Memo:
+    """Thread-safe LRU of computed values; shared by every session in the process."""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data: OrderedDict[tuple, object] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key: tuple, compute: Callable[[], object]) -> object:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+        # Computed outside the lock; two sessions racing on the same key both compute once.
+        value = compute()
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 3) if total else None,
+            }
+
+
+_memo = Memo()
+
+
+def rolling_corr_to(rets: pd.DataFrame, benchmark: str, window: int) -> pd.DataFrame:
+    """Rolling correlation of every column against `benchmark`, in one O(N*T) pass.
+
+    Same numbers as `rets.rolling(window).corr()` sliced to the benchmark, without building
+    the N x N matrix per date: windowed sums of x, y, x^2, y^2 and xy come from cumulative
+    sums. A window holding any missing value is NaN, as with pandas' default min_periods.
+    The benchmark's own column is left out.
+    """
+    others = rets.drop(columns=[benchmark])
+    x = others.to_numpy(dtype=np.float64)
+    y = rets[benchmark].to_numpy(dtype=np.float64)[:, None]
+    valid = np.isfinite(x) & np.isfinite(y)
+    # Centering doesn't change a correlation but keeps the cumulative sums well conditioned.
+    x = np.where(valid, x - np.nanmean(x, axis=0), 0.0)
+    y = np.where(valid, y - np.nanmean(y), 0.0)
+
+    def windowed(a: np.ndarray) -> np.ndarray:
+        c = np.cumsum(a, axis=0)
+        out = c.copy()
+        out[window:] -= c[:-window]
+        return out
+
+    n = windowed(valid.astype(np.float64))
+    sx, sy = windowed(x), windowed(y)
+    cov = windowed(x * y) - sx * sy / window
+    vx = windowed(x * x) - sx * sx / window
+    vy = windowed(y * y) - sy * sy / window
+    with np.errstate(invalid="ignore", divide="ignore"):
+        corr = cov / np.sqrt(vx * vy)
+    corr[(n < window) | ~(vx > 0) | ~(vy > 0)] = np.nan
+    return pd.DataFrame(np.clip(corr, -1.0, 1.0), index=rets.index, columns=others.columns)
+
+
+def ewm_corr_to(rets: pd.DataFrame, benchmark: str, halflife: float, min_periods: int = 0) -> pd.DataFrame:
+    """Exponentially weighted correlation of every column against `benchmark`.
+
+    Built from EWM means of x, y, x^2, y^2 and xy (the bias corrections cancel in the
+    ratio). The benchmark is masked per column so both sides see the same observations.
+    """
+    others = rets.drop(columns=[benchmark])
+    y = pd.DataFrame(np.broadcast_to(rets[benchmark].to_numpy()[:, None], others.shape),
+                     index=others.index, columns=others.columns)
+    x = others.where(y.notna())
+    y = y.where(x.notna())
+    mean = lambda df: df.ewm(halflife=halflife, min_periods=min_periods).mean()
+    ex, ey = mean(x), mean(y)
+    cov = mean(x * y) - ex * ey
+    vx = mean(x * x) - ex * ex
+    vy = mean(y * y) - ey * ey
+    corr = cov / np.sqrt(vx * vy).where((vx > 0) & (vy > 0))
+    return corr.clip(-1.0, 1.0)
+
+
+class PriceAnalytics:
+    def __init__(self, prices: pd.DataFrame, key: str | None = None):
+        self.prices = prices
+        self.key = key or fingerprint(prices)
+
+    def memo(self, name: str, *args, compute: Callable[[], object]):
+        """Memoize `compute()` under this frame's key; for analytics built on top of this class."""
+        metrics = get_metrics()
+        computed = False
+
+        def timed():
+            nonlocal computed
+            computed = True
+            with metrics.span("analytics_compute", name=name):
+                return compute()
+
+        value = _memo.get_or_compute((self.key, name, *args), timed)
+        metrics.inc("cache_lookups_total", cache="analytics", result="miss" if computed else "hit")
+        return value
+
+    def filled(self) -> pd.DataFrame:
+        return self.memo("filled", compute=lambda: self.prices.ffill())
+
+    def returns(self, how: str = "all") -> pd.DataFrame:
+        """Simple returns; `how` is the dropna rule for rows ("all" keeps partial rows)."""
+        return self.memo("returns", how, compute=lambda: self.prices.pct_change().dropna(how=how))
+
+    def change_pct(self) -> pd.Series:
+        """Percent change from the first to the last (forward-filled) price in range."""
+        def compute():
+            filled = self.filled()
+            return (filled.iloc[-1] / filled.iloc[0] - 1) * 100
+        return self.memo("change_pct", compute=compute)
+
+    def ann_vol(self, periods: float = 365, how: str = "all") -> pd.Series:
+        """Annualized volatility in percent."""
+        return self.memo("ann_vol", periods, how,
+                          compute=lambda: self.returns(how).std() * (periods ** 0.5) * 100)
+
+    def rolling_vol(self, window: int, periods: float = 252, how: str = "any") -> pd.DataFrame:
+        """Rolling annualized volatility in percent."""
+        return self.memo("rolling_vol", window, periods, how,
+                          compute=lambda: self.returns(how).rolling(window).std() * (periods ** 0.5) * 100)
+
+    def corr(self, how: str = "all") -> pd.DataFrame:
+        return self.memo("corr", how, compute=lambda: self.returns(how).corr())
+
+    def rolling_corr(self, benchmark: str, window: int, how: str = "any") -> pd.DataFrame:
+        """Rolling correlation of each column's returns to `benchmark`'s."""
+        return self.memo("rolling_corr", benchmark, window, how,
+                          compute=lambda: rolling_corr_to(self.returns(how), benchmark, window))
+
+    def ewm_corr(self, benchmark: str, halflife: float, how: str = "any") -> pd.DataFrame:
+        """Exponentially weighted correlation of each column's returns to `benchmark`'s."""
+        return self.memo("ewm_corr", benchmark, halflife, how,
+                          compute=lambda: ewm_corr_to(self.returns(how), benchmark, halflife,
+                                                      min_periods=int(halflife)))
+
+    def drawdown(self) -> pd.DataFrame:
+        """Drawdown from the running peak (0 at a new high, negative below it)."""
+        def compute():
+            filled = self.filled()
+            return filled.div(filled.cummax()) - 1
+        return self.memo("drawdown", compute=compute)
+
+    def aligned(self, columns: list[str]) -> "PriceAnalytics":
+        """Analytics over `columns`, forward-filled and restricted to rows where all have a price."""
+        sub = self.memo("aligned", tuple(columns),
+                         compute=lambda: self.prices[list(columns)].ffill().dropna())
+        return PriceAnalytics(sub, key=f"{self.key}:{'|'.join(columns)}")
+
+
+def analytics_for(prices: pd.DataFrame) -> PriceAnalytics:
+    return PriceAnalytics(prices)
+
+
+def analytics_stats() -> dict:
+    return _memo.stats()
+
+
+def clear_analytics() -> None:
+    _memo.clear()
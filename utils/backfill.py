@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from utils.analytics import PriceAnalytics
+from utils.rules import BENCHMARK, VOL_PERIODS, Rule
+
+# Alert history: every bar at which a rule would have fired, grouped into events, and
+# threshold sweeps that evaluate a whole grid of thresholds in one broadcast comparison.
+# Metric histories come from the shared analytics memo, so they're computed once per
+# price frame whatever the rules or grid.
+
+# Sweep grids matching the page sliders (drawdown in %, negative).
+GRIDS = {
+    "vol": np.arange(20, 255, 5, dtype=np.float64),
+    "corr": np.round(np.arange(-1.0, 1.0001, 0.05), 2),
+    "ecorr": np.round(np.arange(-1.0, 1.0001, 0.05), 2),
+    "drawdown": -np.arange(5, 95, 5, dtype=np.float64),
+    "return": np.arange(-50, 55, 5, dtype=np.float64),
+}
+
+
+def metric_history(engine: PriceAnalytics, metric: str, window: int | None) -> pd.DataFrame:
+    """Per-bar values of a rule metric (bars x tickers), on the aligned-returns index."""
+    rets = engine.returns(how="any")
+    if metric == "vol":
+        out = engine.rolling_vol(window, periods=VOL_PERIODS, how="any")
+    elif metric == "corr":
+        out = engine.rolling_corr(BENCHMARK, window) if BENCHMARK in rets.columns else None
+    elif metric == "ecorr":
+        out = engine.ewm_corr(BENCHMARK, window / 2) if BENCHMARK in rets.columns else None
+    elif metric == "drawdown":
+        out = engine.drawdown() * 100
+    elif metric == "return":
+        out = (np.exp(np.log1p(rets).rolling(window).sum()) - 1) * 100
+    else:
+        raise ValueError(f"Unknown metric {metric!r}")
+    if out is None:
+        return pd.DataFrame(np.nan, index=rets.index, columns=rets.columns)
+    return out.reindex(index=rets.index, columns=rets.columns)
+
+
+def _compare(values: np.ndarray, comparator: str, threshold) -> np.ndarray:
+    with np.errstate(invalid="ignore"):
+        if comparator == ">":
+            return values > threshold
+        if comparator == ">=":
+            return values >= threshold
+        if comparator == "<":
+            return values < threshold
+        return values <= threshold
+
+
+def _runs(hits: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(column, start row, end row exclusive) of every run of True down the columns of `hits`."""
+    padded = np.zeros((hits.shape[0] + 2, hits.shape[1]), dtype=np.int8)
+    padded[1:-1] = hits
+    edges = np.diff(padded, axis=0)
+    # Column-major nonzero keeps each column's starts and ends in matching order.
+    s_col, s_row = np.nonzero(edges.T == 1)
+    _, e_row = np.nonzero(edges.T == -1)
+    return s_col, s_row, e_row
+
+
+def backfill(rules: list[Rule], prices: pd.DataFrame, engine: PriceAnalytics | None = None) -> pd.DataFrame:
+    """Every historical trigger event per rule and ticker.
+
+    Columns: rule, ticker, start, end (last triggered bar), bars, extreme (most extreme
+    metric value during the event), ongoing (still triggered on the last bar).
+    """
+    engine = engine or PriceAnalytics(prices)
+    index = engine.returns(how="any").index
+    frames = []
+    for rule in rules:
+        hist = metric_history(engine, rule.metric, rule.window)
+        cols = [t for t in (rule.universe or hist.columns) if t in hist.columns]
+        values = hist[cols].to_numpy(dtype=np.float64)
+        col, start, stop = _runs(_compare(values, rule.comparator, rule.threshold))
+        if not len(col):
+            continue
+        # Most extreme value per event: one reduceat over [start, stop) slices of the
+        # column-major values (a trailing pad keeps the last stop a valid index).
+        reduce = np.maximum if rule.comparator.startswith(">") else np.minimum
+        flat = np.append(values.T.ravel(), np.nan)
+        offs = col * values.shape[0]
+        extreme = reduce.reduceat(flat, np.column_stack([offs + start, offs + stop]).ravel())[::2]
+        frames.append(pd.DataFrame({
+            "rule": rule.name,
+            "ticker": np.asarray(cols, dtype=object)[col],
+            "start": index[start],
+            "end": index[stop - 1],
+            "bars": stop - start,
+            "extreme": extreme,
+            "ongoing": stop == len(index),
+        }))
+    if not frames:
+        return pd.DataFrame(columns=["rule", "ticker", "start", "end", "bars", "extreme", "ongoing"])
+    return pd.concat(frames, ignore_index=True).sort_values(["start", "rule", "ticker"], ignore_index=True)
+
+
+def sweep(rule: Rule, prices: pd.DataFrame, thresholds: np.ndarray | None = None,
+          target: Rule | None = None, horizon: int = 30,
+          engine: PriceAnalytics | None = None) -> dict[str, pd.DataFrame]:
+    """Evaluate `rule` at every threshold in the grid in one pass.
+
+    Returns thresholds x tickers frames:
+      hit_rate   share of bars on which the rule was triggered
+      events     number of separate trigger events
+    and, when `target` is given (e.g. a deeper drawdown), for each event start the first
+    bar within `horizon` bars at which the target is triggered:
+      precision  share of events followed by the target within the horizon
+      lead_time  mean bars from event start to the target (over events that reached it)
+    """
+    engine = engine or PriceAnalytics(prices)
+    thresholds = np.asarray(GRIDS[rule.metric] if thresholds is None else thresholds, dtype=np.float64)
+    hist = metric_history(engine, rule.metric, rule.window)
+    cols = [t for t in (rule.universe or hist.columns) if t in hist.columns]
+    values = hist[cols].to_numpy(dtype=np.float64)
+    n_bars = len(values)
+
+    # (thresholds, bars, tickers) in one broadcast
+    hits = _compare(values[None, :, :], rule.comparator, thresholds[:, None, None])
+    starts = hits.copy()
+    starts[:, 1:] &= ~hits[:, :-1]
+    valid = (~np.isnan(values)).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = {
+            "hit_rate": hits.sum(axis=1) / valid,
+            "events": starts.sum(axis=1).astype(np.float64),
+        }
+
+    if target is not None:
+        tgt_hist = metric_history(engine, target.metric, target.window)[cols].to_numpy(dtype=np.float64)
+        tgt = _compare(tgt_hist, target.comparator, target.threshold)
+        # First target bar at or after each bar: reverse running minimum of target row numbers.
+        rows = np.where(tgt, np.arange(n_bars)[:, None], n_bars)
+        next_hit = np.minimum.accumulate(rows[::-1], axis=0)[::-1]
+        lead = (next_hit - np.arange(n_bars)[:, None]).astype(np.float64)
+        reached = starts & (lead <= horizon)[None]
+        n_events = starts.sum(axis=1)
+        n_reached = reached.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out["precision"] = n_reached / n_events
+            out["lead_time"] = np.where(reached, lead[None], 0).sum(axis=1) / n_reached
+
+    return {k: pd.DataFrame(v, index=pd.Index(thresholds, name="threshold"), columns=cols) for k, v in out.items()}
@@ -0,0 +1,240 @@
+from __future__ import annotations
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils.analytics import PriceAnalytics
+
+# Rebalancing backtests with trading costs. Between rebalances a portfolio is buy-and-hold,
+# so each holding period is evaluated in one shot from price relatives; only the rebalance
+# points themselves are stepped through. Daily rebalancing is fully vectorized.
+#
+# Costs are charged on traded notional at every rebalance (including the initial buy) as
+# fee + slippage in basis points, per asset. Turnover is one-way: half the sum of absolute
+# weight changes.
+
+PERIODS = 252                     # annualization, as in the page's Sharpe/vol
+SCHEDULES = ("none", "daily", "calendar", "band")
+CALENDAR_FREQS = {"W": "Weekly", "M": "Monthly", "Q": "Quarterly"}
+# Below this many bar-configs (rows x configs) a sweep runs in-process. Serially a config costs
+# about 0.8-2.4 us per bar (8 assets, mixed schedules), while spawning a pool costs 1.3-3 s
+# before any work is done: 40 configs over 1,500 daily bars take 0.14 s serially, 100,000
+# hourly bars 3.0 s. Pooling only pays off once the serial sweep takes several seconds.
+PARALLEL_MIN_WORK = 4_000_000
+BAND_LOOKAHEAD = 64               # bars scanned per step when looking for a band breach
+
+
+class BacktestConfig:
+    """Target weights plus how (and at what cost) the portfolio is brought back to them."""
+
+    def __init__(self, weights: pd.Series, schedule: str = "calendar", freq: str = "M", band: float = 0.05,
+                 fee_bps: float | dict = 10.0, slippage_bps: float | dict = 5.0, label: str | None = None):
+        if schedule not in SCHEDULES:
+            raise ValueError(f"Unknown schedule {schedule!r}; expected one of {SCHEDULES}")
+        if schedule == "calendar" and freq not in CALENDAR_FREQS:
+            raise ValueError(f"Unknown calendar frequency {freq!r}; expected one of {list(CALENDAR_FREQS)}")
+        weights = pd.Series(weights, dtype=np.float64)
+        if weights.sum() <= 0:
+            raise ValueError("Weights must sum to a positive value")
+        self.weights = weights / weights.sum()
+        self.schedule = schedule
+        self.freq = freq
+        self.band = float(band)
+        self.fee_bps = fee_bps
+        self.slippage_bps = slippage_bps
+        self.label = label or self.describe()
+
+    def describe(self) -> str:
+        if self.schedule == "calendar":
+            return CALENDAR_FREQS[self.freq]
+        if self.schedule == "band":
+            return f"Drift band ±{self.band:.0%}"
+        return {"none": "Buy & hold", "daily": "Daily"}[self.schedule]
+
+    def cost_rates(self, columns: list[str]) -> np.ndarray:
+        """Per-asset cost per unit of traded notional (fee + slippage)."""
+        def per_asset(bps):
+            if isinstance(bps, dict):
+                return np.array([float(bps.get(c, 0.0)) for c in columns])
+            return np.full(len(columns), float(bps))
+        return (per_asset(self.fee_bps) + per_asset(self.slippage_bps)) / 1e4
+
+    def key(self) -> tuple:
+        def freeze(bps):
+            return tuple(sorted(bps.items())) if isinstance(bps, dict) else float(bps)
+        return (tuple(self.weights.items()), self.schedule, self.freq, self.band,
+                freeze(self.fee_bps), freeze(self.slippage_bps))
+
+
+def _calendar_points(index: pd.DatetimeIndex, freq: str) -> np.ndarray:
+    """Row numbers of the first bar of every new week/month/quarter."""
+    periods = index.to_period(freq).asi8
+    return np.flatnonzero(np.diff(periods) != 0) + 1
+
+
+def _next_band_breach(prices: np.ndarray, start: int, w: np.ndarray, band: float) -> int:
+    """First row after `start` where any drifted weight is more than `band` from target."""
+    n_rows = len(prices)
+    lo, span = start + 1, BAND_LOOKAHEAD
+    while lo < n_rows:
+        hi = min(lo + span, n_rows)
+        held = w * (prices[lo:hi] / prices[start])
+        drift = np.abs(held / held.sum(axis=1, keepdims=True) - w).max(axis=1)
+        breach = np.flatnonzero(drift > band)
+        if len(breach):
+            return lo + int(breach[0])
+        lo, span = hi, span * 2
+    return n_rows
+
+
+def simulate(prices: np.ndarray, w: np.ndarray, cost: np.ndarray, schedule: str,
+             calendar: np.ndarray | None = None, band: float = 0.05) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Portfolio value (starting at 1), one-way turnover and cost paid, per row of `prices`."""
+    n_rows = len(prices)
+    value = np.empty(n_rows)
+    turnover = np.zeros(n_rows)
+    paid = np.zeros(n_rows)
+    # Initial buy from cash.
+    paid[0] = w @ cost
+    v = 1.0 - paid[0]
+
+    if schedule == "daily":
+        rel = prices[1:] / prices[:-1]
+        gross = rel @ w
+        drifted = w * rel / gross[:, None]
+        traded = np.abs(w - drifted)
+        step_cost = traded @ cost
+        value[0] = v
+        value[1:] = v * np.cumprod(gross * (1 - step_cost))
+        turnover[1:] = traded.sum(axis=1) / 2
+        paid[1:] = value[:-1] * gross * step_cost
+        return value, turnover, paid
+
+    start = 0
+    while True:
+        if schedule == "calendar":
+            i = np.searchsorted(calendar, start, side="right")
+            nxt = int(calendar[i]) if i < len(calendar) else n_rows
+        elif schedule == "band":
+            nxt = _next_band_breach(prices, start, w, band)
+        else:
+            nxt = n_rows
+        # Buy and hold over [start, nxt], evaluated in one go from price relatives.
+        stop = min(nxt + 1, n_rows)
+        held = w * (prices[start:stop] / prices[start])
+        seg = v * held.sum(axis=1)
+        if nxt >= n_rows:
+            value[start:] = seg
+            break
+        value[start:nxt] = seg[:-1]
+        pre = held[-1] / held[-1].sum()
+        traded = np.abs(w - pre)
+        paid[nxt] = seg[-1] * (traded @ cost)
+        turnover[nxt] = traded.sum() / 2
+        v = seg[-1] - paid[nxt]
+        value[nxt] = v
+        start = nxt
+    return value, turnover, paid
+
+
+def _summary(index: pd.DatetimeIndex, value: np.ndarray, turnover: np.ndarray, paid: np.ndarray) -> dict:
+    rets = value[1:] / value[:-1] - 1
+    years = max((index[-1] - index[0]).days / 365.25, 1e-9)
+    std = rets.std(ddof=1) if len(rets) > 1 else np.nan
+    return {
+        "CAGR": value[-1] ** (1 / years) - 1,
+        "Vol (ann)": std * PERIODS ** 0.5,
+        "Sharpe": rets.mean() * PERIODS ** 0.5 / std if std and std > 0 else np.nan,
+        "Max DD": (value / np.maximum.accumulate(value) - 1).min(),
+        "Rebalances": int(np.count_nonzero(turnover)),
+        "Turnover (ann)": turnover.sum() / years,
+        "Costs": paid.sum(),
+    }
+
+
+def backtest(prices: pd.DataFrame, config: BacktestConfig) -> dict:
+    """Run one config on forward-filled, fully overlapping `prices` (columns include its assets).
+
+    Returns equity (Series, starts at 1), returns, turnover and costs per bar, plus `summary`.
+    """
+    cols = list(config.weights.index)
+    px = prices[cols].to_numpy(dtype=np.float64)
+    calendar = _calendar_points(prices.index, config.freq) if config.schedule == "calendar" else None
+    value, turnover, paid = simulate(px, config.weights.to_numpy(), config.cost_rates(cols), config.schedule,
+                                     calendar, config.band)
+    equity = pd.Series(value, index=prices.index, name=config.label)
+    return {
+        "equity": equity,
+        "returns": equity.pct_change().dropna(),
+        "turnover": pd.Series(turnover, index=prices.index),
+        "costs": pd.Series(paid, index=prices.index),
+        "summary": _summary(prices.index, value, turnover, paid),
+    }
+
+
+# -- parallel sweeps ---------------------------------------------------------------------------
+
+_worker_prices: pd.DataFrame | None = None
+
+
+def _init_worker(prices: pd.DataFrame) -> None:
+    # Prices are shipped once per worker process rather than with every config.
+    global _worker_prices
+    _worker_prices = prices
+
+
+def _run_summary(config: BacktestConfig) -> dict:
+    return backtest(_worker_prices, config)["summary"]
+
+
+def sweep(prices: pd.DataFrame, configs: list[BacktestConfig], processes: int | None = None) -> pd.DataFrame:
+    """Summary row per config (indexed by label), fanned out over a process pool when the
+    work (bars x configs) is worth it and there is more than one CPU.
+
+    Workers are spawned rather than forked: the app process runs background threads
+    (warm-up, live tape) whose locks a fork could copy mid-acquire.
+    """
+    cpus = os.cpu_count() or 1
+    processes = min(processes or cpus, cpus)
+    if len(prices) * len(configs) < PARALLEL_MIN_WORK or processes < 2:
+        rows = [backtest(prices, c)["summary"] for c in configs]
+    else:
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=processes, mp_context=ctx,
+                                 initializer=_init_worker, initargs=(prices,)) as pool:
+            rows = list(pool.map(_run_summary, configs, chunksize=max(1, len(configs) // (processes * 4))))
+    return pd.DataFrame(rows, index=pd.Index([c.label for c in configs], name="config"))
+
+
+# -- page helpers (memoized with the other analytics of the price frame) -----------------------
+
+def run(engine: PriceAnalytics, config: BacktestConfig, benchmark: str = "BTC-USD") -> dict | None:
+    """`backtest` over the common history of the config's assets and `benchmark`, plus
+    bench_rets/bench_curve for comparison. None if they don't overlap."""
+    def compute():
+        cols = list(dict.fromkeys([*config.weights.index, benchmark]))
+        aligned = engine.aligned(cols).prices
+        if len(aligned) < 2:
+            return None
+        out = backtest(aligned, config)
+        bench = aligned[benchmark]
+        out["bench_rets"] = bench.pct_change().dropna()
+        out["bench_curve"] = bench / bench.iloc[0]
+        return out
+
+    return engine.memo("backtest", config.key(), benchmark, compute=compute)
+
+
+def compare(engine: PriceAnalytics, configs: list[BacktestConfig], processes: int | None = None) -> pd.DataFrame | None:
+    """`sweep` over the common history of every config's assets, sorted by Sharpe."""
+    def compute():
+        cols = list(dict.fromkeys(c for cfg in configs for c in cfg.weights.index))
+        aligned = engine.aligned(cols).prices
+        if len(aligned) < 2:
+            return None
+        return sweep(aligned, configs, processes).sort_values("Sharpe", ascending=False)
+
+    return engine.memo("backtest_compare", tuple((c.label, c.key()) for c in configs), compute=compute)
@@ -0,0 +1,111 @@
+from __future__ import annotations
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+# Process-level price cache shared by every session and page. Entries are per
+# (provider, ticker, interval) and remember the day range they cover, so any window or
+# subset inside it is served by slicing, whatever start/end defaults a page uses.
+
+TTL_SECONDS = 3600          # ranges touching today are reloaded after this (the store refetches the tail)
+NEGATIVE_TTL_SECONDS = 300  # a ticker a provider couldn't serve isn't retried sooner than this
+MAX_BYTES = 256 * 1024 * 1024
+
+
+class _Entry:
+    __slots__ = ("data", "start", "end", "loaded", "ttl", "nbytes")
+
+    def __init__(self, data: pd.DataFrame, start: pd.Timestamp, end: pd.Timestamp, ttl: float):
+        self.data = data
+        self.start = start
+        self.end = end
+        self.loaded = time.time()
+        self.ttl = ttl
+        self.nbytes = int(data.memory_usage(index=True, deep=False).sum()) if data is not None else 0
+
+
+class RangeCache:
+    def __init__(self, max_bytes: int = MAX_BYTES, ttl: float = TTL_SECONDS,
+                 negative_ttl: float = NEGATIVE_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: OrderedDict[tuple, _Entry] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _fresh(self, e: _Entry) -> bool:
+        age = time.time() - e.loaded
+        if e.data is None or e.data.empty:
+            return age < self.negative_ttl
+        # Closed history never changes; only ranges reaching today can go stale.
+        return e.end < pd.Timestamp.today().normalize() or age < e.ttl
+
+    def get(self, key: tuple, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame | None:
+        """Slice of the cached bars for [start, end], or None if the entry doesn't cover it.
+
+        An empty frame means the provider recently had nothing for this key.
+        """
+        with self._lock:
+            e = self._entries.get(key)
+            if e is None or not self._fresh(e) or start < e.start or end > e.end:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            if e.data is None or e.data.empty:
+                return pd.DataFrame()
+            return e.data.loc[(e.data.index >= start) & (e.data.index < end + pd.Timedelta(days=1))]
+
+    def span(self, key: tuple) -> tuple[pd.Timestamp, pd.Timestamp] | None:
+        """Range held for `key` if still fresh; lets callers grow it into a superset."""
+        with self._lock:
+            e = self._entries.get(key)
+            if e is None or not self._fresh(e) or e.data is None or e.data.empty:
+                return None
+            return e.start, e.end
+
+    def put(self, key: tuple, data: pd.DataFrame | None, start: pd.Timestamp, end: pd.Timestamp,
+            ttl: float | None = None) -> None:
+        entry = _Entry(data, start, end, self.ttl if ttl is None else ttl)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[key] = entry
+            self._bytes += entry.nbytes
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 3) if total else None,
+            }
+
+
+_cache: RangeCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> RangeCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = RangeCache()
+        return _cache
@@ -0,0 +1,139 @@
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from utils.analytics import Memo, fingerprint
+from utils.metrics import get_metrics
+
+# Figure building for the pages' time-series charts. A chart a few hundred pixels wide can't
+# show more than a couple of points per pixel, so each series is downsampled to POINT_BUDGET
+# points before it is serialized: LTTB (largest triangle three buckets) for lines, which keeps
+# the visually significant turns, and per-bucket min/max for areas, so no trough or peak is
+# lost. Above WEBGL_POINTS plotted points the traces switch to WebGL.
+#
+# Built figures are kept in a process-wide LRU keyed by the data's fingerprint and the chart
+# options, so a rerun that doesn't change what a chart shows reuses its figure. Returned
+# figures are shared: callers must not modify them.
+
+POINT_BUDGET = 1_500              # points per series
+WEBGL_POINTS = 10_000             # total points above which traces use Scattergl
+HEATMAP_TEXT_CELLS = 400          # cells above which heatmaps drop their per-cell labels
+FIGURE_ENTRIES = 256
+
+_figures = Memo(FIGURE_ENTRIES)
+
+
+def lttb(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Row indices [n_out, n_cols] picked by LTTB for every column of `y` [n, n_cols].
+
+    x is the row position (the bars are on a regular grid). The first and last rows are
+    always kept; each column picks its own rows, and missing values are only picked where a
+    bucket has nothing else, so gaps (before a listing, say) stay gaps.
+    """
+    n, k = y.shape
+    if n <= n_out or n_out < 3:
+        return np.broadcast_to(np.arange(n)[:, None], (n, k))
+    # n_out - 2 buckets over rows [1, n - 1), plus the last row as a bucket of its own.
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    finite = np.isfinite(y)
+    sums = np.add.reduceat(np.where(finite, y, 0.0), edges, axis=0)
+    counts = np.add.reduceat(finite, edges, axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        avg_y = sums / counts
+    bounds = np.append(edges, n)
+    avg_x = (bounds[:-1] + bounds[1:] - 1) / 2
+
+    cols = np.arange(k)
+    out = np.empty((n_out, k), dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = np.zeros(k, dtype=np.int64)
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        ay = y[a, cols]
+        ay = np.where(np.isnan(ay), avg_y[i + 1], ay)
+        xs = np.arange(lo, hi)[:, None]
+        # Twice the area of the triangle (previous pick, candidate, next bucket's average).
+        area = np.abs((a - avg_x[i + 1]) * (y[lo:hi] - ay) - (a - xs) * (avg_y[i + 1] - ay))
+        a = lo + np.where(np.isnan(area), -1.0, area).argmax(axis=0)
+        out[i + 1] = a
+    return out
+
+
+def minmax(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Row indices [~n_out, n_cols]: the first and last rows plus each bucket's min and max."""
+    n, k = y.shape
+    if n <= n_out or n_out < 4:
+        return np.broadcast_to(np.arange(n)[:, None], (n, k))
+    buckets = (n_out - 2) // 2
+    size = -(-n // buckets)
+    padded = np.full((buckets * size, k), np.nan)
+    padded[:n] = y
+    padded = padded.reshape(buckets, size, k)
+    missing = np.isnan(padded)
+    start = np.arange(buckets)[:, None] * size
+    lo = start + np.where(missing, np.inf, padded).argmin(axis=1)
+    hi = start + np.where(missing, -np.inf, padded).argmax(axis=1)
+    first, last = np.zeros((1, k), dtype=np.int64), np.full((1, k), n - 1)
+    return np.sort(np.vstack([first, np.minimum(lo, n - 1), np.minimum(hi, n - 1), last]), axis=0)
+
+
+def _cached(kind: str, frame: pd.DataFrame, options: tuple, build) -> go.Figure:
+    metrics = get_metrics()
+    built = False
+
+    def timed():
+        nonlocal built
+        built = True
+        with metrics.span("chart_build", kind=kind):
+            return build()
+
+    fig = _figures.get_or_compute((kind, fingerprint(frame), options), timed)
+    metrics.inc("cache_lookups_total", cache="charts", result="miss" if built else "hit")
+    return fig
+
+
+def line(data: pd.DataFrame | pd.Series, y_label: str, x_label: str = "Date", legend_title: str | None = None,
+         area: bool = False, budget: int = POINT_BUDGET) -> go.Figure:
+    """One trace per column against the index, like `px.line` on a wide frame.
+
+    Every series is downsampled to `budget` points; `area` fills each one to zero (areas are
+    overlaid, not stacked) and keeps bucket minima and maxima instead of LTTB picks.
+    """
+    frame = data.to_frame() if isinstance(data, pd.Series) else data
+    legend_title = legend_title or frame.columns.name or "variable"
+
+    def build() -> go.Figure:
+        y = frame.to_numpy(dtype=np.float64)
+        rows = (minmax if area else lttb)(y, budget)
+        trace = go.Scattergl if rows.size > WEBGL_POINTS else go.Scatter
+        fig = go.Figure()
+        for j, name in enumerate(frame.columns):
+            idx = rows[:, j]
+            fig.add_trace(trace(
+                x=frame.index[idx], y=y[idx, j], name=str(name), mode="lines", legendgroup=str(name),
+                fill="tozeroy" if area else None,
+                hovertemplate=f"{legend_title}={name}<br>{x_label}=%{{x}}<br>{y_label}=%{{y}}<extra></extra>",
+            ))
+        fig.update_layout(xaxis_title=x_label, yaxis_title=y_label, legend_title_text=legend_title,
+                          legend_tracegroupgap=0, margin={"t": 60})
+        return fig
+
+    return _cached("area" if area else "line", frame, (y_label, x_label, legend_title, budget), build)
+
+
+def heatmap(matrix: pd.DataFrame, text_auto: bool | str = False, **kwargs) -> go.Figure:
+    """`px.imshow` of a labelled matrix; cell labels are dropped above HEATMAP_TEXT_CELLS cells."""
+    if matrix.size > HEATMAP_TEXT_CELLS:
+        text_auto = False
+    build = lambda: px.imshow(matrix, text_auto=text_auto, **kwargs)
+    return _cached("heatmap", matrix, (text_auto, repr(sorted(kwargs.items()))), build)
+
+
+def chart_stats() -> dict:
+    return _figures.stats()
+
+
+def clear_charts() -> None:
+    _figures.clear()
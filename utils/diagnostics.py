@@ -1,37 +1,63 @@
-import socket
-import time
-import requests
+import pandas as pd
 import streamlit as st
-
-def _dns(host: str) -> str:
-    try:
-        return socket.gethostbyname(host)
-    except Exception as e:
-        return f"DNS FAIL: {e}"
-
-def _http(url: str, timeout: int = 12) -> str:
-    try:
-        r = requests.get(url, timeout=timeout, headers={"User-Agent": "Mozilla/5.0"})
-        return f"{r.status_code} {r.reason}"
-    except Exception as e:
-        return f"HTTP FAIL: {type(e).__name__}: {e}"
+from utils.analytics import analytics_stats, clear_analytics
+from utils.cache import get_cache
+from utils.charts import chart_stats, clear_charts
+from utils.health import HISTORY, health_status, start_health
+from utils.metrics import get_metrics
+from utils.net import get_client
+from utils.providers import clear_price_cache, fetch_stats
+from utils.registry import get_registry
+from utils.warmup import warmup_status
 
 def sidebar_diagnostics(source: str, universe, start: str, end: str):
     with st.sidebar.expander("🧪 Diagnostics", expanded=False):
         st.write("**Inputs**")
         st.write({"source": source, "universe": universe, "start": start, "end": end})
 
-        st.write("**DNS**")
-        st.write({
-            "api.coingecko.com": _dns("api.coingecko.com"),
-            "api.binance.com": _dns("api.binance.com"),
-        })
+        # DNS and ping results come from the background monitor; nothing here waits on the network.
+        monitor = start_health()
+        st.write("**Upstream health (DNS + ping)**")
+        status = health_status()
+        if status is None:
+            st.write("Disabled (DASH_HEALTH=0).")
+        elif not status["endpoints"]:
+            st.write("First check in progress…")
+        else:
+            st.caption(f"Checked {status['last_run_ago_s']:.0f}s ago, every {monitor.every:.0f}s; "
+                       f"percentiles over the last {min(status['runs'], HISTORY)} checks.")
+            st.dataframe(pd.DataFrame.from_dict(status["endpoints"], orient="index"), use_container_width=True)
+        if monitor is not None and st.button("Re-check now"):
+            monitor.check_now()
+
+        st.write("**Endpoint health**")
+        st.write(get_client().health() or "No requests made yet.")
+
+        st.write("**Price cache**")
+        st.write(get_cache().stats())
+        st.write("**Upstream fetches (per ticker range)**")
+        st.write(fetch_stats())
+        st.write("**Symbol registry**")
+        st.write(get_registry().status())
+        st.write("**Analytics memo**")
+        st.write(analytics_stats())
+        st.write("**Chart cache**")
+        st.write(chart_stats())
+        st.write("**Background warm-up**")
+        st.write(warmup_status() or "Disabled (DASH_WARMUP=0).")
 
-        st.write("**HTTP**")
-        st.write({
-            "CoinGecko ping": _http("https://api.coingecko.com/api/v3/ping"),
-            "Binance ping": _http("https://api.binance.com/api/v3/ping"),
-        })
+        # Process-wide, so this covers every session since the server started.
+        metrics = get_metrics()
+        st.write("**Latency (all sessions)**")
+        st.dataframe(metrics.latency_table().style.format(
+            {"p50 ms": "{:.1f}", "p90 ms": "{:.1f}", "p99 ms": "{:.1f}", "total s": "{:.2f}"}),
+            use_container_width=True, hide_index=True)
+        st.write("**Cache hit ratios**")
+        st.write(metrics.hit_ratios())
+        st.write("**Counters**")
+        st.dataframe(metrics.counter_table(), use_container_width=True, hide_index=True)
+        st.download_button("Download metrics (Prometheus)", metrics.prometheus_text(),
+                           file_name="dashboard.prom", mime="text/plain")
 
         if st.session_state.get("last_fetch_error"):
             st.error("Last fetch error:")
@@ -39,6 +65,9 @@ def sidebar_diagnostics(source: str, universe, start: str, end: str):
 
         if st.button("Clear Data Cache"):
             st.cache_data.clear()
+            clear_price_cache()
+            clear_analytics()
+            clear_charts()
             st.rerun()
 
         st.caption("If DNS works but HTTP fails, Streamlit Cloud/network is blocking outbound requests or rate limiting you.")
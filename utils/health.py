@@ -0,0 +1,165 @@
+from __future__ import annotations
+import os
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from utils.metrics import get_metrics
+from utils.net import get_client
+
+# Background health checks for the upstream APIs. Every endpoint is resolved and pinged
+# concurrently on a timer and the results are kept with their timestamps, so the diagnostics
+# panel renders from the last known state instead of blocking a rerun on the network.
+#
+# Pings go straight through the shared session rather than HttpClient.request: they shouldn't
+# trip or reset the data path's circuit breakers, and breaker state is reported separately.
+
+CHECK_SECONDS = 60.0
+TIMEOUT = 10.0
+HISTORY = 120                     # latency samples kept per endpoint for the percentiles
+ENABLED = os.environ.get("DASH_HEALTH", "1") != "0"
+
+
+def _endpoints() -> dict[str, str]:
+    # Binance is pinged in whichever region the providers are currently using.
+    return {
+        "CoinGecko": "https://api.coingecko.com/api/v3/ping",
+        "Binance": f"{get_client().binance_base()}/api/v3/ping",
+    }
+
+
+class EndpointHealth:
+    def __init__(self, name: str):
+        self.name = name
+        self.url: str | None = None
+        self.dns: str | None = None
+        self.http: str | None = None
+        self.ok: bool | None = None
+        self.checked: float | None = None
+        self.last_ok: float | None = None
+        self.checks = 0
+        self.failures = 0
+        self.latencies: deque[float] = deque(maxlen=HISTORY)
+
+    def as_dict(self) -> dict:
+        lat = np.array(self.latencies) * 1000
+        p50, p90, p99 = np.percentile(lat, (50, 90, 99)) if len(lat) else (None, None, None)
+        return {
+            "url": self.url,
+            "ok": self.ok,
+            "dns": self.dns,
+            "http": self.http,
+            "checked_ago_s": None if self.checked is None else round(time.time() - self.checked, 1),
+            "last_ok_ago_s": None if self.last_ok is None else round(time.time() - self.last_ok, 1),
+            "checks": self.checks,
+            "failures": self.failures,
+            "p50_ms": None if p50 is None else round(float(p50), 1),
+            "p90_ms": None if p90 is None else round(float(p90), 1),
+            "p99_ms": None if p99 is None else round(float(p99), 1),
+        }
+
+
+def _probe(url: str, timeout: float = TIMEOUT) -> tuple[str, str, bool, float | None]:
+    """(dns, http, ok, latency) for one ping; latency is None when no response arrived."""
+    try:
+        dns = socket.gethostbyname(urlsplit(url).hostname)
+    except Exception as e:
+        return f"DNS FAIL: {e}", "not attempted", False, None
+    t0 = time.perf_counter()
+    try:
+        r = get_client().session.get(url, timeout=timeout)
+    except Exception as e:
+        return dns, f"HTTP FAIL: {type(e).__name__}: {e}", False, None
+    return dns, f"{r.status_code} {r.reason}", r.ok, time.perf_counter() - t0
+
+
+class HealthMonitor:
+    def __init__(self, every: float = CHECK_SECONDS, timeout: float = TIMEOUT):
+        self.every = every
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._endpoints: dict[str, EndpointHealth] = {}
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.runs = 0
+        self.last_run: float | None = None
+
+    def start(self) -> "HealthMonitor":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="health-monitor", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def check_now(self) -> None:
+        """Ask the background thread for an immediate round of checks; returns at once."""
+        self._wake.set()
+
+    def run_once(self) -> None:
+        endpoints = _endpoints()
+        # One thread per endpoint, so a hung host costs one timeout, not one per endpoint.
+        with ThreadPoolExecutor(max_workers=len(endpoints), thread_name_prefix="health-probe") as pool:
+            results = dict(zip(endpoints, pool.map(lambda url: _probe(url, self.timeout), endpoints.values())))
+        metrics = get_metrics()
+        now = time.time()
+        with self._lock:
+            for name, (dns, http, ok, latency) in results.items():
+                h = self._endpoints.setdefault(name, EndpointHealth(name))
+                h.url, h.dns, h.http, h.ok, h.checked = endpoints[name], dns, http, ok, now
+                h.checks += 1
+                if ok:
+                    h.last_ok = now
+                else:
+                    h.failures += 1
+                if latency is not None:
+                    h.latencies.append(latency)
+                    metrics.observe("health_probe_seconds", latency, endpoint=name)
+                metrics.inc("health_checks_total", endpoint=name, result="ok" if ok else "fail")
+            self.runs += 1
+            self.last_run = now
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Health check failed: {type(e).__name__}: {e}")
+            self._wake.wait(self.every)
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "last_run_ago_s": None if self.last_run is None else round(time.time() - self.last_run, 1),
+                "endpoints": {name: h.as_dict() for name, h in self._endpoints.items()},
+            }
+
+
+_monitor: HealthMonitor | None = None
+_monitor_lock = threading.Lock()
+
+
+def start_health() -> HealthMonitor | None:
+    """Start the process-wide monitor on first call; later calls are no-ops."""
+    global _monitor
+    if not ENABLED:
+        return None
+    with _monitor_lock:
+        if _monitor is None:
+            _monitor = HealthMonitor().start()
+        return _monitor
+
+
+def health_status() -> dict | None:
+    return _monitor.status() if _monitor is not None else None
@@ -0,0 +1,171 @@
+from __future__ import annotations
+import json
+import os
+import threading
+import time
+
+from utils.net import BINANCE_US, get_client
+from utils.providers import DEFAULT_SOURCE, OFFLINE_SOURCES
+from utils.registry import get_registry
+
+# Background Binance websocket consumer for the hero "Live tape". One connection per
+# server process, shared by every session; the latest quote per symbol is kept. When the
+# app runs from an offline source (DASH_SOURCE=synthetic or replay) there is no tape unless
+# DASH_WS_URL points at a local stand-in (anything speaking Binance's combined-stream format).
+
+WS_GLOBAL = "wss://stream.binance.com:9443"
+WS_US = "wss://stream.binance.us:9443"
+RECV_TIMEOUT = 5.0        # seconds; bounds how long stop()/subscribe() wait on a quiet socket
+MAX_BACKOFF = 60.0
+
+
+class LiveTape:
+    def __init__(self, url: str | None = None):
+        self.url = url
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._latest: dict[str, dict] = {}
+        self._streams: set[str] = set()
+        self._ws = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.connected = False
+        self.last_error: str | None = None
+
+    def _base_url(self) -> str:
+        if self.url:
+            return self.url
+        if os.environ.get("DASH_WS_URL"):
+            return os.environ["DASH_WS_URL"]
+        # Follow whichever REST region the HTTP layer found to work.
+        return WS_US if get_client().binance_base() == BINANCE_US else WS_GLOBAL
+
+    @staticmethod
+    def _stream(ticker: str) -> str | None:
+        sym = get_registry().binance_symbol(ticker)
+        return f"{sym.lower()}@miniTicker" if sym else None
+
+    def start(self, tickers: list[str]) -> "LiveTape":
+        self.subscribe(tickers)
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="live-tape", daemon=True)
+                self._thread.start()
+        return self
+
+    def subscribe(self, tickers: list[str]) -> None:
+        wanted = {s for s in (self._stream(t) for t in tickers) if s}
+        with self._lock:
+            new = wanted - self._streams
+            if not new:
+                return
+            self._streams |= new
+            ws = self._ws
+        if ws is not None:
+            try:
+                with self._send_lock:
+                    ws.send(json.dumps({"method": "SUBSCRIBE", "params": sorted(new), "id": int(time.time())}))
+            except Exception as e:
+                # The reader loop reconnects with the full stream list.
+                self.last_error = f"subscribe failed: {e}"
+
+    def stop(self) -> None:
+        self._stop.set()
+        ws = self._ws
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout=RECV_TIMEOUT + 1)
+
+    def _run(self) -> None:
+        import websocket
+
+        backoff = 1.0
+        while not self._stop.is_set():
+            with self._lock:
+                streams = sorted(self._streams)
+            url = f"{self._base_url().rstrip('/')}/stream?streams={'/'.join(streams)}"
+            try:
+                ws = websocket.create_connection(url, timeout=RECV_TIMEOUT)
+                with self._lock:
+                    self._ws = ws
+                self.connected = True
+                backoff = 1.0
+                while not self._stop.is_set():
+                    try:
+                        raw = ws.recv()
+                    except websocket.WebSocketTimeoutException:
+                        continue
+                    if not raw:
+                        break
+                    self._handle(raw)
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+            finally:
+                self.connected = False
+                with self._lock:
+                    ws, self._ws = self._ws, None
+                if ws is not None:
+                    try:
+                        ws.close()
+                    except Exception:
+                        pass
+            if not self._stop.is_set():
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+
+    def _handle(self, raw: str) -> None:
+        try:
+            msg = json.loads(raw)
+        except ValueError:
+            return
+        data = msg.get("data", msg)
+        if not isinstance(data, dict) or data.get("e") != "24hrMiniTicker":
+            return
+        try:
+            sym = data["s"]
+            close = float(data["c"])
+            open_ = float(data["o"])
+            ts = int(data["E"])
+        except (KeyError, TypeError, ValueError):
+            return
+        quote = {
+            "price": close,
+            "change_pct": (close / open_ - 1) * 100.0 if open_ else float("nan"),
+            "ts": ts,
+        }
+        with self._lock:
+            self._latest[sym] = quote
+
+    def quotes(self, tickers: list[str]) -> dict[str, dict]:
+        """Latest {price, change_pct, ts} per ticker, for those that have ticked."""
+        out = {}
+        registry = get_registry()
+        with self._lock:
+            for t in tickers:
+                q = self._latest.get(registry.binance_symbol(t) or "")
+                if q is not None:
+                    out[t] = dict(q)
+        return out
+
+
+_tape: LiveTape | None = None
+_tape_lock = threading.Lock()
+
+
+def get_tape(tickers: list[str]) -> LiveTape | None:
+    """Process-wide tape, started on first use and subscribed to `tickers`.
+
+    None when the app's source is offline and no DASH_WS_URL stand-in is configured.
+    """
+    global _tape
+    if DEFAULT_SOURCE in OFFLINE_SOURCES and not os.environ.get("DASH_WS_URL"):
+        return None
+    with _tape_lock:
+        if _tape is None:
+            _tape = LiveTape()
+    return _tape.start(tickers)
@@ -0,0 +1,209 @@
+from __future__ import annotations
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+# Process-wide instrumentation for the hot paths: get_prices and the per-provider loaders,
+# every HTTP request, store reads/fetches and the analytics memo. Counters and latency
+# histograms are keyed by name plus labels, shown in the diagnostics panel and exportable
+# in Prometheus text format.
+#
+# Histograms use fixed cumulative buckets (as Prometheus does), so recording is a bisect and
+# a few additions under one lock; percentiles are interpolated within a bucket. Spans are
+# inclusive: a span around a call also covers any spans inside it.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PREFIX = "dash_"
+
+HELP = {
+    "get_prices_seconds": "get_prices calls, end to end",
+    "get_ohlcv_seconds": "get_ohlcv calls, end to end",
+    "warm_prices_seconds": "background warm-up loads",
+    "load_seconds": "per-provider loader calls (range cache, store and fetch)",
+    "fetch_seconds": "upstream fetches of store gaps",
+    "store_read_seconds": "Parquet store reads for one loader call",
+    "http_request_seconds": "HTTP requests made through the shared client",
+    "analytics_compute_seconds": "analytics computed on a memo miss",
+    "chart_build_seconds": "chart figures built on a cache miss",
+    "alert_run_seconds": "background alert evaluations",
+    "health_probe_seconds": "background upstream pings, by endpoint",
+    "cache_lookups_total": "cache lookups by cache and result",
+    "http_response_bytes_total": "response body bytes received",
+    "fetched_bars_total": "bars fetched upstream",
+    "fetch_retries_total": "retried upstream requests by reason",
+    "fetch_errors_total": "upstream fetches that failed",
+    "fallback_tickers_total": "tickers passed on to the next provider in the auto chain",
+    "inflight_joins_total": "ticker ranges served by joining another session's fetch",
+    "health_checks_total": "background upstream health checks by endpoint and result",
+}
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)     # the last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate from the buckets, linear within the bucket holding rank q."""
+        if not self.count:
+            return float("nan")
+        rank, seen = q * self.count, 0
+        for i, c in enumerate(self.counts):
+            if c and seen + c >= rank:
+                lo = self.bounds[i - 1] if i > 0 else 0.0
+                hi = self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+                return lo + (hi - lo) * (rank - seen) / c
+            seen += c
+        return self.bounds[-1]
+
+
+def _labels_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(labels: tuple, extra: tuple = ()) -> str:
+    items = [*labels, *extra]
+    if not items:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+class Metrics:
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters: dict[tuple[str, tuple], float] = {}
+        self._histograms: dict[tuple[str, tuple], Histogram] = {}
+
+    def inc(self, name: str, value: float = 1.0, /, **labels) -> None:
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, /, **labels) -> None:
+        key = (name, _labels_key(labels))
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = Histogram(self.buckets)
+            h.observe(value)
+
+    @contextmanager
+    def span(self, name: str, /, **labels):
+        """Time the block into the `<name>_seconds` histogram.
+
+        Yields the label dict, so labels only known afterwards (a status code) can be added;
+        `outcome` is "error" if the block raised.
+        """
+        labels["outcome"] = "ok"
+        t0 = time.perf_counter()
+        try:
+            yield labels
+        except BaseException:
+            labels["outcome"] = "error"
+            raise
+        finally:
+            self.observe(f"{name}_seconds", time.perf_counter() - t0, **labels)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    # -- views -------------------------------------------------------------------------------
+
+    def latency_table(self) -> pd.DataFrame:
+        """One row per histogram series: count, p50/p90/p99 and total time."""
+        with self._lock:
+            rows = [{
+                "metric": name.removesuffix("_seconds"),
+                "labels": ", ".join(f"{k}={v}" for k, v in labels if k != "outcome" or v != "ok"),
+                "count": h.count,
+                "p50 ms": h.quantile(0.5) * 1000,
+                "p90 ms": h.quantile(0.9) * 1000,
+                "p99 ms": h.quantile(0.99) * 1000,
+                "total s": h.sum,
+            } for (name, labels), h in self._histograms.items()]
+        if not rows:
+            return pd.DataFrame(columns=["metric", "labels", "count", "p50 ms", "p90 ms", "p99 ms", "total s"])
+        return pd.DataFrame(rows).sort_values("total s", ascending=False, ignore_index=True)
+
+    def counter_table(self) -> pd.DataFrame:
+        with self._lock:
+            rows = [{"metric": name, "labels": ", ".join(f"{k}={v}" for k, v in labels), "value": value}
+                    for (name, labels), value in self._counters.items()]
+        if not rows:
+            return pd.DataFrame(columns=["metric", "labels", "value"])
+        return pd.DataFrame(rows).sort_values(["metric", "labels"], ignore_index=True)
+
+    def hit_ratios(self) -> dict[str, float | None]:
+        """hits / lookups per cache, from `cache_lookups_total`."""
+        totals: dict[str, list[float]] = {}
+        with self._lock:
+            for (name, labels), value in self._counters.items():
+                if name != "cache_lookups_total":
+                    continue
+                d = dict(labels)
+                t = totals.setdefault(d.get("cache", ""), [0.0, 0.0])
+                t[0] += value if d.get("result") == "hit" else 0.0
+                t[1] += value
+        return {cache: round(hits / total, 3) if total else None for cache, (hits, total) in totals.items()}
+
+    def prometheus_text(self) -> str:
+        """Text exposition format (counters and histograms, names prefixed with PREFIX)."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((k, (list(h.counts), h.sum, h.count)) for k, h in self._histograms.items())
+        lines, typed = [], set()
+
+        def header(name: str, kind: str) -> None:
+            if name not in typed:
+                typed.add(name)
+                base = name.removeprefix(PREFIX)
+                if base in HELP:
+                    lines.append(f"# HELP {name} {HELP[base]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            header(PREFIX + name, "counter")
+            lines.append(f"{PREFIX}{name}{_fmt_labels(labels)} {value:.15g}")
+        for (name, labels), (counts, total, count) in histograms:
+            full = PREFIX + name
+            header(full, "histogram")
+            cumulative = 0
+            for bound, c in zip([*map(str, self.buckets), "+Inf"], counts):
+                cumulative += c
+                lines.append(f"{full}_bucket{_fmt_labels(labels, (('le', bound),))} {cumulative}")
+            lines.append(f"{full}_sum{_fmt_labels(labels)} {total:.6f}")
+            lines.append(f"{full}_count{_fmt_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: Path | str) -> None:
+        """Atomically write `prometheus_text()` for a node_exporter textfile collector."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(self.prometheus_text())
+        tmp.replace(path)
+
+
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    return _metrics
@@ -0,0 +1,176 @@
+from __future__ import annotations
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+import requests.adapters
+
+from utils.metrics import get_metrics
+
+# Process-wide HTTP layer shared by every provider and the diagnostics panel: one pooled
+# session, per-host health/circuit-breaker state, and the Binance region that last worked.
+
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36"
+
+POOL_SIZE = 16
+FAILURE_THRESHOLD = 3     # consecutive failures before a host is skipped
+OPEN_SECONDS = 30.0       # how long a tripped host is skipped before one probe is let through
+
+BINANCE_GLOBAL = "https://api.binance.com"
+BINANCE_US = "https://api.binance.us"
+REGION_TTL = 6 * 60 * 60  # re-probe global Binance a few times a day
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of making a request to a host whose breaker is open."""
+
+
+class HostHealth:
+    def __init__(self, host: str):
+        self.host = host
+        self.failures = 0
+        self.open_until = 0.0
+        self.probing = False
+        self.last_status: int | None = None
+        self.last_error: str | None = None
+        self.last_latency: float | None = None
+        self.last_checked: float | None = None
+
+    @property
+    def state(self) -> str:
+        if self.open_until and time.time() < self.open_until:
+            return "open"
+        if self.open_until:
+            return "half-open"
+        return "closed"
+
+    def as_dict(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "last_status": self.last_status,
+            "last_error": self.last_error,
+            "last_latency_ms": None if self.last_latency is None else round(self.last_latency * 1000, 1),
+            "last_checked": self.last_checked,
+        }
+
+
+class HttpClient:
+    def __init__(self, pool_size: int = POOL_SIZE):
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"User-Agent": USER_AGENT})
+        self._health: dict[str, HostHealth] = {}
+        self._lock = threading.Lock()
+        self._binance_base = BINANCE_GLOBAL
+        self._binance_checked = 0.0
+
+    def _host(self, url: str) -> HostHealth:
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._health:
+                self._health[host] = HostHealth(host)
+            return self._health[host]
+
+    def _admit(self, h: HostHealth) -> None:
+        with self._lock:
+            state = h.state
+            if state == "open":
+                raise CircuitOpenError(f"{h.host} skipped: circuit open after {h.failures} failures ({h.last_error})")
+            if state == "half-open":
+                # Only one request gets to find out whether the host is back.
+                if h.probing:
+                    raise CircuitOpenError(f"{h.host} skipped: recovery probe in flight")
+                h.probing = True
+
+    def _record(self, h: HostHealth, ok: bool, status: int | None, error: str | None, latency: float) -> None:
+        with self._lock:
+            h.last_status = status
+            h.last_error = error
+            h.last_latency = latency
+            h.last_checked = time.time()
+            h.probing = False
+            if ok:
+                h.failures = 0
+                h.open_until = 0.0
+            else:
+                h.failures += 1
+                if h.failures >= FAILURE_THRESHOLD or h.open_until:
+                    h.open_until = time.time() + OPEN_SECONDS
+
+    def request(self, method: str, url: str, timeout: float = 10, **kwargs) -> requests.Response:
+        h = self._host(url)
+        metrics = get_metrics()
+        with metrics.span("http_request", host=h.host, method=method, status="error") as labels:
+            try:
+                self._admit(h)
+            except CircuitOpenError:
+                labels["status"] = "circuit_open"
+                raise
+            t0 = time.perf_counter()
+            try:
+                r = self.session.request(method, url, timeout=timeout, **kwargs)
+            except requests.RequestException as e:
+                self._record(h, False, None, f"{type(e).__name__}: {e}", time.perf_counter() - t0)
+                raise
+            # Only server-side trouble counts against the host; 4xx (incl. 429/451) is a valid answer.
+            self._record(h, r.status_code < 500, r.status_code, None if r.status_code < 500 else r.reason,
+                         time.perf_counter() - t0)
+            labels["status"] = r.status_code
+            metrics.inc("http_response_bytes_total", len(r.content), host=h.host)
+        return r
+
+    def get(self, url: str, params: dict | None = None, timeout: float = 10, **kwargs) -> requests.Response:
+        return self.request("GET", url, timeout=timeout, params=params, **kwargs)
+
+    def post(self, url: str, json: object = None, timeout: float = 10, **kwargs) -> requests.Response:
+        return self.request("POST", url, timeout=timeout, json=json, **kwargs)
+
+    @contextmanager
+    def guard(self, url: str):
+        """Breaker bookkeeping for requests made by a library on our session (yfinance)."""
+        h = self._host(url)
+        with get_metrics().span("http_request", host=h.host, method="library", status="n/a"):
+            self._admit(h)
+            t0 = time.perf_counter()
+            try:
+                yield
+            except Exception as e:
+                self._record(h, False, None, f"{type(e).__name__}: {e}", time.perf_counter() - t0)
+                raise
+            self._record(h, True, None, None, time.perf_counter() - t0)
+
+    def health(self) -> dict[str, dict]:
+        with self._lock:
+            return {host: h.as_dict() for host, h in self._health.items()}
+
+    def binance_base(self) -> str:
+        """Binance REST root that last worked; global is retried once REGION_TTL has passed."""
+        with self._lock:
+            if self._binance_base != BINANCE_GLOBAL and time.time() - self._binance_checked > REGION_TTL:
+                self._binance_base = BINANCE_GLOBAL
+            return self._binance_base
+
+    def mark_binance_blocked(self, base: str) -> str:
+        """Remember that `base` geo-blocks us and return the fallback region."""
+        with self._lock:
+            if base == BINANCE_GLOBAL:
+                self._binance_base = BINANCE_US
+                self._binance_checked = time.time()
+            return self._binance_base
+
+
+_client: HttpClient | None = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> HttpClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from utils.analytics import PriceAnalytics
+
+# Long-only (weights >= 0, summing to 1) portfolio optimization on daily returns, numpy only.
+# The efficient frontier is solved as a batch: every point is a mean-variance problem with
+# its own risk aversion, and all of them take their projected-gradient steps together as
+# one (points x assets) @ (assets x assets) product per iteration. The Monte Carlo cloud
+# scores random weight vectors the same way, a chunk of rows at a time so memory stays
+# bounded however many samples or assets there are.
+
+PERIODS = 252                      # annualization, as in the page's Sharpe/vol
+FRONTIER_POINTS = 40
+N_SAMPLES = 100_000
+CHUNK_BYTES = 64 * 1024 * 1024     # working-set cap for one Monte Carlo chunk
+CLOUD_POINTS = 20_000              # cloud rows kept (and memoized) for display, however many are scored
+MAX_ITER = 3000
+TOL = 1e-10
+
+
+def project_simplex(v: np.ndarray) -> np.ndarray:
+    """Euclidean projection of each row onto {w >= 0, sum(w) = 1} (sort-based, vectorized)."""
+    n = v.shape[-1]
+    u = -np.sort(-v, axis=-1)
+    css = np.cumsum(u, axis=-1) - 1
+    k = np.arange(1, n + 1)
+    rho = np.count_nonzero(u - css / k > 0, axis=-1)
+    theta = np.take_along_axis(css, (rho - 1)[..., None], axis=-1) / rho[..., None]
+    return np.maximum(v - theta, 0.0)
+
+
+def mean_variance(mu: np.ndarray, cov: np.ndarray, aversion: np.ndarray) -> np.ndarray:
+    """Long-only solutions of  min w'Σw - μ'w / a  for each risk aversion `a` (rows of the result).
+
+    Accelerated projected gradient on all problems at once; a = inf is the min-variance portfolio.
+    """
+    n = len(mu)
+    tilt = np.where(np.isinf(aversion), 0.0, 1.0 / aversion)[:, None] * mu[None, :]
+    step = 1.0 / (2 * np.linalg.eigvalsh(cov)[-1] + 1e-18)
+    w = np.full((len(aversion), n), 1.0 / n)
+    y, t = w.copy(), 1.0
+    for _ in range(MAX_ITER):
+        w_next = project_simplex(y - step * (2 * y @ cov - tilt))
+        t_next = (1 + (1 + 4 * t * t) ** 0.5) / 2
+        y = w_next + ((t - 1) / t_next) * (w_next - w)
+        done = np.max(np.abs(w_next - w)) < TOL
+        w, t = w_next, t_next
+        if done:
+            break
+    return w
+
+
+def risk_parity(cov: np.ndarray, sweeps: int = 200) -> np.ndarray:
+    """Long-only equal-risk-contribution weights.
+
+    Cyclical coordinate descent on the convex form  min ½y'Σy - Σ log(y_i) / n  (y > 0), whose
+    minimizer normalized to sum 1 has equal risk contributions; each coordinate update is
+    the positive root of a quadratic, so it holds with negative correlations too.
+    """
+    n = len(cov)
+    diag = np.diag(cov)
+    y = 1.0 / np.sqrt(diag)
+    sy = cov @ y
+    for _ in range(sweeps):
+        y_prev = y.copy()
+        for i in range(n):
+            rest = sy[i] - diag[i] * y[i]
+            new = (-rest + np.sqrt(rest * rest + 4 * diag[i] / n)) / (2 * diag[i])
+            sy += cov[:, i] * (new - y[i])
+            y[i] = new
+        if np.max(np.abs(y - y_prev) / y) < 1e-9:
+            break
+    return y / y.sum()
+
+
+def score(weights: np.ndarray, mu: np.ndarray, cov: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Annualized (return, vol) of each weight row: one matrix product for the whole block."""
+    ret = weights @ mu * PERIODS
+    var = np.einsum("ij,ij->i", weights @ cov, weights) * PERIODS
+    return ret, np.sqrt(np.maximum(var, 0.0))
+
+
+def monte_carlo(mu: np.ndarray, cov: np.ndarray, n_samples: int = N_SAMPLES, seed: int = 0,
+                chunk_bytes: int = CHUNK_BYTES) -> tuple[pd.DataFrame, np.ndarray]:
+    """Score `n_samples` uniform random long-only portfolios; returns (ret/vol/sharpe, best weights).
+
+    Weights are generated and scored a chunk at a time (rows sized to `chunk_bytes`), and only
+    the three scores per sample are kept, so memory doesn't grow with the asset count.
+    """
+    n = len(mu)
+    rng = np.random.default_rng(seed)
+    rows = max(1, chunk_bytes // (3 * 8 * n))
+    ret = np.empty(n_samples, dtype=np.float32)
+    vol = np.empty(n_samples, dtype=np.float32)
+    best_w, best_sharpe = None, -np.inf
+    for lo in range(0, n_samples, rows):
+        hi = min(lo + rows, n_samples)
+        w = rng.dirichlet(np.ones(n), size=hi - lo)
+        r, v = score(w, mu, cov)
+        ret[lo:hi], vol[lo:hi] = r, v
+        with np.errstate(invalid="ignore", divide="ignore"):
+            s = r / v
+        i = int(np.nanargmax(s)) if np.isfinite(s).any() else -1
+        if i >= 0 and s[i] > best_sharpe:
+            best_sharpe, best_w = s[i], w[i].copy()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sharpe = ret / vol
+    return pd.DataFrame({"ret": ret, "vol": vol, "sharpe": sharpe}), best_w
+
+
+def optimize(engine: PriceAnalytics, columns: list[str], n_samples: int = N_SAMPLES,
+             points: int = FRONTIER_POINTS, seed: int = 0) -> dict:
+    """Min-variance, max-Sharpe and risk-parity portfolios, the frontier and the MC cloud.
+
+    Uses the daily returns of `columns` over their common history (rf = 0). Memoized with the
+    other analytics of the price frame. All `n_samples` portfolios are scored (and can win max
+    Sharpe), but `cloud` is a fixed random sample of CLOUD_POINTS of them, so a memo entry
+    stays the same size whatever `n_samples` is.
+    """
+    def compute():
+        rets = engine.aligned(list(columns)).returns(how="any")
+        cols = list(rets.columns)
+        if len(rets) < 2 or not cols:
+            return None
+        mu = rets.mean().to_numpy(dtype=np.float64)
+        cov = rets.cov().to_numpy(dtype=np.float64)
+
+        # Risk aversions spaced so the frontier runs from min-variance to the top-return asset.
+        scale = max(np.abs(mu).max(), 1e-12) / (2 * np.linalg.eigvalsh(cov)[-1] + 1e-18)
+        aversion = np.concatenate([[np.inf], 1 / (scale * np.geomspace(1e-3, 1e3, points - 1))])
+        frontier_w = mean_variance(mu, cov, aversion)
+        f_ret, f_vol = score(frontier_w, mu, cov)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            f_sharpe = f_ret / f_vol
+        order = np.argsort(f_vol)
+        frontier = pd.DataFrame(frontier_w[order], columns=cols)
+        frontier.insert(0, "sharpe", f_sharpe[order])
+        frontier.insert(0, "ret", f_ret[order])
+        frontier.insert(0, "vol", f_vol[order])
+        frontier = frontier.drop_duplicates(subset=["vol", "ret"]).reset_index(drop=True)
+
+        cloud, mc_best = monte_carlo(mu, cov, n_samples=n_samples, seed=seed)
+        # Max Sharpe: best frontier point, refined between its neighbours on a finer aversion grid.
+        k = int(np.nanargmax(f_sharpe)) if np.isfinite(f_sharpe).any() else 0
+        lo, hi = aversion[max(k - 1, 1)], aversion[min(k + 1, len(aversion) - 1)]
+        fine = mean_variance(mu, cov, np.geomspace(min(lo, hi), max(lo, hi), 32)) if np.isfinite(lo) else frontier_w[[k]]
+        candidates = np.vstack([fine, frontier_w[[k]]] + ([mc_best[None]] if mc_best is not None else []))
+        c_ret, c_vol = score(candidates, mu, cov)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            max_sharpe = candidates[int(np.nanargmax(c_ret / c_vol))]
+
+        portfolios = pd.DataFrame(
+            {"Min variance": frontier_w[0], "Max Sharpe": max_sharpe, "Risk parity": risk_parity(cov)},
+            index=cols,
+        )
+        p_ret, p_vol = score(portfolios.T.to_numpy(), mu, cov)
+        stats = pd.DataFrame({"Return (ann)": p_ret, "Vol (ann)": p_vol}, index=portfolios.columns)
+        stats["Sharpe"] = stats["Return (ann)"] / stats["Vol (ann)"]
+        shown = cloud.sample(min(len(cloud), CLOUD_POINTS), random_state=0).reset_index(drop=True)
+        return {"weights": portfolios, "stats": stats, "frontier": frontier, "cloud": shown,
+                "mu": mu, "cov": cov, "columns": cols}
+
+    return engine.memo("optimize", tuple(columns), n_samples, points, seed, compute=compute)
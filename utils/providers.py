@@ -1,32 +1,30 @@
 from __future__ import annotations
+import operator
+import os
+import numpy as np
 import pandas as pd
 import requests
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from utils.cache import get_cache
+from utils.metrics import get_metrics
+from utils.net import BINANCE_GLOBAL, BINANCE_US, get_client
+from utils.ratelimit import BINANCE_KLINES_WEIGHT, LIMITS, retry_after
+from utils.registry import get_registry
+from utils.replay import get_dataset
+from utils.store import get_store
+from utils.synthetic import SEED as SYNTHETIC_SEED, generate as generate_synthetic
 
-DEFAULT_UNIVERSE = ["BTC-USD","ETH-USD","SOL-USD","BNB-USD","XRP-USD","ADA-USD","DOGE-USD","AVAX-USD"]
-
-COINGECKO_MAP = {
-    "BTC-USD": "bitcoin",
-    "ETH-USD": "ethereum",
-    "SOL-USD": "solana",
-    "BNB-USD": "binancecoin",
-    "XRP-USD": "ripple",
-    "ADA-USD": "cardano",
-    "DOGE-USD": "dogecoin",
-    "AVAX-USD": "avalanche-2",
-}
+try:
+    import orjson
+except ImportError:  # optional, faster JSON decoding for kline pages
+    orjson = None
 
-BINANCE_MAP = {
-    "BTC-USD": "BTCUSDT",
-    "ETH-USD": "ETHUSDT",
-    "SOL-USD": "SOLUSDT",
-    "BNB-USD": "BNBUSDT",
-    "XRP-USD": "XRPUSDT",
-    "ADA-USD": "ADAUSDT",
-    "DOGE-USD": "DOGEUSDT",
-    "AVAX-USD": "AVAXUSDT",
-}
+# Provider ids per ticker come from utils.registry; these are the ones the pages preselect.
+DEFAULT_UNIVERSE = ["BTC-USD","ETH-USD","SOL-USD","BNB-USD","XRP-USD","ADA-USD","DOGE-USD","AVAX-USD"]
 
 def last_price_and_change(series: pd.Series) -> tuple[float, float]:
     s = series.dropna()
@@ -36,193 +34,335 @@ def last_price_and_change(series: pd.Series) -> tuple[float, float]:
     prev = float(s.iloc[-2])
     return px, (px/prev - 1) * 100.0
 
-@st.cache_data(ttl=3600, show_spinner=False)
-def _load_binance(tickers: list[str], start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+def _record_error(provider: str, msg: str) -> None:
+    get_metrics().inc("fetch_errors_total", provider=provider)
+    # Fetch threads carry the session's script context (see _pool); outside a script run
+    # (the warm-up, the alert worker) session_state is unavailable and the error is only printed.
+    try:
+        st.session_state["last_fetch_error"] = msg
+    except Exception:
+        pass
+
+# Enough workers to run the default universe (and a few pagination windows) at once;
+# the token buckets in utils.ratelimit are what actually bound request rates.
+MAX_WORKERS = 8
+
+def _pool(max_workers: int) -> ThreadPoolExecutor:
+    """Thread pool whose workers carry the calling session's script context, if any.
+
+    Without it, `st.session_state` writes from fetch threads (e.g. _record_error) are dropped.
+    Nested pools pick the context up from their parent worker.
+    """
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is None:
+        return ThreadPoolExecutor(max_workers=max_workers)
+    return ThreadPoolExecutor(max_workers=max_workers,
+                              initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx))
+
+BINANCE_PAGE = 1000
+DAY_MS = 24 * 60 * 60 * 1000
+
+# Bar sizes understood by get_prices; values are the bar length in milliseconds.
+INTERVAL_MS = {
+    "1m": 60 * 1000,
+    "5m": 5 * 60 * 1000,
+    "15m": 15 * 60 * 1000,
+    "1h": 60 * 60 * 1000,
+    "4h": 4 * 60 * 60 * 1000,
+    "1d": DAY_MS,
+}
+
+# Yahoo only serves intraday history for a limited lookback; CoinGecko's free API only
+# has daily and (up to 90 days back) hourly granularity.
+YAHOO_INTERVALS = {"1m": "1m", "5m": "5m", "15m": "15m", "1h": "1h", "1d": "1d"}
+COINGECKO_INTERVALS = {"1h", "1d"}
+
+# Every provider's bars are normalized to these float32 columns on a DatetimeIndex
+# (int64 epoch-ns underneath). Volume is in base-asset units. Fields a provider doesn't
+# publish are left NaN.
+OHLCV_COLUMNS = ["open", "high", "low", "close", "volume", "trades"]
+
+# Kline array positions: open time, open, high, low, close, base volume, ..., trade count
+KLINE_FIELDS = [1, 2, 3, 4, 5, 8]
+
+def bars_per_year(interval: str) -> float:
+    """Annualization factor for returns sampled at `interval` (crypto trades 24/7)."""
+    return 365 * DAY_MS / INTERVAL_MS[interval]
+
+YAHOO_URL = "https://query2.finance.yahoo.com"
+
+def _binance_windows(start_ms: int, end_ms: int, step_ms: int = DAY_MS) -> list[tuple[int, int]]:
+    # Page boundaries are known up front for fixed-size bars, so pages can be fetched in parallel
+    # instead of walking forward from the last close time.
+    span = BINANCE_PAGE * step_ms
+    return [(cur, min(cur + span, end_ms) - 1) for cur in range(start_ms, end_ms, span)]
+
+def _decode(r) -> object:
+    # orjson is optional; it roughly halves decode time on large kline pages.
+    if orjson is not None:
+        return orjson.loads(r.content)
+    return r.json()
+
+_kline_open = operator.itemgetter(0)
+_kline_fields = operator.itemgetter(*KLINE_FIELDS)
+
+def parse_klines(page: list) -> tuple[np.ndarray, np.ndarray]:
+    """Whole-page kline conversion: (open time ms as int64, OHLCV+trades as float32 [n, 6]).
+
+    The fields are picked with C-level itemgetters and parsed by numpy's string-to-float64
+    conversion in one call; going through an object array cast each cell in Python and took
+    ~30% longer on a 1,000-row page.
+    """
+    try:
+        opens = np.fromiter(map(_kline_open, page), dtype=np.int64, count=len(page))
+        values = np.array(list(map(_kline_fields, page)), dtype=np.float64)
+    except (IndexError, TypeError, ValueError):
+        values = None
+    if values is None or values.ndim != 2:
+        return np.empty(0, dtype=np.int64), np.empty((0, len(KLINE_FIELDS)), dtype=np.float32)
+    return opens, values.astype(np.float32)
+
+def _bars_frame(index, values: np.ndarray) -> pd.DataFrame:
+    return pd.DataFrame(values.astype(np.float32, copy=False), index=index, columns=OHLCV_COLUMNS)
+
+def _fetch_binance(tickers: list[str], start: pd.Timestamp, end: pd.Timestamp,
+                   interval: str = "1d") -> dict[str, pd.DataFrame]:
     out = {}
-    # Endpoints
-    base_global = "https://api.binance.com/api/v3/klines"
-    base_us = "https://api.binance.us/api/v3/klines"
-    
-    # Check which API works. This check is cached per session/function run effectively by logic flow,
-    # but strictly speaking we re-check on failure. 
-    # Let's try Global first, if 451/403/Timeout, switch to US for that ticker.
-    
+    # The shared client remembers which region answered last time, so a geo-blocked host
+    # costs one extra round trip per process rather than one per ticker per cache miss.
+    client = get_client()
+
     # Ensure datetimes
     start = pd.to_datetime(start)
     end = pd.to_datetime(end)
-    
+
+    step = INTERVAL_MS[interval]
     start_ms = int(start.timestamp() * 1000)
     end_ms = int((end + pd.Timedelta(days=1)).timestamp() * 1000)
+    n_bars = (end_ms - start_ms) // step
 
-    session = requests.Session()
+    registry = get_registry()
+    symbols = {t: registry.binance_symbol(t) for t in tickers}
+    jobs = [(t, symbols[t], w) for t in tickers if symbols[t] for w in _binance_windows(start_ms, end_ms, step)]
+    if not jobs:
+        return out
 
-    for t in tickers:
-        sym = BINANCE_MAP.get(t)
-        if not sym:
-            continue
+    # Bars are aligned to `step` from start_ms, so each kline has a fixed slot. Pages are parsed
+    # straight into one preallocated float32 buffer per ticker as they arrive instead of piling
+    # up lists of lists; at minute resolution that's 24 bytes per bar for full OHLCV.
+    buffers = {t: np.full((n_bars, len(OHLCV_COLUMNS)), np.nan, dtype=np.float32) for t in {job[0] for job in jobs}}
 
-        rows = []
-        cur = start_ms
-        
-        # Decide base URL for this ticker (or session)
-        # We start with global. If it fails, we mark a flag or just try US.
-        current_base = base_global
-        
-        # Try a probe request or just start fetching.
-        # If fetching fails midway, it's messy. Let's assume region block is immediate.
-        
-        while cur < end_ms:
-            params = {"symbol": sym, "interval": "1d", "startTime": cur, "endTime": end_ms, "limit": 1000}
-            try:
-                r = session.get(current_base, params=params, timeout=5)
-                
-                # Debugging region blocks
-                if r.status_code != 200:
-                    print(f"BINANCE DEBUG: Status {r.status_code} from {current_base}")
+    def fetch_page(t: str, sym: str, window: tuple[int, int]) -> tuple[np.ndarray, np.ndarray] | None | bool:
+        """Parsed klines, None for an empty page, or False if the page couldn't be fetched."""
+        params = {"symbol": sym, "interval": interval, "startTime": window[0], "endTime": window[1], "limit": BINANCE_PAGE}
+        current_base = client.binance_base()
+        try:
+            for _ in range(3):
+                bucket = LIMITS["binance" if current_base == BINANCE_GLOBAL else "binance_us"]
+                bucket.acquire(BINANCE_KLINES_WEIGHT)
+                try:
+                    r = client.get(f"{current_base}/api/v3/klines", params=params, timeout=5)
+                except requests.RequestException:
+                    # Global unreachable (timeout/DNS, or its breaker is open); try US for this
+                    # page without pinning the region.
+                    if current_base != BINANCE_GLOBAL:
+                        raise
+                    get_metrics().inc("fetch_retries_total", provider="binance", reason="unreachable")
+                    current_base = BINANCE_US
+                    continue
 
                 # Check for region block (451) or Forbidden (403)
-                # Some environments might return other codes for blocked content, so we debug first.
-                if r.status_code in [451, 403] and current_base == base_global:
+                if r.status_code in [451, 403] and current_base == BINANCE_GLOBAL:
                     print(f"Binance Global blocked ({r.status_code}). Switching to Binance US for {t}...")
-                    current_base = base_us
-                    r = session.get(current_base, params=params, timeout=5)
-                
-                r.raise_for_status()
-                data = r.json()
-                if not data:
-                    break
-                rows.extend(data)
-                # Next start time
-                cur = data[-1][6] + 1 
-            except Exception as e:
-                msg = f"Error fetching {t} from Binance ({current_base}): {e}"
-                print(msg)
-                # Don't clutter UI with every retry error, but store last one
-                st.session_state["last_fetch_error"] = msg
-                break
-        
-        if not rows:
-            continue
+                    get_metrics().inc("fetch_retries_total", provider="binance", reason="region_block")
+                    current_base = client.mark_binance_blocked(current_base)
+                    continue
+                # 429 = over the weight limit, 418 = IP auto-banned for ignoring 429s
+                if r.status_code in [429, 418]:
+                    get_metrics().inc("fetch_retries_total", provider="binance", reason="rate_limit")
+                    bucket.penalize(retry_after(r, bucket))
+                    continue
 
-        try:
-            # Column 0 is Open Time, Column 4 is Close Price
-            idx = pd.to_datetime([x[0] for x in rows], unit="ms")
-            close = pd.to_numeric([x[4] for x in rows], errors="coerce")
-            s = pd.Series(close, index=idx, name=t).sort_index()
-            # Filter to requested range
-            s = s.loc[(s.index >= start) & (s.index <= end + pd.Timedelta(days=1))] 
-            out[t] = s
+                r.raise_for_status()
+                page = _decode(r) or []
+                try:
+                    return parse_klines(page) if page else None
+                except Exception as e:
+                    print(f"Error parsing {t} from Binance: {e}")
+                    return False
+            r.raise_for_status()
         except Exception as e:
-            msg = f"Error parsing {t} from Binance: {e}"
+            msg = f"Error fetching {t} from Binance ({current_base}): {e}"
             print(msg)
+            # Don't clutter UI with every retry error, but store last one
+            _record_error("binance", msg)
+        return False
+
+    with _pool(min(MAX_WORKERS, len(jobs))) as pool:
+        futures = {pool.submit(fetch_page, *job): job for job in jobs}
+        # Start of each ticker's earliest failed page: an empty page means "no bars there",
+        # a failed one means "unknown", and the store mustn't record the latter as covered.
+        failed: dict[str, int] = {}
+        for fut in as_completed(futures):
+            t, _, window = futures[fut]
+            parsed = fut.result()
+            if parsed is False:
+                failed[t] = min(failed.get(t, window[0]), window[0])
+            if not parsed:
+                continue
+            open_ms, values = parsed
+            slots = (open_ms - start_ms) // step
+            ok = (slots >= 0) & (slots < n_bars)
+            buffers[t][slots[ok]] = values[ok]
+
+    for t, buf in buffers.items():
+        # A bar exists wherever a close arrived
+        ok = ~np.isnan(buf[:, 3])
+        if not ok.any():
             continue
+        idx = pd.to_datetime(start_ms + np.flatnonzero(ok).astype(np.int64) * step, unit="ms")
+        out[t] = _bars_frame(idx, buf[ok])
+        if t in failed:
+            out[t].attrs["complete_until"] = pd.to_datetime(failed[t], unit="ms")
 
-    return pd.DataFrame(out).sort_index().dropna(how="all")
+    return out
 
-@st.cache_data(ttl=3600, show_spinner=False)
-def _load_coingecko(tickers: list[str], start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+def _fetch_coingecko(tickers: list[str], start: pd.Timestamp, end: pd.Timestamp,
+                     interval: str = "1d") -> dict[str, pd.DataFrame]:
     out = {}
+    if interval not in COINGECKO_INTERVALS:
+        return out
     start = pd.to_datetime(start)
     end = pd.to_datetime(end)
-    days = max((end - start).days, 1)
+    # 'days' is counted back from now, not from `end`, so a tail refresh only asks for
+    # the last couple of days instead of the whole window again.
+    days = max((pd.Timestamp.today().normalize() - start.normalize()).days + 1, 2)
+    if interval == "1h":
+        # Hourly points are only returned (without a paid plan) for windows up to 90 days.
+        days = min(days, 90)
 
-    session = requests.Session()
-    # Add User-Agent to avoid 403s
-    session.headers.update({
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36"
-    })
+    registry = get_registry()
+    jobs = [(t, coin_id) for t in tickers if (coin_id := registry.coingecko_id(t))]
+    if not jobs:
+        return out
 
-    for i, t in enumerate(tickers):
-        coin_id = COINGECKO_MAP.get(t)
-        if not coin_id:
-            continue
+    # The shared client sends a browser User-Agent, which avoids CoinGecko 403s
+    client = get_client()
+    bucket = LIMITS["coingecko"]
 
+    def fetch_coin(t: str, coin_id: str) -> pd.DataFrame | None:
         url = f"https://api.coingecko.com/api/v3/coins/{coin_id}/market_chart"
         # 'days' argument for CoinGecko:
         # 1/7/14/30/90/180/365/max
         # If we send a custom number, it tries its best, but sometimes defaults.
-        # It's safer to request a bit more buffer.
-        params = {"vs_currency": "usd", "days": str(max(days, 30)), "interval": "daily"}
-        
+        params = {"vs_currency": "usd", "days": str(days)}
+        if interval == "1d":
+            params["interval"] = "daily"
+
         try:
-            r = session.get(url, params=params, timeout=10)
-            if r.status_code == 429:
-                print(f"Rate limited on {t}, sleeping...")
-                time.sleep(10) # Backoff
-                r = session.get(url, params=params, timeout=10)
-                
+            for _ in range(3):
+                bucket.acquire()
+                r = client.get(url, params=params, timeout=10)
+                if r.status_code != 429:
+                    break
+                wait = retry_after(r, bucket)
+                print(f"Rate limited on {t}, pausing CoinGecko for {wait:.0f}s...")
+                get_metrics().inc("fetch_retries_total", provider="coingecko", reason="rate_limit")
+                bucket.penalize(wait)
+
             r.raise_for_status()
-            js = r.json()
+            js = _decode(r)
             prices_list = js.get("prices", [])
             if not prices_list:
                 print(f"No prices found for {t} from CoinGecko")
-                continue
+                return None
+
+            # market_chart only carries price and volume; open/high/low/trades stay NaN.
+            arr = np.asarray(prices_list, dtype=np.float64)
+            values = np.full((len(arr), len(OHLCV_COLUMNS)), np.nan, dtype=np.float32)
+            values[:, 3] = arr[:, 1]
+            vols = np.asarray(js.get("total_volumes", []), dtype=np.float64)
+            if len(vols) == len(arr):
+                # CoinGecko volume is in USD; store base units like Binance does.
+                values[:, 4] = vols[:, 1] / arr[:, 1]
+            idx = pd.to_datetime(arr[:, 0].astype(np.int64), unit="ms")
+            # Snap to the bar grid for easier joining: CoinGecko usually returns ~00:00 UTC for
+            # 'daily' (and ~:00 for hourly) but sometimes varies by a few minutes.
+            df = _bars_frame(idx.floor("D" if interval == "1d" else "h"), values).sort_index()
 
-            idx = pd.to_datetime([p[0] for p in prices_list], unit="ms")
-            vals = [p[1] for p in prices_list]
-            s = pd.Series(vals, index=idx, name=t).sort_index()
-            # Normalize index to 00:00:00 for easier joining if needed, or keep precise
-            # CoinGecko usually returns ~00:00 UTC for 'daily' but sometimes varies.
-            s.index = s.index.normalize()
-            
             # Combine duplicates if any (take last)
-            s = s[~s.index.duplicated(keep='last')]
-
-            s = s.loc[(s.index >= start) & (s.index <= end)]
-            out[t] = s
-            
-            # Polite delay between calls to avoid hitting rate limits immediately
-            if i < len(tickers) - 1:
-                time.sleep(1.2)
-            
+            df = df[~df.index.duplicated(keep='last')]
+
+            return df.loc[(df.index >= start) & (df.index < end + pd.Timedelta(days=1))]
         except Exception as e:
             msg = f"Error fetching {t} from CoinGecko: {e}"
             print(msg)
-            st.session_state["last_fetch_error"] = msg
-            pass
+            _record_error("coingecko", msg)
+            return None
+
+    with _pool(min(MAX_WORKERS, len(jobs))) as pool:
+        futures = {pool.submit(fetch_coin, *job): job[0] for job in jobs}
+        for fut in as_completed(futures):
+            df = fut.result()
+            if df is not None and not df.empty:
+                out[futures[fut]] = df
 
-    return pd.DataFrame(out).sort_index().dropna(how="all")
+    return out
 
-@st.cache_data(ttl=3600, show_spinner=False)
-def _load_yfinance(tickers: list[str], start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+def _fetch_yfinance(tickers: list[str], start: pd.Timestamp, end: pd.Timestamp,
+                    interval: str = "1d") -> dict[str, pd.DataFrame]:
     import yfinance as yf
     out = {}
+    if interval not in YAHOO_INTERVALS:
+        return out
     
     # yfinance expects date strings or datetime objects
-    # It handles batch downloading well
+    # It handles batch downloading well. `end` is exclusive there, so pad by a day
+    # to include the (possibly still forming) last bar.
     try:
-        data = yf.download(tickers, start=start, end=end, group_by='ticker', auto_adjust=True, threads=True)
+        client = get_client()
+        LIMITS["yahoo"].acquire()
+        with client.guard(YAHOO_URL):
+            data = yf.download(tickers, start=start, end=end + pd.Timedelta(days=1), group_by='ticker',
+                               interval=YAHOO_INTERVALS[interval], auto_adjust=True, threads=True,
+                               session=client.session)
         
         if data.empty:
-            return pd.DataFrame()
+            return {}
 
         # If only one ticker is requested, yfinance returns a flat DataFrame (not MultiIndex columns for tickers)
         # unless we force it, but group_by='ticker' usually handles structure well.
         # However, if len(tickers) == 1, the columns are just 'Open', 'High'... 
         # If len(tickers) > 1, columns are ('BTC-USD', 'Open'), ...
         
+        multi = isinstance(data.columns, pd.MultiIndex)
         for t in tickers:
             try:
-                if len(tickers) == 1:
+                if multi:
+                    if t not in data.columns.get_level_values(0):
+                        continue
+                    sub = data[t]
+                elif len(tickers) == 1:
                     # Single ticker case
-                    s = data["Close"]
+                    sub = data
                 else:
-                    # Multi ticker case
-                    if t not in data.columns:
-                        continue
-                    s = data[t]["Close"]
-                
-                s = s.dropna()
+                    continue
+
+                sub = sub.rename(columns=str.lower).dropna(subset=["close"])
+                # Yahoo quotes crypto volume in USD; store base units like Binance does.
+                sub = sub.assign(volume=sub["volume"] / sub["close"]) if "volume" in sub else sub
+                df = _bars_frame(sub.index, sub.reindex(columns=OHLCV_COLUMNS).to_numpy(dtype=np.float32))
                 # Ensure time zone naive or consistent? 
                 # yfinance returns tz-aware. We often want naive or UTC.
                 # The rest of the app seems to expect somewhat loose checks.
                 # Let's strip tz just in case to match other sources
-                if s.index.tz is not None:
-                    s.index = s.index.tz_convert(None)
+                if df.index.tz is not None:
+                    df.index = df.index.tz_convert(None)
 
                 # Filter range (yf usually precise but good to double check)
-                s = s.loc[(s.index >= start) & (s.index <= end)]
-                out[t] = s.sort_index()
+                df = df.loc[(df.index >= start) & (df.index < end + pd.Timedelta(days=1))]
+                if not df.empty:
+                    out[t] = df.sort_index()
             except Exception as e:
                 print(f"Error extracting {t} from yfinance data: {e}")
                 continue
@@ -230,56 +370,332 @@ def _load_yfinance(tickers: list[str], start: pd.Timestamp, end: pd.Timestamp) -
     except Exception as e:
         msg = f"Error fetching from Yahoo Finance: {e}"
         print(msg)
-        st.session_state["last_fetch_error"] = msg
-        return pd.DataFrame()
+        _record_error("yahoo", msg)
+        return {}
 
-    return pd.DataFrame(out).sort_index().dropna(how="all")
+    return out
+
+def _fetch_synthetic(tickers: list[str], start: pd.Timestamp, end: pd.Timestamp,
+                     interval: str = "1d") -> dict[str, pd.DataFrame]:
+    # Offline stand-in for an upstream API (see utils.synthetic): only the requested gap is
+    # generated, and it goes through the store and range cache like any real fetch.
+    step = INTERVAL_MS[interval]
+    start_ms = int(pd.to_datetime(start).timestamp() * 1000)
+    end_ms = int((pd.to_datetime(end) + pd.Timedelta(days=1)).timestamp() * 1000)
+    # No bars from the future; the latest one is "forming" and regenerated identically.
+    end_ms = min(end_ms, int(time.time() * 1000))
+
+    def one(t: str) -> tuple[str, pd.DataFrame | None]:
+        open_ms, values = generate_synthetic(t, start_ms, end_ms, step, SYNTHETIC_SEED)
+        return t, _bars_frame(pd.to_datetime(open_ms, unit="ms"), values) if len(open_ms) else None
 
-def get_prices(tickers: list[str], start: pd.Timestamp, end: pd.Timestamp, source: str = "auto") -> pd.DataFrame:
-    tickers = [t.strip().upper() for t in tickers if t.strip()]
     if not tickers:
-        return pd.DataFrame()
+        return {}
+    with _pool(min(MAX_WORKERS, len(tickers))) as pool:
+        return {t: bars for t, bars in pool.map(one, tickers) if bars is not None}
+
+_FETCHERS = {
+    "binance": _fetch_binance,
+    "coingecko": _fetch_coingecko,
+    "yahoo": _fetch_yfinance,
+    "synthetic": _fetch_synthetic,
+}
+
+class SingleFlight:
+    """Coalesces identical upstream fetches across concurrent sessions.
+
+    The first caller to claim a key does the work; later callers get that caller's
+    future and wait on it instead of firing their own request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: dict[tuple, Future] = {}
+        self.fetched = 0
+        self.saved = 0
+
+    def claim(self, keys: list[tuple]) -> tuple[list[tuple], dict[tuple, Future]]:
+        owned, waiting = [], {}
+        with self._lock:
+            for key in keys:
+                fut = self._inflight.get(key)
+                if fut is None:
+                    self._inflight[key] = Future()
+                    owned.append(key)
+                else:
+                    waiting[key] = fut
+            self.fetched += len(owned)
+            self.saved += len(waiting)
+        return owned, waiting
+
+    def release(self, keys: list[tuple]) -> None:
+        with self._lock:
+            futs = [self._inflight.pop(key, None) for key in keys]
+        for fut in futs:
+            if fut is not None:
+                fut.set_result(None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"fetched": self.fetched, "saved": self.saved, "in_flight": len(self._inflight)}
+
+_inflight = SingleFlight()
+
+# Upper bound on waiting for another session's fetch (a full cold Binance backfill included).
+FLIGHT_TIMEOUT = 120
+
+def fetch_stats() -> dict:
+    """Per-ticker fetch counts: `fetched` upstream vs `saved` by joining an in-flight fetch."""
+    return _inflight.stats()
+
+def _utcnow() -> pd.Timestamp:
+    # Bars are indexed in naive UTC.
+    return pd.Timestamp.now("UTC").tz_localize(None)
+
+def _load_from_store(provider: str, tickers: list[str], start: pd.Timestamp, end: pd.Timestamp,
+                     interval: str = "1d") -> dict[str, pd.DataFrame]:
+    """Serve bars from the on-disk store, fetching only the ranges it doesn't hold yet."""
+    store = get_store()
+    fetch = _FETCHERS[provider]
+    start = pd.to_datetime(start).normalize()
+    end = pd.to_datetime(end).normalize()
+    step = pd.Timedelta(milliseconds=INTERVAL_MS[interval])
+    now = _utcnow()
+    # The newest bar wanted: the last of the `end` day, or the one open now if that's earlier.
+    # For intraday bars this isn't midnight, so later fetches the same day still find the
+    # bars that opened since (for daily bars it's `end`, capped at today).
+    last = max(start, min(end + pd.Timedelta(days=1) - step, now.floor(step)))
+
+    # Group tickers by identical gap so batch-capable providers (Yahoo) make one call.
+    # On a warm store this is usually just the newest bar for every ticker.
+    gaps: dict[tuple[pd.Timestamp, pd.Timestamp], list[str]] = {}
+    for t in tickers:
+        for gap in store.missing_ranges(provider, t, interval, start, last, step, now=now):
+            gaps.setdefault(gap, []).append(t)
+
+    # Each gap group is itself fetched concurrently inside the provider; running the groups
+    # side by side too keeps latency at the slowest group rather than their sum.
+    metrics = get_metrics()
+
+    def run(gap, group):
+        # Another session may already be fetching some of these exact ranges: only fetch the
+        # rest, then wait for theirs. Either way the bars end up in the store before we read.
+        owned, waiting = _inflight.claim([(provider, interval, t, gap) for t in group])
+        if waiting:
+            metrics.inc("inflight_joins_total", len(waiting), provider=provider)
+        try:
+            if owned:
+                tickers_owned = [key[2] for key in owned]
+                print(f"{provider}: fetching {len(tickers_owned)} tickers for {gap[0].date()} -> {gap[1].date()}")
+                with metrics.span("fetch", provider=provider, interval=interval):
+                    fetched = fetch(tickers_owned, *gap, interval=interval)
+                for t, bars in fetched.items():
+                    if bars is None or bars.empty:
+                        continue
+                    metrics.inc("fetched_bars_total", len(bars), provider=provider)
+                    # A fetcher marks bars with `complete_until` when part of the gap failed:
+                    # coverage stops there, so the rest is fetched again next time.
+                    covered_to = min(gap[1], bars.attrs.pop("complete_until", gap[1]))
+                    try:
+                        store.write(provider, t, interval, bars, gap[0], covered_to)
+                    except Exception as e:
+                        print(f"Store write failed for {provider}/{t}: {e}")
+        finally:
+            _inflight.release(owned)
+        for fut in waiting.values():
+            fut.result(timeout=FLIGHT_TIMEOUT)
+
+    with _pool(max(1, min(4, len(gaps)))) as pool:
+        list(pool.map(lambda item: run(*item), gaps.items()))
+
+    out = {}
+    with metrics.span("store_read", provider=provider):
+        for t in tickers:
+            df = store.read(provider, t, interval, start, end + pd.Timedelta(days=1) - pd.Timedelta(1))
+            if not df.empty and "close" in df.columns:
+                out[t] = df.reindex(columns=OHLCV_COLUMNS).astype(np.float32, copy=False)
+    return out
+
+def _load_from_replay(provider: str, tickers: list[str], start: pd.Timestamp, end: pd.Timestamp,
+                      interval: str = "1d") -> dict[str, pd.DataFrame]:
+    """Serve bars from the recorded dataset (utils.replay); it's on disk already, so no store."""
+    dataset = get_dataset()
+    start = pd.to_datetime(start).normalize()
+    end = pd.to_datetime(end).normalize()
+    out = {}
+    with get_metrics().span("store_read", provider=provider):
+        for t in tickers:
+            df = dataset.read(t, interval, start, end + pd.Timedelta(days=1) - pd.Timedelta(1))
+            if not df.empty and "close" in df.columns:
+                out[t] = df.reindex(columns=OHLCV_COLUMNS).astype(np.float32, copy=False)
+    return out
+
+def _load_cached(provider: str, tickers: list[str], start: pd.Timestamp, end: pd.Timestamp,
+                 interval: str = "1d", refresh: bool = False, load=_load_from_store) -> dict[str, pd.DataFrame]:
+    """Serve bars from the process-wide range cache, falling through to `load` (the store).
+
+    On a miss the ticker is loaded for the union of the requested and already cached range,
+    so the entry grows into a superset that later windows and subsets are sliced from.
+    `refresh` reloads even fresh entries (the store still only fetches the forming tail).
+    """
+    cache = get_cache()
+    metrics = get_metrics()
+    start = pd.to_datetime(start).normalize()
+    end = pd.to_datetime(end).normalize()
+    # Intraday ranges reaching today go stale as fast as their bars do.
+    ttl = min(cache.ttl, max(60.0, INTERVAL_MS[interval] / 1000))
+
+    out = {}
+    to_load: dict[tuple[pd.Timestamp, pd.Timestamp], list[str]] = {}
+    with metrics.span("load", provider=provider, interval=interval):
+        for t in tickers:
+            key = (provider, t, interval)
+            bars = None if refresh else cache.get(key, start, end)
+            if bars is None:
+                span = cache.span(key)
+                lo, hi = (min(start, span[0]), max(end, span[1])) if span else (start, end)
+                to_load.setdefault((lo, hi), []).append(t)
+            elif not bars.empty:
+                out[t] = bars
+        n_missed = sum(map(len, to_load.values()))
+        metrics.inc("cache_lookups_total", len(tickers) - n_missed, cache="prices", result="hit")
+        metrics.inc("cache_lookups_total", n_missed, cache="prices", result="miss")
+
+        for (lo, hi), group in to_load.items():
+            loaded = load(provider, group, lo, hi, interval)
+            for t in group:
+                # Cache misses too (briefly), so a ticker the provider lacks isn't re-requested every rerun.
+                bars = loaded.get(t, pd.DataFrame(columns=OHLCV_COLUMNS, dtype=np.float32))
+                cache.put((provider, t, interval), bars, lo, hi, ttl=ttl)
+                if not bars.empty:
+                    out[t] = bars.loc[(bars.index >= start) & (bars.index < end + pd.Timedelta(days=1))]
+
+    return out
+
+def _load_binance(tickers: list[str], start: pd.Timestamp, end: pd.Timestamp, interval: str = "1d",
+                  refresh: bool = False) -> dict[str, pd.DataFrame]:
+    return _load_cached("binance", tickers, start, end, interval, refresh)
+
+def _load_coingecko(tickers: list[str], start: pd.Timestamp, end: pd.Timestamp, interval: str = "1d",
+                    refresh: bool = False) -> dict[str, pd.DataFrame]:
+    return _load_cached("coingecko", tickers, start, end, interval, refresh)
+
+def _load_yfinance(tickers: list[str], start: pd.Timestamp, end: pd.Timestamp, interval: str = "1d",
+                   refresh: bool = False) -> dict[str, pd.DataFrame]:
+    return _load_cached("yahoo", tickers, start, end, interval, refresh)
+
+def _load_synthetic(tickers: list[str], start: pd.Timestamp, end: pd.Timestamp, interval: str = "1d",
+                    refresh: bool = False) -> dict[str, pd.DataFrame]:
+    return _load_cached("synthetic", tickers, start, end, interval, refresh)
+
+def _load_replay(tickers: list[str], start: pd.Timestamp, end: pd.Timestamp, interval: str = "1d",
+                 refresh: bool = False) -> dict[str, pd.DataFrame]:
+    return _load_cached("replay", tickers, start, end, interval, refresh, load=_load_from_replay)
+
+def clear_price_cache() -> None:
+    """Drop in-memory prices; the on-disk store is kept so nothing is refetched in full."""
+    get_cache().clear()
+
+# Fallback order for source="auto": Binance first (fastest/best data), then Yahoo (reliable),
+# then CoinGecko (backup, tightest rate limit).
+AUTO_CHAIN = ["binance", "yahoo", "coingecko"]
+# Offline sources, never part of "auto": seeded synthetic bars and recorded datasets.
+OFFLINE_SOURCES = ["synthetic", "replay"]
+# What app.py, the warm-up and the pages' source pickers start from; DASH_SOURCE=synthetic
+# runs the whole app without network (load tests, demos).
+DEFAULT_SOURCE = os.environ.get("DASH_SOURCE", "auto").lower()
 
+def source_index(options: list[str]) -> int:
+    """Position of DEFAULT_SOURCE in a page's source picker (the first entry if it isn't offered)."""
+    return options.index(DEFAULT_SOURCE) if DEFAULT_SOURCE in options else 0
+
+def ticker_options() -> dict[str, str]:
+    """Ticker -> label for the pages' universe pickers, as of the session's first page load.
+
+    A multiselect's identity includes its formatted options, so a registry refresh that
+    adds a listing or renames a coin would reset the user's selection mid-session.
+    """
+    options = st.session_state.get("ticker_options")
+    if options is None:
+        registry = get_registry()
+        options = st.session_state["ticker_options"] = {t: registry.label(t) for t in registry.tickers()}
+    return options
+
+_LOADERS = {
+    "binance": _load_binance,
+    "yahoo": _load_yfinance,
+    "coingecko": _load_coingecko,
+    "synthetic": _load_synthetic,
+    "replay": _load_replay,
+}
+
+def _get_bars(tickers: list[str], start: pd.Timestamp, end: pd.Timestamp, source: str,
+              interval: str, refresh: bool = False) -> tuple[list[str], dict[str, pd.DataFrame], dict[str, str]]:
+    # Aliases ("bitcoin", "BTCUSDT", "btc") resolve to the registry's canonical ticker.
+    registry = get_registry()
+    tickers = list(dict.fromkeys(registry.resolve(t) or t.strip().upper() for t in tickers if t.strip()))
     source = (source or "auto").lower()
-    
-    # Define strategy
-    # If auto, try Binance first (fastest/best data), then Yahoo (Reliable), then CoinGecko (Backup)
-    if source == "auto":
-        print("Attempting Binance...")
-        df = _load_binance(tickers, start, end)
-        if is_valid_result(df, tickers):
-            return df
-        
-        print("Binance partial/failed. Attempting Yahoo Finance...")
-        df_yf = _load_yfinance(tickers, start, end)
-        if is_valid_result(df_yf, tickers):
-            return df_yf
-
-        print("Yahoo partial/failed. Attempting CoinGecko...")
-        df_cg = _load_coingecko(tickers, start, end)
-        if not df_cg.empty:
-            return df_cg
-            
-        # Return best effort (yahoo or binance)
-        if not df_yf.empty: 
-            return df_yf
-        return df
-
-    elif source == "binance":
-        return _load_binance(tickers, start, end)
-    elif source == "yahoo":  # Allow manual selection if added to UI later
-        return _load_yfinance(tickers, start, end)
-    elif source == "coingecko":
-        return _load_coingecko(tickers, start, end)
-
-    return pd.DataFrame()
-
-def is_valid_result(df: pd.DataFrame, requested_tickers: list[str]) -> bool:
-    """Check if the result is 'good enough' to avoid falling back."""
-    if df.empty:
-        return False
-    # If we got at least 50% of requested tickers, consider it a success?
-    # Or strict: if any column exists.
-    # For now: if not empty, it's something.
-    return True
+    chain = AUTO_CHAIN if source == "auto" else [source]
+    if not tickers or any(name not in _LOADERS for name in chain) or interval not in INTERVAL_MS:
+        return tickers, {}, {}
+
+    # Each provider is only asked for the tickers nobody before it could serve, so a
+    # partial Binance result costs one small Yahoo/CoinGecko call instead of a full refetch.
+    bars: dict[str, pd.DataFrame] = {}
+    provenance: dict[str, str] = {}
+    remaining = list(tickers)
+    for name in chain:
+        if not remaining:
+            break
+        print(f"Attempting {name} for {len(remaining)} tickers...")
+        got = _LOADERS[name](remaining, start, end, interval, refresh)
+        for t in remaining:
+            if t in got and got[t]["close"].notna().any():
+                bars[t] = got[t]
+                provenance[t] = name
+        remaining = [t for t in remaining if t not in bars]
+        if remaining and source == "auto":
+            print(f"{name} missing {remaining}.")
+            nxt = chain[chain.index(name) + 1] if name != chain[-1] else "none"
+            get_metrics().inc("fallback_tickers_total", len(remaining), **{"from": name, "to": nxt})
+    return tickers, bars, provenance
+
+def get_prices(tickers: list[str], start: pd.Timestamp, end: pd.Timestamp, source: str = "auto",
+               interval: str = "1d") -> pd.DataFrame:
+    """Close prices, one column per ticker, one row per `interval` bar (see INTERVAL_MS).
+
+    `df.attrs["provenance"]` maps each returned column to the source that served it.
+    """
+    with get_metrics().span("get_prices", source=source, interval=interval):
+        tickers, bars, provenance = _get_bars(tickers, start, end, source, interval)
+    if not bars:
+        return pd.DataFrame()
+    # Closes are stored as float32; analytics get float64 so compounded returns don't drift.
+    out = pd.DataFrame({t: bars[t]["close"].astype(np.float64) for t in tickers if t in bars})
+    out = out.sort_index().dropna(how="all")
+    out.attrs["provenance"] = {t: provenance[t] for t in out.columns}
+    return out
+
+def get_ohlcv(tickers: list[str], start: pd.Timestamp, end: pd.Timestamp, source: str = "auto",
+              interval: str = "1d") -> pd.DataFrame:
+    """Full bars with (ticker, field) columns, fields as in OHLCV_COLUMNS (float32).
+
+    Same sources, caching and provenance as get_prices.
+    """
+    with get_metrics().span("get_ohlcv", source=source, interval=interval):
+        tickers, bars, provenance = _get_bars(tickers, start, end, source, interval)
+    if not bars:
+        return pd.DataFrame()
+    out = pd.concat({t: bars[t] for t in tickers if t in bars}, axis=1).sort_index()
+    out.attrs["provenance"] = {t: provenance[t] for t in bars}
+    return out
+
+def warm_prices(tickers: list[str], start: pd.Timestamp, end: pd.Timestamp, source: str = "auto",
+                interval: str = "1d") -> dict[str, str]:
+    """Reload bars into the cache ahead of demand, even if the cached copy is still fresh.
 
+    Returns the provenance map; used by the background warm-up scheduler.
+    """
+    with get_metrics().span("warm_prices", source=source, interval=interval):
+        _, _, provenance = _get_bars(tickers, start, end, source, interval, refresh=True)
+    return provenance
@@ -0,0 +1,75 @@
+from __future__ import annotations
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket.
+
+    `rate` tokens are added per second up to `capacity`. Callers `acquire(weight)` before
+    each request and block until enough tokens are available, so concurrent workers share
+    one budget instead of each sleeping on its own schedule.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, weight: float = 1.0, timeout: float | None = None) -> bool:
+        weight = min(float(weight), self.capacity)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._blocked_until and self._tokens >= weight:
+                    self._tokens -= weight
+                    return True
+                wait = max(self._blocked_until - now, (weight - self._tokens) / self.rate)
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+    def penalize(self, seconds: float) -> None:
+        """Stop handing out tokens for `seconds` (e.g. after a 429 with Retry-After)."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+    def cooldown(self) -> float:
+        """Seconds for an empty bucket to refill completely; fallback backoff for a 429."""
+        return self.capacity / self.rate
+
+
+# Published limits, expressed per second:
+# - Binance spot: 6000 request weight / minute per IP; klines cost 2 weight.
+# - Binance US: 1200 request weight / minute per IP.
+# - CoinGecko public API: roughly 30 calls / minute; keep a small burst.
+# - Yahoo has no published limit; yfinance batches tickers in one call anyway.
+LIMITS = {
+    "binance": TokenBucket(rate=6000 / 60, capacity=600),
+    "binance_us": TokenBucket(rate=1200 / 60, capacity=120),
+    "coingecko": TokenBucket(rate=30 / 60, capacity=5),
+    "yahoo": TokenBucket(rate=60 / 60, capacity=5),
+}
+
+BINANCE_KLINES_WEIGHT = 2
+
+
+def retry_after(response, bucket: TokenBucket) -> float:
+    """Backoff for a throttled response: the server's Retry-After, else a full refill."""
+    try:
+        return max(float(response.headers.get("Retry-After", "")), 0.0)
+    except (TypeError, ValueError):
+        return bucket.cooldown()
@@ -0,0 +1,313 @@
+from __future__ import annotations
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+import requests
+
+from utils.net import BINANCE_GLOBAL, BINANCE_US, get_client
+from utils.ratelimit import LIMITS, retry_after
+from utils.store import STORE_DIR
+
+# Symbol registry: every tradable ticker with its per-provider ids, loaded from the Binance
+# listing (USDT spot pairs) and matched to CoinGecko coin ids. The table is kept as Parquet
+# next to the price store and loaded from there at startup, so pages never wait on a listing
+# download; refresh() (run by the warm-up thread) updates it in place. The seed below is the
+# fallback when no snapshot exists yet, and always wins for the symbols it pins.
+
+REGISTRY_DIR = STORE_DIR / "registry"
+REFRESH_SECONDS = 24 * 60 * 60     # per source; listings change slowly
+EXCHANGE_INFO_WEIGHT = 20
+MARKET_PAGES = 4                   # /coins/markets pages (250 coins each) ranked to break symbol ties
+COLUMNS = ["ticker", "base", "name", "binance", "coingecko", "yahoo"]
+
+SEED_SYMBOLS = [
+    # ticker, base, name, Binance symbol, CoinGecko id
+    ("BTC-USD", "BTC", "Bitcoin", "BTCUSDT", "bitcoin"),
+    ("ETH-USD", "ETH", "Ethereum", "ETHUSDT", "ethereum"),
+    ("SOL-USD", "SOL", "Solana", "SOLUSDT", "solana"),
+    ("BNB-USD", "BNB", "BNB", "BNBUSDT", "binancecoin"),
+    ("XRP-USD", "XRP", "XRP", "XRPUSDT", "ripple"),
+    ("ADA-USD", "ADA", "Cardano", "ADAUSDT", "cardano"),
+    ("DOGE-USD", "DOGE", "Dogecoin", "DOGEUSDT", "dogecoin"),
+    ("AVAX-USD", "AVAX", "Avalanche", "AVAXUSDT", "avalanche-2"),
+]
+
+# CoinGecko ids that share a symbol with the real coin but are wrappers/bridges of it.
+_DERIVATIVE_ID = re.compile(r"(^|-)(wrapped|bridged|peg|binance-peg|wormhole|osmosis|axelar|stargate)(-|$)")
+
+
+def _seed_table() -> pd.DataFrame:
+    rows = [dict(zip(COLUMNS, (*row, row[0]))) for row in SEED_SYMBOLS]
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+def _pick_coingecko(candidates: list[dict], ranks: dict[str, int]) -> dict | None:
+    # /coins/list has no ranking, and popular symbols are claimed by dozens of tokens. Wrappers
+    # are dropped (unless that's all there is, e.g. WBTC); of several remaining coins, the one
+    # with the highest market cap wins. With no ranked candidate the id is left unset: serving
+    # another token's prices under the ticker would be worse than CoinGecko not serving it.
+    originals = [c for c in candidates if not _DERIVATIVE_ID.search(c["id"])] or candidates
+    if len(originals) == 1:
+        return originals[0]
+    ranked = [c for c in originals if c["id"] in ranks]
+    return min(ranked, key=lambda c: ranks[c["id"]]) if ranked else None
+
+
+class SymbolRegistry:
+    def __init__(self, root: Path | str = REGISTRY_DIR):
+        self.root = Path(root)
+        self._refresh_lock = threading.Lock()
+        self._meta = self._read_meta()
+        self._set_table(self._load())
+        self.last_error: str | None = None
+
+    @property
+    def _data_path(self) -> Path:
+        return self.root / "symbols.parquet"
+
+    @property
+    def _meta_path(self) -> Path:
+        return self.root / "symbols.json"
+
+    def _read_meta(self) -> dict:
+        try:
+            return json.loads(self._meta_path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _load(self) -> pd.DataFrame:
+        table = None
+        if self._data_path.exists():
+            try:
+                table = pd.read_parquet(self._data_path).reindex(columns=COLUMNS)
+            except Exception as e:
+                print(f"Registry snapshot unreadable, using seed: {e}")
+        return self._with_seed(table if table is not None else _seed_table())
+
+    @staticmethod
+    def _with_seed(table: pd.DataFrame) -> pd.DataFrame:
+        seed = _seed_table()
+        rest = table[~table["ticker"].isin(seed["ticker"])]
+        return pd.concat([seed, rest], ignore_index=True)
+
+    def _set_table(self, table: pd.DataFrame) -> None:
+        # Indexes are rebuilt off to the side and swapped in whole, so lookups never lock.
+        table = table.astype(object).where(table.notna(), None)
+        rows = {r["ticker"]: r for r in table.to_dict("records")}
+        aliases: dict[str, str] = {}
+        # Later keys don't override earlier ones: tickers first, then the weaker aliases.
+        for field in ("ticker", "base", "binance", "coingecko", "name"):
+            for t, r in rows.items():
+                if r[field]:
+                    aliases.setdefault(str(r[field]).lower(), t)
+        self._table = table
+        self._rows = rows
+        self._aliases = aliases
+
+    def _save(self, table: pd.DataFrame) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self._data_path.with_suffix(".parquet.tmp")
+        table.to_parquet(tmp, index=False)
+        os.replace(tmp, self._data_path)
+        tmp = self._meta_path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(self._meta))
+        os.replace(tmp, self._meta_path)
+
+    # -- lookups ---------------------------------------------------------------------------
+
+    def tickers(self) -> list[str]:
+        return list(self._rows)
+
+    def get(self, ticker: str) -> dict | None:
+        return self._rows.get(ticker)
+
+    def binance_symbol(self, ticker: str) -> str | None:
+        r = self._rows.get(ticker)
+        return r["binance"] if r else None
+
+    def coingecko_id(self, ticker: str) -> str | None:
+        r = self._rows.get(ticker)
+        return r["coingecko"] if r else None
+
+    def label(self, ticker: str) -> str:
+        r = self._rows.get(ticker)
+        return f"{ticker} · {r['name']}" if r and r["name"] else ticker
+
+    def resolve(self, query: str) -> str | None:
+        """Canonical ticker for a ticker, base asset, provider id or coin name."""
+        return self._aliases.get(query.strip().lower())
+
+    # -- refresh ---------------------------------------------------------------------------
+
+    def _stale(self, source: str) -> bool:
+        return time.time() - self._meta.get("refreshed", {}).get(source, 0) > REFRESH_SECONDS
+
+    def _fetch_binance_listing(self) -> dict[str, str]:
+        """{base asset: symbol} for every USDT spot pair currently trading."""
+        client = get_client()
+        base = client.binance_base()
+        for _ in range(3):
+            bucket = LIMITS["binance" if base == BINANCE_GLOBAL else "binance_us"]
+            bucket.acquire(EXCHANGE_INFO_WEIGHT)
+            try:
+                r = client.get(f"{base}/api/v3/exchangeInfo", timeout=15)
+            except requests.RequestException:
+                if base != BINANCE_GLOBAL:
+                    raise
+                base = BINANCE_US
+                continue
+            if r.status_code in [451, 403] and base == BINANCE_GLOBAL:
+                base = client.mark_binance_blocked(base)
+                continue
+            if r.status_code in [429, 418]:
+                bucket.penalize(retry_after(r, bucket))
+                continue
+            r.raise_for_status()
+            return {
+                s["baseAsset"]: s["symbol"]
+                for s in r.json().get("symbols", [])
+                if s.get("quoteAsset") == "USDT" and s.get("status") == "TRADING"
+            }
+        r.raise_for_status()
+        return {}
+
+    def _fetch_coingecko_list(self) -> list[dict]:
+        client = get_client()
+        bucket = LIMITS["coingecko"]
+        for _ in range(3):
+            bucket.acquire()
+            r = client.get("https://api.coingecko.com/api/v3/coins/list", timeout=20)
+            if r.status_code != 429:
+                break
+            bucket.penalize(retry_after(r, bucket))
+        r.raise_for_status()
+        return r.json()
+
+    def _fetch_coingecko_ranks(self) -> dict[str, int]:
+        """{coin id: market-cap rank} for the top MARKET_PAGES * 250 coins; partial on errors."""
+        client = get_client()
+        bucket = LIMITS["coingecko"]
+        ranks: dict[str, int] = {}
+        for page in range(1, MARKET_PAGES + 1):
+            bucket.acquire()
+            try:
+                r = client.get("https://api.coingecko.com/api/v3/coins/markets", timeout=20,
+                               params={"vs_currency": "usd", "order": "market_cap_desc", "per_page": 250,
+                                       "page": page})
+                r.raise_for_status()
+            except Exception as e:
+                print(f"CoinGecko market ranks stopped at page {page}: {type(e).__name__}: {e}")
+                break
+            for c in r.json():
+                ranks.setdefault(c["id"], len(ranks))
+        return ranks
+
+    def refresh(self, force: bool = False) -> dict[str, int]:
+        """Update stale sources in place and persist the table; returns rows touched per source.
+
+        Binance defines the ticker set; CoinGecko only adds ids and names to it (its list has
+        tens of thousands of mostly untradeable tokens). Delisted pairs keep their row, without
+        a Binance symbol, so the other providers can still serve their history. CoinGecko
+        matches are redone on every CoinGecko refresh (see _pick_coingecko), so a symbol that
+        has become ambiguous loses its id rather than keeping a guess.
+        """
+        touched: dict[str, int] = {}
+        with self._refresh_lock:
+            table = self._table.copy()
+            seed = set(t for t, *_ in SEED_SYMBOLS)
+            refreshed = self._meta.setdefault("refreshed", {})
+            errors = []
+
+            if force or self._stale("binance"):
+                try:
+                    listing = self._fetch_binance_listing()
+                except Exception as e:
+                    errors.append(f"Binance listing: {type(e).__name__}: {e}")
+                else:
+                    by_base = dict(zip(table["base"], table.index))
+                    new_rows = []
+                    for base, sym in listing.items():
+                        if base in by_base:
+                            i = by_base[base]
+                            if table.at[i, "ticker"] not in seed and table.at[i, "binance"] != sym:
+                                table.at[i, "binance"] = sym
+                                touched["binance"] = touched.get("binance", 0) + 1
+                        else:
+                            ticker = f"{base}-USD"
+                            new_rows.append({"ticker": ticker, "base": base, "name": None, "binance": sym,
+                                             "coingecko": None, "yahoo": ticker})
+                    gone = ~table["base"].isin(listing) & ~table["ticker"].isin(seed) & table["binance"].notna()
+                    table.loc[gone, "binance"] = None
+                    touched["binance"] = touched.get("binance", 0) + len(new_rows) + int(gone.sum())
+                    if new_rows:
+                        table = pd.concat([table, pd.DataFrame(new_rows, columns=COLUMNS)], ignore_index=True)
+                    refreshed["binance"] = time.time()
+
+            if force or self._stale("coingecko"):
+                try:
+                    coins = self._fetch_coingecko_list()
+                except Exception as e:
+                    errors.append(f"CoinGecko list: {type(e).__name__}: {e}")
+                else:
+                    by_symbol: dict[str, list[dict]] = {}
+                    for c in coins:
+                        by_symbol.setdefault(c.get("symbol", "").lower(), []).append(c)
+                    ranks = self._fetch_coingecko_ranks()
+                    n = 0
+                    for i, row in table.iterrows():
+                        if row["ticker"] in seed:
+                            continue
+                        candidates = by_symbol.get(str(row["base"]).lower(), [])
+                        coin = _pick_coingecko(candidates, ranks)
+                        coin_id = coin["id"] if coin else None
+                        current = None if pd.isna(row["coingecko"]) else row["coingecko"]
+                        # Without ranks (the markets call failed) an ambiguous match keeps its id.
+                        if coin_id == current or (
+                                coin is None and not ranks and current in {c["id"] for c in candidates}):
+                            continue
+                        table.at[i, "coingecko"] = coin_id
+                        if coin:
+                            table.at[i, "name"] = coin.get("name") or row["name"]
+                        n += 1
+                    touched["coingecko"] = n
+                    refreshed["coingecko"] = time.time()
+
+            self.last_error = "; ".join(errors) or None
+            if errors:
+                print(f"Registry refresh incomplete: {self.last_error}")
+            if touched:
+                table = self._with_seed(table.sort_values("ticker", kind="stable"))
+                try:
+                    self._save(table)
+                except OSError as e:
+                    print(f"Registry snapshot not saved: {e}")
+                self._set_table(table)
+        return touched
+
+    def status(self) -> dict:
+        refreshed = self._meta.get("refreshed", {})
+        return {
+            "symbols": len(self._rows),
+            "binance": sum(1 for r in self._rows.values() if r["binance"]),
+            "coingecko": sum(1 for r in self._rows.values() if r["coingecko"]),
+            "refreshed": {k: pd.Timestamp(v, unit="s").floor("s").isoformat() for k, v in refreshed.items()},
+            "last_error": self.last_error,
+        }
+
+
+_registry: SymbolRegistry | None = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> SymbolRegistry:
+    """Process-wide registry, loaded from the on-disk snapshot (or the seed); never fetches."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = SymbolRegistry()
+        return _registry
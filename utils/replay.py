@@ -0,0 +1,110 @@
+from __future__ import annotations
+import argparse
+import os
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+# Recorded datasets served as a data source (source="replay"), for offline runs against real
+# history. The layout is the price store's own, <root>/<interval>/<TICKER>.parquet, so a
+# provider directory of a store (e.g. .store/binance) is already a dataset. CSV files with a
+# timestamp first column and OHLCV columns are read too; only `close` is required.
+#
+#   python -m utils.replay record BTC-USD ETH-USD --start 2024-01-01 --interval 1h
+
+REPLAY_DIR = Path(os.environ.get("DASH_REPLAY_DIR", Path(__file__).resolve().parent.parent / ".store" / "replay"))
+
+
+class ReplayDataset:
+    def __init__(self, root: Path | str = REPLAY_DIR):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+        # Parsed files by path, dropped when the file's mtime changes.
+        self._frames: dict[Path, tuple[float, pd.DataFrame]] = {}
+
+    def _path(self, ticker: str, interval: str) -> Path | None:
+        safe = ticker.replace("/", "_").replace(":", "_")
+        for suffix in (".parquet", ".csv"):
+            path = self.root / interval / f"{safe}{suffix}"
+            if path.exists():
+                return path
+        return None
+
+    def _load(self, path: Path) -> pd.DataFrame:
+        mtime = path.stat().st_mtime
+        with self._lock:
+            hit = self._frames.get(path)
+            if hit is not None and hit[0] == mtime:
+                return hit[1]
+        if path.suffix == ".csv":
+            df = pd.read_csv(path, index_col=0)
+            df.index = pd.to_datetime(df.index, utc=True).tz_localize(None)
+        else:
+            df = pd.read_parquet(path)
+        df = df.rename(columns=str.lower).sort_index()
+        df.index = df.index.as_unit("ns")
+        with self._lock:
+            self._frames[path] = (mtime, df)
+        return df
+
+    def tickers(self, interval: str = "1d") -> list[str]:
+        folder = self.root / interval
+        if not folder.is_dir():
+            return []
+        return sorted({p.stem for p in folder.iterdir() if p.suffix in (".parquet", ".csv")})
+
+    def read(self, ticker: str, interval: str, start: pd.Timestamp | None = None,
+             end: pd.Timestamp | None = None) -> pd.DataFrame:
+        path = self._path(ticker, interval)
+        if path is None:
+            return pd.DataFrame()
+        try:
+            df = self._load(path)
+        except Exception as e:
+            print(f"Replay read failed for {path}: {e}")
+            return pd.DataFrame()
+        if start is not None:
+            df = df.loc[df.index >= pd.Timestamp(start)]
+        if end is not None:
+            df = df.loc[df.index <= pd.Timestamp(end)]
+        return df
+
+    def write(self, ticker: str, interval: str, bars: pd.DataFrame) -> Path:
+        path = self.root / interval / f"{ticker.replace('/', '_').replace(':', '_')}.parquet"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".parquet.tmp")
+        bars.to_parquet(tmp)
+        os.replace(tmp, path)
+        return path
+
+
+_dataset: ReplayDataset | None = None
+
+
+def get_dataset() -> ReplayDataset:
+    global _dataset
+    if _dataset is None:
+        _dataset = ReplayDataset()
+    return _dataset
+
+
+if __name__ == "__main__":
+    from utils.providers import get_ohlcv
+
+    parser = argparse.ArgumentParser(description="Record bars from a data source into a replay dataset.")
+    parser.add_argument("action", choices=["record"])
+    parser.add_argument("tickers", nargs="+")
+    parser.add_argument("--start", required=True, help="first day")
+    parser.add_argument("--end", default=str(pd.Timestamp.today().date()), help="last day (default today)")
+    parser.add_argument("--interval", default="1d")
+    parser.add_argument("--source", default="auto", help="any get_prices source, e.g. binance or synthetic")
+    parser.add_argument("--dir", default=str(REPLAY_DIR), help="dataset directory")
+    args = parser.parse_args()
+
+    bars = get_ohlcv(args.tickers, pd.Timestamp(args.start), pd.Timestamp(args.end), source=args.source,
+                     interval=args.interval)
+    dataset = ReplayDataset(args.dir)
+    for ticker in bars.columns.get_level_values(0).unique():
+        frame = bars[ticker].dropna(subset=["close"])
+        print(f"{ticker}: {len(frame)} bars -> {dataset.write(ticker, args.interval, frame)}")
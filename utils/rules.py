@@ -0,0 +1,217 @@
+from __future__ import annotations
+import re
+
+import numpy as np
+import pandas as pd
+
+from utils.analytics import analytics_for, ewm_corr_to
+
+# Declarative alert rules. A rule is "<metric>[(<window>)] <comparator> <threshold> [on T1,T2]",
+# e.g. "vol(30) > 120", "corr(30) < 0.6", "drawdown <= -25", "return(7) >= 15 on SOL-USD".
+# The same fields can be given as a dict ({"metric": "vol", "window": 30, ...}).
+#
+# Rules are compiled against a ticker list into flat arrays (metric row, comparator,
+# threshold, universe mask). Each distinct (metric, window) is computed once for every
+# ticker, and all rules are then evaluated together as one (rules x tickers) comparison.
+
+BENCHMARK = "BTC-USD"
+VOL_PERIODS = 252
+
+# metric -> (default window, needs a window, description)
+METRICS = {
+    "vol": (30, True, "annualized volatility of the last `window` returns, %"),
+    "corr": (30, True, "correlation to BTC over the last `window` returns"),
+    "ecorr": (30, True, "exponentially weighted correlation to BTC, half-life window / 2"),
+    "drawdown": (None, False, "distance below the running peak, % (negative)"),
+    "return": (1, True, "change over the last `window` bars, %"),
+}
+
+COMPARATORS = (">", ">=", "<", "<=")
+
+_RULE_RE = re.compile(
+    r"^\s*(?P<metric>[a-z_]+)\s*(?:\(\s*(?P<window>\d+)\s*\))?\s*(?P<cmp>>=|<=|>|<)\s*"
+    r"(?P<threshold>[-+]?\d*\.?\d+(?:[eE][-+]?\d+)?)\s*(?:on\s+(?P<universe>.+?))?\s*$"
+)
+
+
+class Rule:
+    def __init__(self, metric: str, comparator: str, threshold: float, window: int | None = None,
+                 universe: list[str] | None = None, name: str | None = None):
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric {metric!r}; expected one of {sorted(METRICS)}")
+        if comparator not in COMPARATORS:
+            raise ValueError(f"Unknown comparator {comparator!r}; expected one of {COMPARATORS}")
+        default_window, windowed, _ = METRICS[metric]
+        window = int(window) if window is not None else default_window
+        if windowed and window < (1 if metric == "return" else 2):
+            raise ValueError(f"{metric} window too short: {window}")
+        self.metric = metric
+        self.window = window if windowed else None
+        self.comparator = comparator
+        self.threshold = float(threshold)
+        self.universe = list(universe) if universe else None
+        self.name = name or self.text()
+
+    @classmethod
+    def parse(cls, text: str) -> "Rule":
+        m = _RULE_RE.match(text.lower())
+        if m is None:
+            raise ValueError(f"Can't parse rule {text!r}; expected e.g. 'vol(30) > 120' or 'drawdown <= -25 on ETH-USD'")
+        universe = [t.strip().upper() for t in m["universe"].split(",")] if m["universe"] else None
+        return cls(m["metric"], m["cmp"], float(m["threshold"]), m["window"], universe)
+
+    @classmethod
+    def from_spec(cls, spec: "str | dict | Rule") -> "Rule":
+        if isinstance(spec, Rule):
+            return spec
+        if isinstance(spec, str):
+            return cls.parse(spec)
+        return cls(**spec)
+
+    @property
+    def key(self) -> tuple[str, int | None]:
+        return self.metric, self.window
+
+    def as_dict(self) -> dict:
+        d = {"metric": self.metric, "window": self.window, "comparator": self.comparator,
+             "threshold": self.threshold, "universe": self.universe}
+        if self.name != self.text():
+            d["name"] = self.name
+        return d
+
+    def text(self) -> str:
+        metric = self.metric if self.window is None else f"{self.metric}({self.window})"
+        on = f" on {','.join(self.universe)}" if self.universe else ""
+        return f"{metric} {self.comparator} {self.threshold:g}{on}"
+
+
+def default_rules(vol_thr: float, corr_window: int, corr_thr: float, dd_thr: float,
+                  ewm: bool = False) -> list[Rule]:
+    """Alert Studio's three slider rules."""
+    return [
+        Rule("vol", ">", vol_thr, 30, name="Volatility spike"),
+        Rule("ecorr" if ewm else "corr", "<", corr_thr, corr_window, name="Correlation break vs BTC"),
+        Rule("drawdown", "<=", -dd_thr, name="Drawdown exceeds"),
+    ]
+
+
+class MetricInputs:
+    """What every metric is computed from: recent returns aligned by bar, plus close and peak.
+
+    `rets` holds at least the longest window's worth of rows (columns = tickers); tickers
+    missing a bar have NaN there, and any metric whose window touches a NaN is NaN.
+    """
+
+    def __init__(self, rets: pd.DataFrame, close: pd.Series, peak: pd.Series):
+        self.tickers = list(close.index)
+        self.rets = rets.reindex(columns=self.tickers).to_numpy(dtype=np.float64)
+        self.rets_frame = rets
+        self.close = close.to_numpy(dtype=np.float64)
+        self.peak = peak.reindex(self.tickers).to_numpy(dtype=np.float64)
+        bench = rets[BENCHMARK] if BENCHMARK in rets.columns else None
+        self.bench = None if bench is None else bench.to_numpy(dtype=np.float64)
+
+    @classmethod
+    def from_prices(cls, prices: pd.DataFrame) -> "MetricInputs":
+        # Same returns/fill the pages chart, shared through the analytics memo.
+        engine = analytics_for(prices)
+        filled = engine.filled()
+        return cls(engine.returns(how="any"), filled.iloc[-1], filled.cummax().iloc[-1])
+
+
+def _tail(a: np.ndarray, n: int) -> np.ndarray | None:
+    return a[-n:] if len(a) >= n else None
+
+
+def _drop_benchmark(values: np.ndarray, x: MetricInputs) -> np.ndarray:
+    if BENCHMARK in x.tickers:
+        values[x.tickers.index(BENCHMARK)] = np.nan
+    return values
+
+
+def compute_metric(metric: str, window: int | None, x: MetricInputs) -> np.ndarray:
+    """One value per ticker (NaN where undefined; the benchmark's correlation to itself too)."""
+    n = len(x.tickers)
+    nan = np.full(n, np.nan)
+    if metric == "drawdown":
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return (x.close / x.peak - 1) * 100
+    if metric == "return":
+        r = _tail(x.rets, window)
+        if r is None:
+            return nan
+        return (np.prod(1 + r, axis=0) - 1) * 100
+    if metric == "vol":
+        r = _tail(x.rets, window)
+        if r is None:
+            return nan
+        return r.std(axis=0, ddof=1) * VOL_PERIODS ** 0.5 * 100
+    if metric == "corr":
+        r = _tail(x.rets, window)
+        if r is None or x.bench is None:
+            return nan
+        y = x.bench[-window:, None]
+        xc, yc = r - r.mean(axis=0), y - y.mean(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out = (xc * yc).sum(axis=0) / np.sqrt((xc * xc).sum(axis=0) * (yc * yc).sum(axis=0))
+        return _drop_benchmark(out, x)
+    if metric == "ecorr":
+        if x.bench is None or len(x.rets) < window:
+            return nan
+        frame = x.rets_frame.reindex(columns=x.tickers)
+        corr = ewm_corr_to(frame.assign(**{"__bench__": x.bench}), "__bench__", window / 2,
+                           min_periods=window // 2)
+        return _drop_benchmark(corr.iloc[-1].to_numpy(dtype=np.float64), x)
+    raise ValueError(f"Unknown metric {metric!r}")
+
+
+class CompiledRules:
+    """A rule list compiled against a ticker list for batched evaluation."""
+
+    def __init__(self, rules: list[Rule], tickers: list[str]):
+        self.rules = rules
+        self.tickers = list(tickers)
+        col = {t: i for i, t in enumerate(self.tickers)}
+        self.keys = list(dict.fromkeys(r.key for r in rules))
+        row = {k: i for i, k in enumerate(self.keys)}
+        self.metric_row = np.array([row[r.key] for r in rules], dtype=np.intp)
+        self.threshold = np.array([r.threshold for r in rules], dtype=np.float64)
+        # a > t  <=>  (a - t) > 0;  a < t  <=>  -(a - t) > 0; the flag picks > vs >=.
+        self.sign = np.array([1.0 if r.comparator[0] == ">" else -1.0 for r in rules])
+        self.strict = np.array([len(r.comparator) == 1 for r in rules])
+        self.mask = np.zeros((len(rules), len(self.tickers)), dtype=bool)
+        for i, r in enumerate(rules):
+            if r.universe is None:
+                self.mask[i] = True
+            else:
+                self.mask[i, [col[t] for t in r.universe if t in col]] = True
+
+    def metrics(self, inputs: MetricInputs) -> np.ndarray:
+        """(distinct metric keys x tickers) matrix shared by every rule."""
+        if inputs.tickers != self.tickers:
+            raise ValueError("MetricInputs tickers don't match the compiled rules")
+        return np.vstack([compute_metric(m, w, inputs) for m, w in self.keys]) if self.keys \
+            else np.empty((0, len(self.tickers)))
+
+    def evaluate(self, metrics: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """(hits, values), both (rules x tickers); NaN metrics never hit."""
+        values = metrics[self.metric_row]
+        signed = (values - self.threshold[:, None]) * self.sign[:, None]
+        with np.errstate(invalid="ignore"):
+            hits = np.where(self.strict[:, None], signed > 0, signed >= 0)
+        return hits & self.mask & ~np.isnan(values), values
+
+    def run(self, inputs: MetricInputs) -> pd.DataFrame:
+        """Triggered (rule, ticker, value, threshold) rows."""
+        hits, values = self.evaluate(self.metrics(inputs))
+        ri, ti = np.nonzero(hits)
+        return pd.DataFrame({
+            "rule": [self.rules[i].name for i in ri],
+            "ticker": [self.tickers[j] for j in ti],
+            "value": values[ri, ti],
+            "threshold": self.threshold[ri],
+        })
+
+
+def compile_rules(specs: list, tickers: list[str]) -> CompiledRules:
+    return CompiledRules([Rule.from_spec(s) for s in specs], tickers)
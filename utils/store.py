@@ -0,0 +1,150 @@
+from __future__ import annotations
+import json
+import os
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+# One Parquet file per (provider, symbol, interval). A small JSON sidecar records the
+# window we have already asked the provider for, so a coin that listed after `start`
+# doesn't trigger a head refetch on every call.
+# Bump when the stored columns change; files written under an older schema are refetched once.
+SCHEMA_VERSION = 2
+
+STORE_DIR = Path(os.environ.get("DASH_STORE_DIR", Path(__file__).resolve().parent.parent / ".store"))
+
+
+class PriceStore:
+    def __init__(self, root: Path | str = STORE_DIR):
+        self.root = Path(root)
+        self._locks: dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def _key(self, provider: str, symbol: str, interval: str) -> str:
+        safe = symbol.replace("/", "_").replace(":", "_")
+        return f"{provider}/{interval}/{safe}"
+
+    def _lock(self, key: str) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _paths(self, key: str) -> tuple[Path, Path]:
+        base = self.root / key
+        return base.with_suffix(".parquet"), base.with_suffix(".json")
+
+    def _read_meta(self, meta_path: Path) -> dict:
+        try:
+            return json.loads(meta_path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def coverage(self, provider: str, symbol: str, interval: str) -> tuple[pd.Timestamp, pd.Timestamp] | None:
+        """Return the (from, to) window already fetched for this key, or None."""
+        _, meta_path = self._paths(self._key(provider, symbol, interval))
+        meta = self._read_meta(meta_path)
+        if "from" not in meta or "to" not in meta or meta.get("schema") != SCHEMA_VERSION:
+            return None
+        return pd.Timestamp(meta["from"]), pd.Timestamp(meta["to"])
+
+    def read(self, provider: str, symbol: str, interval: str,
+             start: pd.Timestamp | None = None, end: pd.Timestamp | None = None) -> pd.DataFrame:
+        key = self._key(provider, symbol, interval)
+        data_path, _ = self._paths(key)
+        with self._lock(key):
+            if not data_path.exists():
+                return pd.DataFrame()
+            try:
+                df = pd.read_parquet(data_path)
+            except Exception as e:
+                print(f"Store read failed for {key}: {e}")
+                return pd.DataFrame()
+        if start is not None:
+            df = df.loc[df.index >= pd.Timestamp(start)]
+        if end is not None:
+            df = df.loc[df.index <= pd.Timestamp(end)]
+        return df
+
+    def write(self, provider: str, symbol: str, interval: str, data: pd.DataFrame,
+              start: pd.Timestamp, end: pd.Timestamp) -> None:
+        """Merge `data` into the stored frame and extend coverage to [start, end].
+
+        Coverage is one contiguous window: a [start, end] that doesn't touch the stored one
+        leaves it unchanged (the bars are still merged), since a hole between the two could
+        never be found again by `missing_ranges`.
+        """
+        key = self._key(provider, symbol, interval)
+        data_path, meta_path = self._paths(key)
+        with self._lock(key):
+            data_path.parent.mkdir(parents=True, exist_ok=True)
+            meta = self._read_meta(meta_path)
+            if meta.get("schema") != SCHEMA_VERSION:
+                meta = {}
+            old = pd.DataFrame()
+            # Rows written under an older schema are dropped rather than mixed in.
+            if data_path.exists() and meta:
+                try:
+                    old = pd.read_parquet(data_path)
+                except Exception as e:
+                    print(f"Store read failed for {key}, rewriting: {e}")
+            merged = pd.concat([old, data]) if not old.empty else data
+            # Newer rows win: the last stored bar is usually still forming.
+            merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+
+            tmp = data_path.with_suffix(".parquet.tmp")
+            merged.to_parquet(tmp)
+            os.replace(tmp, data_path)
+
+            lo, hi = pd.Timestamp(start), pd.Timestamp(end)
+            if "from" in meta and "to" in meta:
+                old_lo, old_hi = pd.Timestamp(meta["from"]), pd.Timestamp(meta["to"])
+                lo, hi = (min(lo, old_lo), max(hi, old_hi)) if lo <= old_hi and hi >= old_lo else (old_lo, old_hi)
+            # Never claim coverage past the newest bar; the tail is refetched from there.
+            if not merged.empty:
+                hi = min(hi, merged.index[-1])
+            tmp_meta = meta_path.with_suffix(".json.tmp")
+            tmp_meta.write_text(json.dumps({"from": lo.isoformat(), "to": hi.isoformat(), "schema": SCHEMA_VERSION}))
+            os.replace(tmp_meta, meta_path)
+
+    def missing_ranges(self, provider: str, symbol: str, interval: str,
+                       start: pd.Timestamp, end: pd.Timestamp,
+                       step: pd.Timedelta = pd.Timedelta(days=1),
+                       now: pd.Timestamp | None = None) -> list[tuple[pd.Timestamp, pd.Timestamp]]:
+        """Sub-ranges that still have to be fetched to serve bars opening in [start, end].
+
+        Gaps are anchored on the stored window so coverage stays contiguous (only the head
+        and tail are checked; `write` never records an interior hole as covered). Coverage
+        ends at the newest stored bar, which is refetched while it may still be forming
+        (opened less than `step` before `now`).
+        """
+        start = pd.Timestamp(start)
+        end = pd.Timestamp(end)
+        now = pd.Timestamp.now("UTC").tz_localize(None) if now is None else pd.Timestamp(now)
+        cov = self.coverage(provider, symbol, interval)
+        if cov is None:
+            return [(start, end)]
+        lo, hi = cov
+        gaps = []
+        if start < lo:
+            gaps.append((start, lo))
+        forming = hi + step > now
+        if end > hi or (end >= hi and forming):
+            gaps.append((hi, max(end, hi)))
+        return gaps
+
+    def clear(self) -> None:
+        if not self.root.exists():
+            return
+        for p in self.root.rglob("*"):
+            if p.is_file() and p.suffix in (".parquet", ".json", ".tmp"):
+                p.unlink(missing_ok=True)
+
+
+_store: PriceStore | None = None
+
+
+def get_store() -> PriceStore:
+    global _store
+    if _store is None:
+        _store = PriceStore()
+    return _store
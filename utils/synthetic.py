@@ -0,0 +1,141 @@
+from __future__ import annotations
+import os
+import zlib
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+# Seeded synthetic bars for offline load and scaling tests: any ticker, any interval, any range,
+# with no network. Log prices follow a one-factor jump diffusion: every ticker loads on a shared
+# market factor (so correlations look crypto-like) plus its own noise and Poisson jumps, with
+# drift, volatility, jump rate and price level drawn per ticker from the seed.
+#
+# Bars sit on a fixed grid from EPOCH and are generated in blocks of BLOCK_BARS. Each block's
+# total move comes from a short per-ticker stream (one draw per block), and the bars inside it
+# from a counter-based generator keyed by (ticker, interval, seed) and the block number, bridged
+# to that total. Any range is therefore generated on its own, without walking from EPOCH bar by
+# bar, and a bar's values don't depend on the range it was asked for: the store and range cache
+# can fill gaps and extend ranges exactly as they do for a real provider.
+
+EPOCH = pd.Timestamp("2010-01-01")
+EPOCH_MS = int(EPOCH.timestamp() * 1000)
+YEAR_MS = 365 * 24 * 60 * 60 * 1000
+DAY_MS = 24 * 60 * 60 * 1000
+BLOCK_BARS = 4096
+CHUNK_BARS = 64 * BLOCK_BARS      # bars per yielded chunk (~20 MB of float64 work arrays)
+SEED = int(os.environ.get("DASH_SYNTHETIC_SEED", "0"))
+MARKET = "__market__"
+
+# Philox counter word 2 selects the stream; word 1 is the block number for per-block draws.
+_BLOCK, _TOTALS, _JUMPS, _PARAMS = range(4)
+
+
+def _rng(name: str, step_ms: int, seed: int, stream: int, block: int = 0) -> np.random.Generator:
+    key = np.array([seed & 0xFFFFFFFFFFFFFFFF, zlib.crc32(name.encode()) << 32 | zlib.crc32(str(step_ms).encode())],
+                   dtype=np.uint64)
+    return np.random.Generator(np.random.Philox(key=key, counter=np.array([0, block, stream, 0], dtype=np.uint64)))
+
+
+def params(ticker: str, seed: int = SEED) -> dict:
+    """Per-ticker model parameters (annualized), the same at every interval."""
+    rng = _rng(ticker, 0, seed, _PARAMS)
+    return {
+        "price": 10 ** rng.uniform(-2, 4.5),
+        "mu": rng.uniform(-0.1, 0.5),
+        "sigma": rng.uniform(0.4, 1.2),
+        "beta": rng.uniform(0.4, 0.9),            # loading on the market factor
+        "jump_rate": rng.uniform(2, 10),          # jumps per year
+        "jump_mean": rng.uniform(-0.05, 0.0),
+        "jump_std": rng.uniform(0.03, 0.10),
+        "notional": 10 ** rng.uniform(6, 9.5),    # quote volume per day
+        "trade_size": 10 ** rng.uniform(2, 3.5),  # quote notional per trade
+    }
+
+
+def bar_range(start_ms: int, end_ms: int, step_ms: int) -> tuple[int, int]:
+    """Grid numbers [k0, k1) of the bars opening in [start_ms, end_ms)."""
+    k0 = max(0, -(-(start_ms - EPOCH_MS) // step_ms))
+    k1 = max(0, -(-(end_ms - EPOCH_MS) // step_ms))
+    return k0, max(k0, k1)
+
+
+def iter_bars(ticker: str, start_ms: int, end_ms: int, step_ms: int, seed: int = SEED,
+              chunk_bars: int = CHUNK_BARS) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    """Bars opening in [start_ms, end_ms), a chunk at a time.
+
+    Yields (open time ms as int64, OHLCV+trades as float32 [n, 6]), like parse_klines.
+    """
+    k0, k1 = bar_range(start_ms, end_ms, step_ms)
+    if k1 <= k0:
+        return
+    p = params(ticker, seed)
+    n = BLOCK_BARS
+    dt = step_ms / YEAR_MS
+    s = p["sigma"] * np.sqrt(dt)
+    drift = (p["mu"] - 0.5 * p["sigma"] ** 2) * dt
+    idio = np.sqrt(1 - p["beta"] ** 2)
+
+    # One draw per block from EPOCH: the block totals, hence the log price at every block start.
+    n_blocks = (k1 - 1) // n + 1
+    z_market = _rng(MARKET, step_ms, seed, _TOTALS).standard_normal(n_blocks)
+    z = _rng(ticker, step_ms, seed, _TOTALS).standard_normal((n_blocks, 2))
+    jumps = _rng(ticker, step_ms, seed, _JUMPS).poisson(p["jump_rate"] * dt * n, n_blocks)
+    m_total = np.sqrt(n) * z_market
+    e_total = np.sqrt(n) * z[:, 0]
+    j_total = jumps * p["jump_mean"] + np.sqrt(jumps) * p["jump_std"] * z[:, 1]
+    level = np.log(p["price"]) + np.concatenate([[0.0], np.cumsum(drift * n + s * (p["beta"] * m_total + idio * e_total)
+                                                                   + j_total)])
+
+    chunk_blocks = max(1, chunk_bars // n)
+    for c0 in range(k0 // n, n_blocks, chunk_blocks):
+        blocks = range(c0, min(c0 + chunk_blocks, n_blocks))
+        x = np.empty((len(blocks), n))
+        u = np.empty((len(blocks), n, 3))
+        for i, b in enumerate(blocks):
+            # Standard normals bridged to the block's totals, so the bars add up to them.
+            m = _rng(MARKET, step_ms, seed, _BLOCK, b).standard_normal(n)
+            m += (m_total[b] - m.sum()) / n
+            rng = _rng(ticker, step_ms, seed, _BLOCK, b)
+            e = rng.standard_normal(n)
+            e += (e_total[b] - e.sum()) / n
+            x[i] = drift + s * (p["beta"] * m + idio * e)
+            if jumps[b]:
+                sizes = p["jump_mean"] + p["jump_std"] * rng.standard_normal(jumps[b])
+                sizes += (j_total[b] - sizes.sum()) / jumps[b]
+                np.add.at(x[i], rng.integers(0, n, jumps[b]), sizes)
+            u[i] = rng.random((n, 3))
+
+        close = level[c0:c0 + len(blocks), None] + np.cumsum(x, axis=1)
+        open_ = np.empty_like(close)
+        open_[:, 0] = level[c0:c0 + len(blocks)]
+        open_[:, 1:] = close[:, :-1]
+        close, open_, x, u = close.ravel(), open_.ravel(), x.ravel(), u.reshape(-1, 3)
+        # High/low from the extremes of a Brownian bridge between open and close.
+        reach = np.abs(close - open_)
+        high = (open_ + close + np.sqrt(reach ** 2 - 2 * s ** 2 * np.log(u[:, 0]))) / 2
+        low = (open_ + close - np.sqrt(reach ** 2 - 2 * s ** 2 * np.log(u[:, 1]))) / 2
+        price = np.exp(close)
+        # Busier bars on bigger moves; exponential noise around the ticker's typical notional.
+        activity = -np.log(u[:, 2]) * (0.5 + np.abs(x - drift) / s) / (0.5 + np.sqrt(2 / np.pi))
+        notional = p["notional"] * step_ms / DAY_MS * activity
+        values = np.column_stack([np.exp(open_), np.exp(high), np.exp(low), price,
+                                  notional / price, np.floor(notional / p["trade_size"]) + 1])
+
+        k = c0 * n + np.arange(len(close))
+        keep = (k >= k0) & (k < k1)
+        yield EPOCH_MS + k[keep] * step_ms, values[keep].astype(np.float32)
+
+
+def generate(ticker: str, start_ms: int, end_ms: int, step_ms: int, seed: int = SEED,
+             chunk_bars: int = CHUNK_BARS) -> tuple[np.ndarray, np.ndarray]:
+    """All of `iter_bars` in one preallocated buffer (peak memory: the output plus one chunk)."""
+    k0, k1 = bar_range(start_ms, end_ms, step_ms)
+    open_ms = np.empty(k1 - k0, dtype=np.int64)
+    values = np.empty((k1 - k0, 6), dtype=np.float32)
+    pos = 0
+    for t, v in iter_bars(ticker, start_ms, end_ms, step_ms, seed, chunk_bars):
+        open_ms[pos:pos + len(t)] = t
+        values[pos:pos + len(t)] = v
+        pos += len(t)
+    return open_ms, values
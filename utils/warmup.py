@@ -0,0 +1,104 @@
+from __future__ import annotations
+import os
+import threading
+import time
+
+import pandas as pd
+
+from utils.cache import TTL_SECONDS
+from utils.providers import DEFAULT_SOURCE, DEFAULT_UNIVERSE, warm_prices
+from utils.registry import get_registry
+
+# Server-side warm-up: prefetch the default universe once per process, then keep it
+# refreshed a little before the cache TTL runs out, so the common views never block on
+# upstream APIs. The range cache serves every page's window from one superset per ticker,
+# so a single load from the earliest page default covers app.py (last 30 days), Market
+# Watch (2023-01-01) and Portfolio Vault / Alert Studio (2022-01-01).
+
+WARM_START = pd.Timestamp("2022-01-01")
+REFRESH_SECONDS = TTL_SECONDS * 0.9
+ENABLED = os.environ.get("DASH_WARMUP", "1") != "0"
+
+
+class WarmupScheduler:
+    def __init__(self, tickers: list[str], start: pd.Timestamp = WARM_START,
+                 every: float = REFRESH_SECONDS, source: str = DEFAULT_SOURCE):
+        self.tickers = list(tickers)
+        self.since = start
+        self.every = every
+        self.source = source
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.runs = 0
+        self.last_run: float | None = None
+        self.last_duration: float | None = None
+        self.last_provenance: dict[str, str] = {}
+        self.last_error: str | None = None
+
+    def start(self) -> "WarmupScheduler":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="price-warmup", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def run_once(self) -> None:
+        t0 = time.perf_counter()
+        # Listing refresh is a no-op until the snapshot is a day old; it reports its own errors.
+        try:
+            get_registry().refresh()
+        except Exception as e:
+            print(f"Registry refresh failed: {type(e).__name__}: {e}")
+        try:
+            self.last_provenance = warm_prices(self.tickers, self.since, pd.Timestamp.today().normalize(),
+                                               source=self.source)
+            self.last_error = None
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            print(f"Warm-up failed: {self.last_error}")
+        self.runs += 1
+        self.last_run = time.time()
+        self.last_duration = time.perf_counter() - t0
+
+    def _next_delay(self) -> float:
+        # Also wake just after midnight: a new day is a new range end, which would otherwise
+        # be a cold miss for the first visitor of the day.
+        now = pd.Timestamp.now()
+        to_midnight = (now.normalize() + pd.Timedelta(days=1) - now).total_seconds() + 5
+        return min(self.every, to_midnight)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self._next_delay())
+
+    def status(self) -> dict:
+        return {
+            "runs": self.runs,
+            "last_run": self.last_run,
+            "last_duration_s": None if self.last_duration is None else round(self.last_duration, 2),
+            "tickers_warm": len(self.last_provenance),
+            "last_error": self.last_error,
+        }
+
+
+_scheduler: WarmupScheduler | None = None
+_scheduler_lock = threading.Lock()
+
+
+def start_warmup() -> WarmupScheduler | None:
+    """Start the process-wide scheduler on first call; later calls are no-ops."""
+    global _scheduler
+    if not ENABLED:
+        return None
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = WarmupScheduler(DEFAULT_UNIVERSE).start()
+        return _scheduler
+
+
+def warmup_status() -> dict | None:
+    return _scheduler.status() if _scheduler is not None else None
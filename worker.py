@@ -0,0 +1,24 @@
+import argparse
+
+from utils.alerts import RULESETS_PATH, RUN_EVERY, AlertDaemon
+from utils.metrics import get_metrics
+
+# Headless alert worker: evaluates the rule sets saved from Alert Studio on a schedule,
+# without a browser session. The web process does this itself unless DASH_ALERTS=worker;
+# run this instead only with DASH_ALERT_DIR on a volume the web process also mounts.
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate saved Alert Studio rule sets on a schedule.")
+    parser.add_argument("--rules", default=str(RULESETS_PATH), help="rule sets JSON file")
+    parser.add_argument("--every", type=float, default=RUN_EVERY, help="seconds between runs")
+    parser.add_argument("--once", action="store_true", help="run a single evaluation and exit")
+    parser.add_argument("--metrics", help="Prometheus textfile to rewrite after each run (node_exporter collector)")
+    args = parser.parse_args()
+
+    daemon = AlertDaemon(rules_path=args.rules, every=args.every)
+    if args.once:
+        daemon.run_once()
+        if args.metrics:
+            get_metrics().write_textfile(args.metrics)
+    else:
+        daemon.run_forever(metrics_path=args.metrics)